@@ -1,8 +1,24 @@
 #!/usr/bin/python
 # -*- coding:utf-8 -*-
 import time
-import smbus
 import math
+import collections
+import threading
+import numpy as np
+try:
+  import smbus2 as smbus                 # has i2c_rdwr, for reads longer than 32 bytes in one transfer
+  from smbus2 import i2c_msg
+except ImportError:
+  i2c_msg = None
+  try:
+    import smbus
+  except ImportError:                    # e.g. off the Pi, with a simulated bus (see simulated_smbus.py)
+    smbus = None
+# Legacy module-level copies of the latest reading of any ICM20948 instance, for scripts written
+# against the original Waveshare demo (`from ICM20948 import *`, then `Accel[0]`, `MotionVal`, ...).
+# Each instance keeps its own state (see ICM20948 below); these are only updated by the legacy
+# methods (icm20948_Gyro_Accel_Read(), icm20948MagRead(), icm20948CalAvgValue(), ...), in place,
+# so names imported with `*` stay current. icm20948Read() and the FIFO never touch them
 Gyro  = [0,0,0]
 Accel = [0,0,0]
 Mag   = [0,0,0]
@@ -20,6 +36,9 @@ Kp = 4.50
 q0 = 1.0
 q1=q2=q3=0.0
 angles=[0.0,0.0,0.0]
+def _setLegacyQuaternion(q):
+  global q0, q1, q2, q3
+  q0, q1, q2, q3 = q
 true                                 =0x01
 false                                =0x00
 # define ICM-20948 Device I2C address
@@ -57,6 +76,19 @@ REG_ADD_GYRO_YOUT_L                  = 0x36
 REG_ADD_GYRO_ZOUT_H                  = 0x37
 REG_ADD_GYRO_ZOUT_L                  = 0x38
 REG_ADD_EXT_SENS_DATA_00             = 0x3B
+REG_VAL_BIT_SLV0_FIFO_EN             = 0x01  # in REG_ADD_FIFO_EN_1
+REG_ADD_INT_STATUS_2                 = 0x1B
+REG_VAL_BIT_FIFO_OVERFLOW            = 0x1F  # bit[4:0]
+REG_ADD_FIFO_EN_1                    = 0x66
+REG_ADD_FIFO_EN_2                    = 0x67
+REG_VAL_BIT_ACCEL_FIFO_EN            = 0x10
+REG_VAL_BIT_GYRO_FIFO_EN             = 0x0E  # bit[3:1] z, y, x
+REG_ADD_FIFO_RST                     = 0x68
+REG_ADD_FIFO_MODE                    = 0x69
+REG_VAL_FIFO_MODE_SNAPSHOT           = 0x01  # stop writing when full, so packets stay aligned
+REG_ADD_FIFO_COUNTH                  = 0x70
+REG_ADD_FIFO_COUNTL                  = 0x71
+REG_ADD_FIFO_R_W                     = 0x72
 REG_ADD_REG_BANK_SEL                 = 0x7F
 REG_VAL_REG_BANK_0                   = 0x00
 REG_VAL_REG_BANK_1                   = 0x10
@@ -75,6 +107,7 @@ REG_VAL_BIT_GYRO_FS_500DPS           = 0x02  # bit[2:1]
 REG_VAL_BIT_GYRO_FS_1000DPS          = 0x04  # bit[2:1]
 REG_VAL_BIT_GYRO_FS_2000DPS          = 0x06  # bit[2:1]
 REG_VAL_BIT_GYRO_DLPF                = 0x01  # bit[0]
+REG_ADD_ACCEL_SMPLRT_DIV_1           = 0x10
 REG_ADD_ACCEL_SMPLRT_DIV_2           = 0x11
 REG_ADD_ACCEL_CONFIG                 = 0x14
 REG_VAL_BIT_ACCEL_DLPCFG_2           = 0x10  # bit[5:3]
@@ -87,6 +120,8 @@ REG_VAL_BIT_ACCEL_FS_16g             = 0x06  # bit[2:1]
 REG_VAL_BIT_ACCEL_DLPF               = 0x01  # bit[0]
 
 # user bank 3 register
+REG_ADD_I2C_MST_CTRL                 = 0x01
+REG_VAL_I2C_MST_CLK_400KHZ           = 0x07  # 345.6 kHz, the datasheet's recommended setting for 400 kHz
 REG_ADD_I2C_SLV0_ADDR                = 0x03
 REG_ADD_I2C_SLV0_REG                 = 0x04
 REG_ADD_I2C_SLV0_CTRL                = 0x05
@@ -106,6 +141,7 @@ REG_VAL_MAG_WIA1                     = 0x48
 REG_ADD_MAG_WIA2                     = 0x01
 REG_VAL_MAG_WIA2                     = 0x09
 REG_ADD_MAG_ST2                      = 0x10
+REG_ADD_MAG_ST1                      = 0x10  # (the register named ST2 above is ST1 in the datasheet)
 REG_ADD_MAG_DATA                     = 0x11
 REG_ADD_MAG_CNTL2                    = 0x31
 REG_VAL_MAG_MODE_PD                  = 0x00
@@ -118,11 +154,106 @@ REG_VAL_MAG_MODE_ST                  = 0x10
 # define ICM-20948 MAG Register  end
 
 MAG_DATA_LEN                         =6
+MAG_AUTO_READ_LEN                    = 9     # ST1, HXL..HZH, TMPS, ST2: reading ST2 releases the next measurement
+SENSORS_LEN                          = 14 + MAG_AUTO_READ_LEN  # ACCEL_XOUT_H to the end of the magnetometer's EXT_SENS_DATA
+
+# FIFO
+FIFO_SIZE                            = 512   # bytes
+FIFO_ACCEL_GYRO_PACKET_LEN           = 12    # accel x, y, z then gyro x, y, z, big-endian int16
+FIFO_ACCEL_GYRO_MAG_PACKET_LEN       = FIFO_ACCEL_GYRO_PACKET_LEN + MAG_AUTO_READ_LEN  # then the magnetometer's EXT_SENS_DATA
+GYRO_BASE_RATE                       = 1100.0  # Hz, output data rate = 1100 / (1 + GYRO_SMPLRT_DIV)
+SMBUS_BLOCK_LEN                      = 32    # longest smbus block transfer
+I2C_MST_WAIT                         = 0.01  # s, for the I2C master to run a transaction: one sample at the default 137.5 Hz, plus margin
+
+# a batch of samples drained from the FIFO by `icm20948FifoRead()`
+#   timestamps: int64 array (n,), monotonic time in ns of each sample
+#   accel:      int16 array (n, 3), raw accelerometer counts (16384 per g at +-2g)
+#   gyro:       int32 array (n, 3), raw gyroscope counts minus gyro_offset (32.8 per dps at +-1000dps)
+#   mag:        int16 array (n, 3), as in IMU_SAMPLE, or None if the FIFO was enabled without mag
+ImuSamples = collections.namedtuple("ImuSamples", ["timestamps", "accel", "gyro", "mag"])
+
+# one reading of `icm20948Read()`, as a NumPy structured record
+#   timestamp: monotonic time in ns of the accel/gyro read
+#   accel, gyro: as in ImuSamples
+#   mag:       raw magnetometer counts (0.15 uT each), in the accel/gyro axes
+IMU_SAMPLE = np.dtype([("timestamp", np.int64), ("accel", np.int16, 3), ("gyro", np.int32, 3), ("mag", np.int16, 3)])
+
+# register access to one device on an smbus-compatible bus (smbus, smbus2, SimulatedICM20948Bus)
+#
+# - it remembers the selected register bank, and only writes REG_BANK_SEL when the bank changes
+#   (all access to the device must go through it, and it starts out not knowing the bank)
+# - multi-register transfers are single bus transactions: write_i2c_block_data for writes, and
+#   read_i2c_block_data for reads, or i2c_rdwr (smbus2) for reads longer than 32 bytes
+# - it does not wait after writes: the callers sleep where the datasheet requires (device reset,
+#   I2C master transactions)
+# - `transactions` counts the bus calls by method, and the bank selects it saved
+class I2CTransport(object):
+  def __init__(self, bus, address):
+    self._bus = bus
+    self._address = address
+    self.bank = None
+    self.transactions = collections.Counter()
+    self._rdwr = i2c_msg is not None and hasattr(bus, "i2c_rdwr")
+  def select_bank(self, bank):
+    if bank == self.bank:
+      self.transactions["bank_select_elided"] += 1
+      return
+    self.write(REG_ADD_REG_BANK_SEL, bank)
+  # forgets the selected bank, e.g. after a reset of the device
+  def invalidate(self):
+    self.bank = None
+  def read_byte(self, reg):
+    self.transactions["read_byte_data"] += 1
+    return self._bus.read_byte_data(self._address, reg)
+  # reads `length` registers from `reg` as bytes; `autoincrement=False` reads `length` bytes from
+  # one register (REG_ADD_FIFO_R_W)
+  def read(self, reg, length, autoincrement=True):
+    if length > SMBUS_BLOCK_LEN and self._rdwr:
+      self.transactions["i2c_rdwr"] += 1
+      read = i2c_msg.read(self._address, length)
+      self._bus.i2c_rdwr(i2c_msg.write(self._address, [reg]), read)
+      return bytes(read)
+    data = bytearray()
+    while len(data) < length:
+      self.transactions["read_i2c_block_data"] += 1
+      start = reg + len(data) if autoincrement else reg
+      data += bytes(self._bus.read_i2c_block_data(self._address, start, min(SMBUS_BLOCK_LEN, length - len(data))))
+    return bytes(data)
+  # writes `values` to consecutive registers from `reg`
+  def write(self, reg, *values):
+    if len(values) == 1:
+      self.transactions["write_byte_data"] += 1
+      self._bus.write_byte_data(self._address, reg, values[0])
+    else:
+      self.transactions["write_i2c_block_data"] += 1
+      self._bus.write_i2c_block_data(self._address, reg, list(values))
+    if reg == REG_ADD_REG_BANK_SEL:
+      self.bank = values[0]
 
 class ICM20948(object):
-  def __init__(self,address=I2C_ADD_ICM20948):
+  def __init__(self,address=I2C_ADD_ICM20948,bus=None):
     self._address = address
-    self._bus = smbus.SMBus(1)
+    self._bus = bus if bus is not None else smbus.SMBus(1)   # anything with the smbus methods, e.g. SimulatedICM20948Bus
+    self._transport = I2CTransport(self._bus, address)
+    self.transactions = self._transport.transactions   # bus calls by method, see I2CTransport
+    self.fifo_rate = None                 # nominal sample rate (Hz) while the FIFO is enabled
+    self.fifo_overflows = 0               # times the FIFO filled up before it was read, losing samples
+    # Per-instance state, so several ICM20948s (e.g. one at 0x68 and one at 0x69) can be used at
+    # once. The latest reading is kept in one preallocated record; accel, gyro and mag are views
+    # into it, overwritten in place by every read. The lock serializes the register accesses of
+    # the read methods, so an instance can be read from several threads
+    self._lock = threading.RLock()
+    self.sample = np.zeros((), dtype=IMU_SAMPLE)
+    self.accel = self.sample["accel"]
+    self.gyro = self.sample["gyro"]
+    self.mag = self.sample["mag"]
+    self.gyro_offset = np.zeros(3, dtype=np.int32)
+    self.motion = np.zeros(9)             # gyro (dps), accel, mag: the order of MotionVal
+    self.q = np.array([1.0, 0.0, 0.0, 0.0])  # imuAHRSupdate() orientation quaternion
+    self.eInt = np.zeros(3)               # imuAHRSupdate() integral feedback
+    self._secondary = bytearray(8)        # bytes of the last icm20948ReadSecondary()
+    self._mag_auto_read = False           # whether the I2C master keeps reading the magnetometer
+    self._fifo_mag = False                # whether FIFO packets include the magnetometer
     bRet=self.icm20948Check()             #Initialization of the device multiple times after power on will result in a return error
     # while true != bRet:
     #   print("ICM-20948 Error\n" )
@@ -133,167 +264,255 @@ class ICM20948(object):
     self._write_byte( REG_ADD_REG_BANK_SEL , REG_VAL_REG_BANK_0)
     self._write_byte( REG_ADD_PWR_MIGMT_1 , REG_VAL_ALL_RGE_RESET)
     time.sleep(0.1)
+    self._transport.invalidate()          # the reset selected bank 0
     self._write_byte( REG_ADD_PWR_MIGMT_1 , REG_VAL_RUN_MODE)  
     #user bank 2 register
     self._write_byte( REG_ADD_REG_BANK_SEL , REG_VAL_REG_BANK_2)
-    self._write_byte( REG_ADD_GYRO_SMPLRT_DIV , 0x07)
-    self._write_byte( REG_ADD_GYRO_CONFIG_1 , REG_VAL_BIT_GYRO_DLPCFG_6 | REG_VAL_BIT_GYRO_FS_1000DPS | REG_VAL_BIT_GYRO_DLPF)
-    self._write_byte( REG_ADD_ACCEL_SMPLRT_DIV_2 ,  0x07)
+    self._write_block( REG_ADD_GYRO_SMPLRT_DIV , 0x07, REG_VAL_BIT_GYRO_DLPCFG_6 | REG_VAL_BIT_GYRO_FS_1000DPS | REG_VAL_BIT_GYRO_DLPF)   # and GYRO_CONFIG_1
+    self._write_block( REG_ADD_ACCEL_SMPLRT_DIV_1 , 0x00, 0x07)
     self._write_byte( REG_ADD_ACCEL_CONFIG , REG_VAL_BIT_ACCEL_DLPCFG_6 | REG_VAL_BIT_ACCEL_FS_2g | REG_VAL_BIT_ACCEL_DLPF)
     #user bank 0 register
     self._write_byte( REG_ADD_REG_BANK_SEL , REG_VAL_REG_BANK_0) 
     time.sleep(0.1)
     self.icm20948GyroOffset()
     self.icm20948MagCheck()
-    self.icm20948WriteSecondary( I2C_ADD_ICM20948_AK09916|I2C_ADD_ICM20948_AK09916_WRITE,REG_ADD_MAG_CNTL2, REG_VAL_MAG_MODE_20HZ)
+    self.icm20948WriteSecondary( I2C_ADD_ICM20948_AK09916|I2C_ADD_ICM20948_AK09916_WRITE,REG_ADD_MAG_CNTL2, REG_VAL_MAG_MODE_100HZ)
+    self._magAutoReadStart()
+  # reads accel and gyro into self.accel and self.gyro (and the legacy Accel and Gyro)
   def icm20948_Gyro_Accel_Read(self):
-    self._write_byte( REG_ADD_REG_BANK_SEL , REG_VAL_REG_BANK_0)
-    data =self._read_block(REG_ADD_ACCEL_XOUT_H, 12)
-    self._write_byte( REG_ADD_REG_BANK_SEL , REG_VAL_REG_BANK_2)
-    Accel[0] = (data[0]<<8)|data[1]
-    Accel[1] = (data[2]<<8)|data[3]
-    Accel[2] = (data[4]<<8)|data[5]
-    Gyro[0]  = ((data[6]<<8)|data[7]) - GyroOffset[0]
-    Gyro[1]  = ((data[8]<<8)|data[9]) - GyroOffset[1]
-    Gyro[2]  = ((data[10]<<8)|data[11]) - GyroOffset[2]
-    if Accel[0]>=32767:             #Solve the problem that Python shift will not overflow
-      Accel[0]=Accel[0]-65535
-    elif Accel[0]<=-32767:
-      Accel[0]=Accel[0]+65535
-    if Accel[1]>=32767:
-      Accel[1]=Accel[1]-65535
-    elif Accel[1]<=-32767:
-      Accel[1]=Accel[1]+65535
-    if Accel[2]>=32767:
-      Accel[2]=Accel[2]-65535
-    elif Accel[2]<=-32767:
-      Accel[2]=Accel[2]+65535
-    if Gyro[0]>=32767:
-      Gyro[0]=Gyro[0]-65535
-    elif Gyro[0]<=-32767:
-      Gyro[0]=Gyro[0]+65535
-    if Gyro[1]>=32767:
-      Gyro[1]=Gyro[1]-65535
-    elif Gyro[1]<=-32767:
-      Gyro[1]=Gyro[1]+65535
-    if Gyro[2]>=32767:
-      Gyro[2]=Gyro[2]-65535
-    elif Gyro[2]<=-32767:
-      Gyro[2]=Gyro[2]+65535
+    with self._lock:
+      self._readSensors(FIFO_ACCEL_GYRO_PACKET_LEN)
+      Accel[:] = self.accel.tolist()
+      Gyro[:] = self.gyro.tolist()
+  # reads the magnetometer into self.mag (and the legacy Mag)
+  #
+  # The I2C master of the ICM20948 reads the magnetometer into EXT_SENS_DATA at every sample (see
+  # _magAutoReadStart()), so this is a single block read of the latest measurement
   def icm20948MagRead(self):
-    counter=20
-    while(counter>0):
-      time.sleep(0.01)
-      self.icm20948ReadSecondary( I2C_ADD_ICM20948_AK09916|I2C_ADD_ICM20948_AK09916_READ , REG_ADD_MAG_ST2, 1)
-      if ((pu8data[0] & 0x01)!= 0):
-        break
-      counter-=1
-    if counter!=0:
-      for i in range(0,8):
-        self.icm20948ReadSecondary( I2C_ADD_ICM20948_AK09916|I2C_ADD_ICM20948_AK09916_READ , REG_ADD_MAG_DATA , MAG_DATA_LEN)
-        U8tempX[i] = (pu8data[1]<<8)|pu8data[0]
-        U8tempY[i] = (pu8data[3]<<8)|pu8data[2]
-        U8tempZ[i] = (pu8data[5]<<8)|pu8data[4]
-      Mag[0]=(U8tempX[0]+U8tempX[1]+U8tempX[2]+U8tempX[3]+U8tempX[4]+U8tempX[5]+U8tempX[6]+U8tempX[7])/8
-      Mag[1]=-(U8tempY[0]+U8tempY[1]+U8tempY[2]+U8tempY[3]+U8tempY[4]+U8tempY[5]+U8tempY[6]+U8tempY[7])/8
-      Mag[2]=-(U8tempZ[0]+U8tempZ[1]+U8tempZ[2]+U8tempZ[3]+U8tempZ[4]+U8tempZ[5]+U8tempZ[6]+U8tempZ[7])/8
-    if Mag[0]>=32767:            #Solve the problem that Python shift will not overflow
-      Mag[0]=Mag[0]-65535
-    elif Mag[0]<=-32767:
-      Mag[0]=Mag[0]+65535
-    if Mag[1]>=32767:
-      Mag[1]=Mag[1]-65535
-    elif Mag[1]<=-32767:
-      Mag[1]=Mag[1]+65535
-    if Mag[2]>=32767:
-      Mag[2]=Mag[2]-65535
-    elif Mag[2]<=-32767:
-      Mag[2]=Mag[2]+65535
-  def icm20948ReadSecondary(self,u8I2CAddr,u8RegAddr,u8Len):
-    u8Temp=0
+    with self._lock:
+      self._write_byte( REG_ADD_REG_BANK_SEL , REG_VAL_REG_BANK_0)
+      data = self._read_block(REG_ADD_EXT_SENS_DATA_00, MAG_AUTO_READ_LEN)
+      self._decodeMag(data)
+      Mag[:] = self.mag.tolist()
+  # reads accel, gyro and the magnetometer registers (up to `length` bytes from ACCEL_XOUT_H) with
+  # one block read, into self.sample
+  def _readSensors(self, length):
+    self._write_byte( REG_ADD_REG_BANK_SEL , REG_VAL_REG_BANK_0)
+    self.sample["timestamp"] = time.monotonic_ns()
+    data = self._read_block(REG_ADD_ACCEL_XOUT_H, length)
+    raw = np.frombuffer(bytes(data[:12]), dtype=">i2")
+    self.accel[:] = raw[:3]
+    np.subtract(raw[3:], self.gyro_offset, out=self.gyro)
+    if length > 14:
+      self._decodeMag(data[14:])
+  # decodes the MAG_AUTO_READ_LEN bytes read from ST1 into self.mag
+  def _decodeMag(self, data):
+    # the magnetometer's y and z axes point the other way than the accel/gyro ones
+    self.mag[:] = np.frombuffer(bytes(data[1:7]), dtype="<i2") * np.array((1, -1, -1), dtype=np.int16)
+  # makes the I2C master read ST1 to ST2 of the magnetometer through SLV0 at every sample, into
+  # EXT_SENS_DATA_00..08, which stays enabled from then on
+  def _magAutoReadStart(self):
     self._write_byte( REG_ADD_REG_BANK_SEL,  REG_VAL_REG_BANK_3) #swtich bank3
-    self._write_byte( REG_ADD_I2C_SLV0_ADDR, u8I2CAddr)
-    self._write_byte( REG_ADD_I2C_SLV0_REG,  u8RegAddr)
-    self._write_byte( REG_ADD_I2C_SLV0_CTRL, REG_VAL_BIT_SLV0_EN|u8Len)
-
+    self._write_byte( REG_ADD_I2C_MST_CTRL,  REG_VAL_I2C_MST_CLK_400KHZ)
+    self._write_block( REG_ADD_I2C_SLV0_ADDR, I2C_ADD_ICM20948_AK09916|I2C_ADD_ICM20948_AK09916_READ, REG_ADD_MAG_ST1, REG_VAL_BIT_SLV0_EN|MAG_AUTO_READ_LEN)   # SLV0 ADDR, REG, CTRL
     self._write_byte( REG_ADD_REG_BANK_SEL, REG_VAL_REG_BANK_0) #swtich bank0
-    
     u8Temp = self._read_byte(REG_ADD_USER_CTRL)
-    u8Temp |= REG_VAL_BIT_I2C_MST_EN
-    self._write_byte( REG_ADD_USER_CTRL, u8Temp)
-    time.sleep(0.01)
-    u8Temp &= ~REG_VAL_BIT_I2C_MST_EN
-    self._write_byte( REG_ADD_USER_CTRL, u8Temp)
-    
-    for i in range(0,u8Len):
-      pu8data[i]= self._read_byte( REG_ADD_EXT_SENS_DATA_00+i)
+    self._write_byte( REG_ADD_USER_CTRL, u8Temp | REG_VAL_BIT_I2C_MST_EN)
+    self._mag_auto_read = True
+  # reads u8Len registers of a device on the auxiliary I2C bus (the magnetometer), returns them
+  # as bytes (and in the legacy pu8data)
+  def icm20948ReadSecondary(self,u8I2CAddr,u8RegAddr,u8Len):
+    with self._lock:
+      u8Temp=0
+      self._write_byte( REG_ADD_REG_BANK_SEL,  REG_VAL_REG_BANK_3) #swtich bank3
+      self._write_block( REG_ADD_I2C_SLV0_ADDR, u8I2CAddr, u8RegAddr, REG_VAL_BIT_SLV0_EN|u8Len)   # SLV0 ADDR, REG, CTRL
 
-    self._write_byte( REG_ADD_REG_BANK_SEL, REG_VAL_REG_BANK_3) #swtich bank3
-    
-    u8Temp = self._read_byte(REG_ADD_I2C_SLV0_CTRL)
-    u8Temp &= ~((REG_VAL_BIT_I2C_MST_EN)&(REG_VAL_BIT_MASK_LEN))
-    self._write_byte( REG_ADD_I2C_SLV0_CTRL,  u8Temp)
-    
-    self._write_byte( REG_ADD_REG_BANK_SEL, REG_VAL_REG_BANK_0) #swtich bank0
-  def icm20948WriteSecondary(self,u8I2CAddr,u8RegAddr,u8data):
-    u8Temp=0
-    self._write_byte( REG_ADD_REG_BANK_SEL,  REG_VAL_REG_BANK_3) #swtich bank3
-    self._write_byte( REG_ADD_I2C_SLV1_ADDR, u8I2CAddr)
-    self._write_byte( REG_ADD_I2C_SLV1_REG,  u8RegAddr)
-    self._write_byte( REG_ADD_I2C_SLV1_DO,   u8data)
-    self._write_byte( REG_ADD_I2C_SLV1_CTRL, REG_VAL_BIT_SLV0_EN|1)
+      self._write_byte( REG_ADD_REG_BANK_SEL, REG_VAL_REG_BANK_0) #swtich bank0
 
-    self._write_byte( REG_ADD_REG_BANK_SEL, REG_VAL_REG_BANK_0) #swtich bank0
+      u8Temp = self._read_byte(REG_ADD_USER_CTRL)
+      u8Temp |= REG_VAL_BIT_I2C_MST_EN
+      self._write_byte( REG_ADD_USER_CTRL, u8Temp)
+      time.sleep(I2C_MST_WAIT)
+      u8Temp &= ~REG_VAL_BIT_I2C_MST_EN
+      self._write_byte( REG_ADD_USER_CTRL, u8Temp)
 
-    u8Temp = self._read_byte(REG_ADD_USER_CTRL)
-    u8Temp |= REG_VAL_BIT_I2C_MST_EN
-    self._write_byte( REG_ADD_USER_CTRL, u8Temp)
-    time.sleep(0.01)
-    u8Temp &= ~REG_VAL_BIT_I2C_MST_EN
-    self._write_byte( REG_ADD_USER_CTRL, u8Temp)
+      self._secondary[:u8Len] = self._read_block( REG_ADD_EXT_SENS_DATA_00, u8Len)
+      pu8data[:u8Len] = self._secondary[:u8Len]
 
-    self._write_byte( REG_ADD_REG_BANK_SEL, REG_VAL_REG_BANK_3) #swtich bank3
+      self._write_byte( REG_ADD_REG_BANK_SEL, REG_VAL_REG_BANK_3) #swtich bank3
 
-    u8Temp = self._read_byte(REG_ADD_I2C_SLV0_CTRL)
-    u8Temp &= ~((REG_VAL_BIT_I2C_MST_EN)&(REG_VAL_BIT_MASK_LEN))
-    self._write_byte( REG_ADD_I2C_SLV0_CTRL,  u8Temp)
+      self._write_byte( REG_ADD_I2C_SLV0_CTRL, 0x00)   # disable SLV0, so the read is not repeated
 
-    self._write_byte( REG_ADD_REG_BANK_SEL, REG_VAL_REG_BANK_0) #swtich bank0
+      self._write_byte( REG_ADD_REG_BANK_SEL, REG_VAL_REG_BANK_0) #swtich bank0
+      if self._mag_auto_read:
+        self._magAutoReadStart()        # SLV0 and the I2C master were taken over for this read
+      return bytes(self._secondary[:u8Len])
+  def icm20948WriteSecondary(self,u8I2CAddr,u8RegAddr,u8data):
+    with self._lock:
+      u8Temp=0
+      self._write_byte( REG_ADD_REG_BANK_SEL,  REG_VAL_REG_BANK_3) #swtich bank3
+      self._write_block( REG_ADD_I2C_SLV1_ADDR, u8I2CAddr, u8RegAddr, REG_VAL_BIT_SLV0_EN|1, u8data)   # SLV1 ADDR, REG, CTRL, DO
+
+      self._write_byte( REG_ADD_REG_BANK_SEL, REG_VAL_REG_BANK_0) #swtich bank0
+
+      u8Temp = self._read_byte(REG_ADD_USER_CTRL)
+      u8Temp |= REG_VAL_BIT_I2C_MST_EN
+      self._write_byte( REG_ADD_USER_CTRL, u8Temp)
+      time.sleep(I2C_MST_WAIT)
+      u8Temp &= ~REG_VAL_BIT_I2C_MST_EN
+      self._write_byte( REG_ADD_USER_CTRL, u8Temp)
+
+      self._write_byte( REG_ADD_REG_BANK_SEL, REG_VAL_REG_BANK_3) #swtich bank3
+      # disable SLV1, or the I2C master repeats the write on every cycle while it is enabled
+      self._write_byte( REG_ADD_I2C_SLV1_CTRL, 0x00)
+
+      self._write_byte( REG_ADD_REG_BANK_SEL, REG_VAL_REG_BANK_0) #swtich bank0
+      if self._mag_auto_read:
+        self._magAutoReadStart()        # the I2C master was taken over for this write
   def icm20948GyroOffset(self):
-    s32TempGx = 0
-    s32TempGy = 0
-    s32TempGz = 0
+    total = np.zeros(3, dtype=np.int32)
+    self.gyro_offset[:] = 0
     for i in range(0,32):
       self.icm20948_Gyro_Accel_Read()
-      s32TempGx += Gyro[0]
-      s32TempGy += Gyro[1]
-      s32TempGz += Gyro[2]
+      total += self.gyro
       time.sleep(0.01)
-    GyroOffset[0] = s32TempGx >> 5
-    GyroOffset[1] = s32TempGy >> 5
-    GyroOffset[2] = s32TempGz >> 5
+    self.gyro_offset[:] = total >> 5
+    GyroOffset[:] = self.gyro_offset.tolist()
+  # reads accel, gyro and (if mag) the magnetometer with one block read, returns the reading as an
+  # IMU_SAMPLE record.
+  # Without `out` the record is self.sample, which the next read overwrites: copy it to keep it,
+  # or pass `out`, e.g. a row of a preallocated recording (`recording = np.zeros(n, IMU_SAMPLE)`,
+  # `icm20948.icm20948Read(out=recording[i])`)
+  def icm20948Read(self, mag=True, out=None):
+    with self._lock:
+      self._readSensors(SENSORS_LEN if mag else FIFO_ACCEL_GYRO_PACKET_LEN)
+      if out is None:
+        return self.sample
+      if isinstance(out, np.void):         # a row of a structured array, a view that takes fields
+        for name in IMU_SAMPLE.names:
+          out[name] = self.sample[name]
+      else:
+        out[...] = self.sample
+      return out
+  # Burst acquisition through the on-chip FIFO: the chip writes every accel/gyro sample into its
+  # 512-byte FIFO at `rate` Hz (up to 1100), and icm20948FifoRead() drains all of them with a few
+  # block reads. Call icm20948FifoRead() at least every 512/12 samples (about 85 ms at 500 Hz),
+  # otherwise the FIFO fills up and stops: the samples it holds are returned, the later ones are lost
+  # and the FIFO is reset (counted in fifo_overflows)
+  #
+  # With mag, every packet also holds the latest magnetometer measurement, which makes packets 21
+  # bytes long (read at least every 24 samples). The magnetometer measures at 100 Hz, so at higher
+  # rates consecutive samples repeat its measurement
+  def icm20948FifoEnable(self,rate=500.0,mag=False):
+    with self._lock:
+      divider = min(255, max(0, int(round(GYRO_BASE_RATE / rate)) - 1))
+      self.fifo_rate = GYRO_BASE_RATE / (1 + divider)
+      #user bank 2 register: same divider for gyro and accel, so every packet holds both
+      self._write_byte( REG_ADD_REG_BANK_SEL , REG_VAL_REG_BANK_2)
+      self._write_byte( REG_ADD_GYRO_SMPLRT_DIV , divider)
+      self._write_block( REG_ADD_ACCEL_SMPLRT_DIV_1 , 0x00, divider)
+      #user bank 0 register
+      self._write_byte( REG_ADD_REG_BANK_SEL , REG_VAL_REG_BANK_0)
+      self._write_byte( REG_ADD_FIFO_MODE , REG_VAL_FIFO_MODE_SNAPSHOT)
+      self._write_block( REG_ADD_FIFO_EN_1 , REG_VAL_BIT_SLV0_FIFO_EN if mag else 0x00, REG_VAL_BIT_ACCEL_FIFO_EN | REG_VAL_BIT_GYRO_FIFO_EN)   # and FIFO_EN_2
+      self._fifo_mag = mag
+      u8Temp = self._read_byte(REG_ADD_USER_CTRL)
+      self._write_byte( REG_ADD_USER_CTRL, u8Temp | REG_VAL_BIT_FIFO_EN)
+      self._fifoReset()
+  def icm20948FifoDisable(self):
+    with self._lock:
+      self._write_byte( REG_ADD_REG_BANK_SEL , REG_VAL_REG_BANK_0)
+      self._write_block( REG_ADD_FIFO_EN_1 , 0x00, 0x00)   # and FIFO_EN_2
+      u8Temp = self._read_byte(REG_ADD_USER_CTRL)
+      self._write_byte( REG_ADD_USER_CTRL, u8Temp & ~REG_VAL_BIT_FIFO_EN)
+      self._fifoReset()
+      self.fifo_rate = None
+      self._fifo_mag = False
+  # returns an ImuSamples batch of every complete sample in the FIFO, oldest first
+  #
+  # The chip does not timestamp samples, so they are timestamped from their position in the
+  # stream: sample k since the FIFO was reset is at t0 + k * period, where the period is measured
+  # as the time since the reset divided by the number of samples since, which corrects for the
+  # chip's oscillator running faster or slower than nominal
+  def icm20948FifoRead(self):
+    with self._lock:
+      if self.fifo_rate is None:
+        raise RuntimeError("icm20948FifoRead() requires icm20948FifoEnable() to be called first")
+      self._write_byte( REG_ADD_REG_BANK_SEL , REG_VAL_REG_BANK_0)
+      now = time.monotonic_ns()
+      status = self._read_byte(REG_ADD_INT_STATUS_2)
+      count_h, count_l = self._read_block(REG_ADD_FIFO_COUNTH, 2)
+      count = ((count_h & 0x1F) << 8) | count_l
+      packet_len = FIFO_ACCEL_GYRO_MAG_PACKET_LEN if self._fifo_mag else FIFO_ACCEL_GYRO_PACKET_LEN
+      length = count - count % packet_len
+      data = self._transport.read(REG_ADD_FIFO_R_W, length, autoincrement=False)
+      packets = np.frombuffer(data, dtype=np.uint8).reshape(-1, packet_len)
+      if not status & REG_VAL_BIT_FIFO_OVERFLOW:
+        return self._fifoSamples(packets, now)
+      # in snapshot mode the FIFO kept its oldest packets, in place after the previous read, and dropped the newer
+      # ones. Those were written at the rate seen so far (not up to now), and after them the stream position no
+      # longer tells the time: start over
+      if self._fifo_samples:
+        period = (self._fifo_last_ns - self._fifo_t0) / self._fifo_samples
+      else:
+        period = 1e9 / self.fifo_rate
+      samples = self._fifoSamples(packets, self._fifo_t0 + period * (self._fifo_samples + len(packets)))
+      self.fifo_overflows += 1
+      self._fifoReset()
+      return samples
+  def _fifoReset(self):
+    self._write_byte( REG_ADD_FIFO_RST, 0x1F)
+    self._write_byte( REG_ADD_FIFO_RST, 0x00)
+    self._read_byte(REG_ADD_INT_STATUS_2)      # clears an overflow flagged before the reset
+    self._fifo_t0 = time.monotonic_ns()
+    self._fifo_samples = 0
+    self._fifo_last_ns = self._fifo_t0
+  def _fifoSamples(self, packets, now):
+    n = len(packets)
+    if n:
+      total = self._fifo_samples + n
+      period = (now - self._fifo_t0) / total
+      timestamps = self._fifo_t0 + (period * np.arange(self._fifo_samples + 1, total + 1)).astype(np.int64)
+      # a shorter period estimate must not move samples before the previous batch
+      timestamps = np.maximum(timestamps, self._fifo_last_ns + 1 + np.arange(n))
+      self._fifo_samples = total
+      self._fifo_last_ns = int(timestamps[-1])
+    else:
+      timestamps = np.empty(0, dtype=np.int64)
+    raw = np.ascontiguousarray(packets[:, :FIFO_ACCEL_GYRO_PACKET_LEN]).view(">i2")
+    accel = raw[:, :3].astype(np.int16)
+    gyro = raw[:, 3:].astype(np.int32) - self.gyro_offset
+    mag = None
+    if self._fifo_mag:
+      # ST1, then the little-endian measurement, with y and z flipped to the accel/gyro axes
+      mag = np.ascontiguousarray(packets[:, FIFO_ACCEL_GYRO_PACKET_LEN + 1:FIFO_ACCEL_GYRO_PACKET_LEN + 7]).view("<i2")
+      mag = mag.astype(np.int16) * np.array((1, -1, -1), dtype=np.int16)
+    return ImuSamples(timestamps, accel, gyro, mag)
   def _read_byte(self,cmd):
-    return self._bus.read_byte_data(self._address,cmd)
+    return self._transport.read_byte(cmd)
   def _read_block(self, reg, length=1):
-    return self._bus.read_i2c_block_data(self._address, reg, length)
+    return self._transport.read(reg, length)
   def _read_u16(self,cmd):
-    LSB = self._bus.read_byte_data(self._address,cmd)
-    MSB = self._bus.read_byte_data(self._address,cmd+1)
+    LSB, MSB = self._transport.read(cmd, 2)
     return (MSB	<< 8) + LSB
   def _write_byte(self,cmd,val):
-    self._bus.write_byte_data(self._address,cmd,val)
-    time.sleep(0.0001)
-  def imuAHRSupdate(self,gx,gy,gz,ax,ay,az,mx,my,mz):    
+    if cmd == REG_ADD_REG_BANK_SEL:
+      self._transport.select_bank(val)
+    else:
+      self._transport.write(cmd, val)
+  def _write_block(self, reg, *values):
+    self._transport.write(reg, *values)
+  # one step of the Mahony filter, `dt` seconds after the previous one (the demo's loop takes
+  # about 48 ms). The integral feedback is kept between calls. To compute the orientation over a
+  # recording, pbl.ahrs.Mahony is much faster and takes the time steps from the timestamps
+  def imuAHRSupdate(self,gx,gy,gz,ax,ay,az,mx,my,mz,dt=0.048):    
     norm=0.0
     hx = hy = hz = bx = bz = 0.0
     vx = vy = vz = wx = wy = wz = 0.0
-    exInt = eyInt = ezInt = 0.0
+    exInt, eyInt, ezInt = self.eInt
     ex=ey=ez=0.0 
-    halfT = 0.024
-    global q0
-    global q1
-    global q2
-    global q3
+    halfT = 0.5 * dt
+    q0, q1, q2, q3 = self.q
     q0q0 = q0 * q0
     q0q1 = q0 * q1
     q0q2 = q0 * q2
@@ -343,17 +562,21 @@ class ICM20948(object):
       gx = gx + Kp * ex + exInt
       gy = gy + Kp * ey + eyInt
       gz = gz + Kp * ez + ezInt
+      self.eInt[:] = (exInt, eyInt, ezInt)
 
-    q0 = q0 + (-q1 * gx - q2 * gy - q3 * gz) * halfT
-    q1 = q1 + (q0 * gx + q2 * gz - q3 * gy) * halfT
-    q2 = q2 + (q0 * gy - q1 * gz + q3 * gx) * halfT
-    q3 = q3 + (q0 * gz + q1 * gy - q2 * gx) * halfT  
+    qa, qb, qc = q0, q1, q2                 # every component is integrated from the previous quaternion
+    q0 = q0 + (-qb * gx - qc * gy - q3 * gz) * halfT
+    q1 = qb + (qa * gx + qc * gz - q3 * gy) * halfT
+    q2 = qc + (qa * gy - qb * gz + q3 * gx) * halfT
+    q3 = q3 + (qa * gz + qb * gy - qc * gx) * halfT  
 
     norm = float(1/math.sqrt(q0 * q0 + q1 * q1 + q2 * q2 + q3 * q3))
     q0 = q0 * norm
     q1 = q1 * norm
     q2 = q2 * norm
     q3 = q3 * norm
+    self.q[:] = (q0, q1, q2, q3)
+    _setLegacyQuaternion((q0, q1, q2, q3))
     return q0, q1, q2, q3
   def icm20948Check(self):
     bRet=false
@@ -361,17 +584,14 @@ class ICM20948(object):
       bRet = true
     return bRet
   def icm20948MagCheck(self):
-    self.icm20948ReadSecondary( I2C_ADD_ICM20948_AK09916|I2C_ADD_ICM20948_AK09916_READ,REG_ADD_MAG_WIA1, 2)
-    if (pu8data[0] == REG_VAL_MAG_WIA1) and ( pu8data[1] == REG_VAL_MAG_WIA2) :
+    data = self.icm20948ReadSecondary( I2C_ADD_ICM20948_AK09916|I2C_ADD_ICM20948_AK09916_READ,REG_ADD_MAG_WIA1, 2)
+    if (data[0] == REG_VAL_MAG_WIA1) and ( data[1] == REG_VAL_MAG_WIA2) :
         bRet = true
         return bRet
+  # returns self.motion (and updates the legacy MotionVal): gyro in dps, then accel and mag
   def icm20948CalAvgValue(self):
-    MotionVal[0]=Gyro[0]/32.8
-    MotionVal[1]=Gyro[1]/32.8
-    MotionVal[2]=Gyro[2]/32.8
-    MotionVal[3]=Accel[0]
-    MotionVal[4]=Accel[1]
-    MotionVal[5]=Accel[2]
-    MotionVal[6]=Mag[0]
-    MotionVal[7]=Mag[1]
-    MotionVal[8]=Mag[2]
+    self.motion[0:3] = self.gyro / 32.8
+    self.motion[3:6] = self.accel
+    self.motion[6:9] = self.mag
+    MotionVal[:] = self.motion.tolist()
+    return self.motion
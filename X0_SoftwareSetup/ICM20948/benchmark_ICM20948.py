@@ -0,0 +1,50 @@
+#!/usr/bin/python
+# -*- coding:utf-8 -*-
+# measures the I2C cost of the read methods of ICM20948.py against the simulated sensor of
+# simulated_smbus.py: bus transactions and bytes per call (what limits the sample rate on a Pi,
+# where a transaction takes 0.2-0.5 ms at 100-400 kHz), and the time per call spent in Python.
+# Methods the driver does not have are skipped, so older versions of ICM20948.py can be compared
+#
+# usage: python3 benchmark_ICM20948.py
+import time
+
+import ICM20948
+from simulated_smbus import SimulatedICM20948Bus
+
+calls = 200
+
+def measure(bus, call, n):
+  bus.transactions.clear()
+  bytes_read = bus.bytes_read
+  start = time.perf_counter()
+  for _ in range(n):
+    call()
+  duration = time.perf_counter() - start
+  return sum(bus.transactions.values()) / n, (bus.bytes_read - bytes_read) / n, duration / n
+
+bus = SimulatedICM20948Bus()
+start = time.perf_counter()
+icm20948 = ICM20948.ICM20948(bus=bus)
+print("initialization: %d transactions, %.2f s" % (sum(bus.transactions.values()), time.perf_counter() - start))
+print()
+print("%-26s %14s %12s %12s" % ("method", "transactions", "bytes", "per call"))
+for name in ("icm20948_Gyro_Accel_Read", "icm20948MagRead", "icm20948Read"):
+  method = getattr(icm20948, name, None)
+  if method is None:
+    continue
+  n = calls if name != "icm20948MagRead" or hasattr(icm20948, "icm20948Read") else 5
+  transactions, bytes_read, duration = measure(bus, method, n)
+  print("%-26s %14.1f %12.1f %10.0fus" % (name, transactions, bytes_read, duration * 1e6))
+
+if hasattr(icm20948, "icm20948FifoEnable"):
+  # per sample, draining the FIFO every 20 ms at 1100 Hz
+  for mag in (False, True):
+    icm20948.icm20948FifoEnable(rate=1100, mag=mag)
+    bus.transactions.clear()
+    bytes_read = bus.bytes_read
+    samples = 0
+    for _ in range(25):
+      time.sleep(0.02)
+      samples += len(icm20948.icm20948FifoRead().timestamps)
+    icm20948.icm20948FifoDisable()
+    print("%-26s %14.2f %12.1f %12s" % ("icm20948FifoRead" + (" (mag)" if mag else ""), sum(bus.transactions.values()) / samples, (bus.bytes_read - bytes_read) / samples, "per sample"))
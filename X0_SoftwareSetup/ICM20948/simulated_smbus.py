@@ -0,0 +1,284 @@
+#!/usr/bin/python
+# -*- coding:utf-8 -*-
+# A simulated ICM-20948 (with its AK09916 magnetometer) behind an smbus-compatible interface, so
+# that ICM20948.py can be tested and benchmarked without a Raspberry Pi:
+#
+#   from simulated_smbus import SimulatedICM20948Bus
+#   bus = SimulatedICM20948Bus(accel=(0, 0, 16384), gyro=(10, -5, 3))
+#   icm20948 = ICM20948(bus=bus)
+#
+# It models the registers the driver uses: the four register banks, the accel/gyro output
+# registers, the FIFO (fed at the gyro output data rate), and the I2C master that reads and
+# writes the magnetometer through the SLV0..SLV3 registers into EXT_SENS_DATA. `transactions`
+# counts every bus call by method name, `bytes_read` counts the bytes they returned.
+import collections
+import time
+
+ICM20948_ADDRESS      = 0x68
+AK09916_ADDRESS       = 0x0C
+
+BANK_SEL              = 0x7F
+# bank 0
+WHO_AM_I              = 0x00
+USER_CTRL             = 0x03
+PWR_MGMT_1            = 0x06
+INT_STATUS_2          = 0x1B
+ACCEL_XOUT_H          = 0x2D
+EXT_SENS_DATA_00      = 0x3B
+FIFO_EN_1             = 0x66
+FIFO_EN_2             = 0x67
+FIFO_RST              = 0x68
+FIFO_MODE             = 0x69
+FIFO_COUNTH           = 0x70
+FIFO_R_W              = 0x72
+# bank 2
+GYRO_SMPLRT_DIV       = 0x00
+# bank 3
+I2C_SLV0_ADDR         = 0x03
+
+I2C_M_RD              = 0x0001  # i2c_msg flag of reads
+
+USER_CTRL_FIFO_EN     = 0x40
+USER_CTRL_I2C_MST_EN  = 0x20
+FIFO_SIZE             = 512
+GYRO_BASE_RATE        = 1100.0
+
+# AK09916 registers
+AK_WIA1               = 0x00
+AK_ST1                = 0x10
+AK_HXL                = 0x11
+AK_ST2                = 0x18
+AK_CNTL2              = 0x31
+AK_CNTL3              = 0x32
+
+def _int16_be(value):
+  value = int(round(value))
+  value = max(-32768, min(32767, value))
+  return [(value >> 8) & 0xFF, value & 0xFF]
+
+def _int16_le(value):
+  return _int16_be(value)[::-1]
+
+class SimulatedICM20948Bus(object):
+  # accel, gyro and mag are raw sensor counts (x, y, z), or callables that receive the seconds
+  # since the bus was created and return them. `clock` returns the time in seconds, `address` is
+  # the I2C address of the simulated sensor (0x69 for a second IMU with AD0 pulled high)
+  def __init__(self, accel=(0, 0, 16384), gyro=(0, 0, 0), mag=(200, -100, 300), clock=time.monotonic, address=ICM20948_ADDRESS):
+    self.address = address
+    self.accel = accel
+    self.gyro = gyro
+    self.mag = mag
+    self._clock = clock
+    self._created = clock()
+    self.transactions = collections.Counter()
+    self.bytes_read = 0
+    self._reset()
+
+  def _reset(self):
+    self._banks = [bytearray(128) for _ in range(4)]
+    self._bank = 0
+    self._banks[0][WHO_AM_I] = 0xEA
+    self._banks[0][PWR_MGMT_1] = 0x41
+    self._fifo = bytearray()
+    self._last_tick = None
+    self._mag_seconds = 0.0
+    self._ak = bytearray(0x40)
+    self._ak[AK_WIA1] = 0x48
+    self._ak[AK_WIA1 + 1] = 0x09
+
+  # smbus interface
+
+  def read_byte_data(self, address, register):
+    self.transactions["read_byte_data"] += 1
+    self.bytes_read += 1
+    self._check_address(address)
+    return self._read_registers(register, 1)[0]
+
+  def write_byte_data(self, address, register, value):
+    self.transactions["write_byte_data"] += 1
+    self._check_address(address)
+    self._write_registers(register, [value])
+
+  def read_i2c_block_data(self, address, register, length=32):
+    self.transactions["read_i2c_block_data"] += 1
+    self._check_address(address)
+    if length > 32:
+      raise ValueError("smbus block transfers are limited to 32 bytes")
+    self.bytes_read += length
+    return self._read_registers(register, length)
+
+  def write_i2c_block_data(self, address, register, values):
+    self.transactions["write_i2c_block_data"] += 1
+    self._check_address(address)
+    if len(values) > 32:
+      raise ValueError("smbus block transfers are limited to 32 bytes")
+    self._write_registers(register, values)
+
+  # smbus2's combined transfer: messages are smbus2.i2c_msg (or alike, with addr, flags, len, buf).
+  # A write sets the register pointer (and writes any further bytes), a read reads from it
+  def i2c_rdwr(self, *messages):
+    self.transactions["i2c_rdwr"] += 1
+    register = 0
+    for message in messages:
+      self._check_address(message.addr)
+      if message.flags & I2C_M_RD:
+        self.bytes_read += message.len
+        for i, value in enumerate(self._read_registers(register, message.len)):
+          message.buf[i] = bytes((value,))
+      else:
+        data = bytes(message.buf[:message.len])
+        register = data[0]
+        if len(data) > 1:
+          self._write_registers(register, data[1:])
+
+  def _check_address(self, address):
+    if address != self.address:
+      raise OSError(121, "Remote I/O error (no device at 0x%02X)" % address)
+
+  # registers
+
+  def _read_registers(self, register, length):
+    self._update()
+    bank = self._banks[self._bank]
+    if self._bank == 0 and register == FIFO_R_W:
+      # reads of FIFO_R_W pop the FIFO, the address does not increment
+      data = list(self._fifo[:length]) + [0xFF] * max(0, length - len(self._fifo))
+      del self._fifo[:length]
+      return data
+    if self._bank == 0 and register == FIFO_COUNTH:
+      count = len(self._fifo)
+      return [(count >> 8) & 0x1F, count & 0xFF][:length]
+    data = []
+    for offset in range(length):
+      address = register + offset
+      if address == BANK_SEL:
+        data.append(self._bank << 4)
+      else:
+        data.append(bank[address & 0x7F])
+    if self._bank == 0 and register <= INT_STATUS_2 < register + length:
+      bank[INT_STATUS_2] = 0
+    return data
+
+  def _write_registers(self, register, values):
+    for offset, value in enumerate(values):
+      address = register + offset
+      if address == BANK_SEL:
+        self._bank = (value >> 4) & 0x03
+        continue
+      self._update()
+      bank = self._banks[self._bank]
+      previous = bank[address]
+      bank[address] = value & 0xFF
+      if self._bank == 0:
+        if address == PWR_MGMT_1 and value & 0x80:
+          self._reset()
+        elif address == FIFO_RST and value & 0x1F:
+          self._fifo = bytearray()
+        elif address == USER_CTRL and value & USER_CTRL_I2C_MST_EN and not previous & USER_CTRL_I2C_MST_EN:
+          # the I2C master starts its slave transactions as soon as it is enabled
+          self._run_i2c_master()
+
+  # sensors
+
+  def _values(self, source, seconds):
+    return source(seconds) if callable(source) else source
+
+  def _gyro_rate(self):
+    return GYRO_BASE_RATE / (1 + self._banks[2][GYRO_SMPLRT_DIV])
+
+  # advances the sensors to the current time: one sample per tick of the gyro output data rate
+  def _update(self):
+    now = self._clock()
+    period = 1.0 / self._gyro_rate()
+    if self._last_tick is None:
+      self._last_tick = now
+      self._write_sample(now)
+      return
+    ticks = int((now - self._last_tick) / period)
+    if ticks <= 0:
+      return
+    fifo_on = self._banks[0][USER_CTRL] & USER_CTRL_FIFO_EN and (self._banks[0][FIFO_EN_2] & 0x1E or self._banks[0][FIFO_EN_1] & 0x0F)
+    # without the FIFO, only the newest sample is visible
+    first = 0 if fifo_on else ticks - 1
+    if fifo_on and ticks > FIFO_SIZE:
+      # more samples than fit into the FIFO: only the newest ones matter
+      self._banks[0][INT_STATUS_2] |= 0x01
+      first = ticks - FIFO_SIZE
+    for tick in range(first, ticks):
+      self._write_sample(self._last_tick + (tick + 1) * period)
+    self._last_tick += ticks * period
+
+  def _write_sample(self, now):
+    seconds = now - self._created
+    bank = self._banks[0]
+    output = []
+    for value in self._values(self.accel, seconds):
+      output += _int16_be(value)
+    for value in self._values(self.gyro, seconds):
+      output += _int16_be(value)
+    bank[ACCEL_XOUT_H:ACCEL_XOUT_H + 12] = bytes(output)
+    self._mag_seconds = seconds
+    if bank[USER_CTRL] & USER_CTRL_I2C_MST_EN:
+      self._run_i2c_master()
+    if bank[USER_CTRL] & USER_CTRL_FIFO_EN:
+      self._push_fifo()
+
+  def _push_fifo(self):
+    bank = self._banks[0]
+    packet = bytearray()
+    if bank[FIFO_EN_2] & 0x10:
+      packet += bank[ACCEL_XOUT_H:ACCEL_XOUT_H + 6]
+    for axis, bit in enumerate((0x02, 0x04, 0x08)):
+      if bank[FIFO_EN_2] & bit:
+        packet += bank[ACCEL_XOUT_H + 6 + 2 * axis:ACCEL_XOUT_H + 8 + 2 * axis]
+    # EXT_SENS_DATA of the enabled slaves, in slave order
+    position = EXT_SENS_DATA_00
+    for slave in range(4):
+      length = self._banks[3][I2C_SLV0_ADDR + 2 + 4 * slave] & 0x0F if self._banks[3][I2C_SLV0_ADDR + 2 + 4 * slave] & 0x80 else 0
+      if bank[FIFO_EN_1] & (1 << slave):
+        packet += bank[position:position + length]
+      position += length
+    if not packet:
+      return
+    if len(self._fifo) + len(packet) > FIFO_SIZE:
+      # snapshot mode: the FIFO stops when full
+      bank[INT_STATUS_2] |= 0x01
+      if not bank[FIFO_MODE] & 0x01:
+        del self._fifo[:len(packet)]
+        self._fifo += packet
+      return
+    self._fifo += packet
+
+  # magnetometer
+
+  def _run_i2c_master(self):
+    position = EXT_SENS_DATA_00
+    slaves = self._banks[3]
+    for slave in range(4):
+      base = I2C_SLV0_ADDR + 4 * slave
+      address, register, ctrl = slaves[base], slaves[base + 1], slaves[base + 2]
+      if not ctrl & 0x80:
+        continue
+      if address & 0x7F != AK09916_ADDRESS:
+        continue
+      if address & 0x80:
+        length = ctrl & 0x0F
+        data = self._read_ak(register, length)
+        self._banks[0][position:position + length] = bytes(data)
+        position += length
+      else:
+        self._write_ak(register, slaves[base + 3])
+
+  def _read_ak(self, register, length):
+    self._ak[AK_ST1] = 0x01 if self._ak[AK_CNTL2] & 0x1F else 0x00
+    output = []
+    for value in self._values(self.mag, self._mag_seconds):
+      output += _int16_le(value)
+    self._ak[AK_HXL:AK_HXL + 6] = bytes(output)
+    return list(self._ak[register:register + length])
+
+  def _write_ak(self, register, value):
+    if register == AK_CNTL3 and value & 0x01:
+      self._ak[AK_CNTL2] = 0
+      return
+    self._ak[register] = value
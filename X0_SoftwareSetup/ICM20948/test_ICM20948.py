@@ -0,0 +1,192 @@
+#!/usr/bin/python
+# -*- coding:utf-8 -*-
+# tests of ICM20948.py against the simulated sensor in simulated_smbus.py (these don't need a Pi)
+#
+#   python3 -m unittest test_ICM20948
+import threading
+import time
+import unittest
+
+import numpy as np
+
+import ICM20948
+from simulated_smbus import SimulatedICM20948Bus
+
+class FifoTests(unittest.TestCase):
+
+  @classmethod
+  def setUpClass(cls):
+    # the driver initializes for about a second (reset, gyro offset), so the tests share one
+    cls.bus = SimulatedICM20948Bus(accel=(100, -200, 16384), gyro=(33, -66, 0))
+    cls.icm20948 = ICM20948.ICM20948(bus=cls.bus)
+
+  def tearDown(self):
+    self.icm20948.icm20948FifoDisable()
+
+  def test_reads_every_sample_with_few_transactions(self):
+    self.icm20948.icm20948FifoEnable(rate=550)
+    self.assertEqual(self.icm20948.fifo_rate, 550.0)
+    samples = []
+    self.bus.transactions.clear()
+    for _ in range(5):
+      time.sleep(0.04)
+      samples.append(self.icm20948.icm20948FifoRead())
+    timestamps = np.concatenate([s.timestamps for s in samples])
+    accel = np.concatenate([s.accel for s in samples])
+    gyro = np.concatenate([s.gyro for s in samples])
+
+    # 200ms at 550Hz, give or take the scheduling of the sleeps
+    self.assertGreater(len(timestamps), 80)
+    self.assertLess(len(timestamps), 150)
+    self.assertTrue(np.all(accel == [100, -200, 16384]))
+    self.assertTrue(np.all(gyro == np.array([33, -66, 0]) - self.icm20948.gyro_offset))
+    self.assertTrue(np.all(np.diff(timestamps) > 0))
+    period = np.median(np.diff(timestamps)) / 1e9
+    self.assertAlmostEqual(period, 1 / 550.0, delta=0.3 / 550.0)
+    # each read is a few register accesses plus one block read per 32 bytes, instead of the
+    # two bank selects and one block read per sample of icm20948_Gyro_Accel_Read()
+    self.assertLess(sum(self.bus.transactions.values()), len(timestamps))
+    self.assertEqual(self.icm20948.fifo_overflows, 0)
+    self.assertIsNone(samples[0].mag)
+
+  def test_recovers_from_overflow(self):
+    self.icm20948.icm20948FifoEnable(rate=1100)
+    time.sleep(0.1)   # 110 samples do not fit into the 42 of the FIFO
+    samples = self.icm20948.icm20948FifoRead()
+    # the FIFO stopped when full, so the samples it kept are intact and spaced at the sample rate
+    self.assertEqual(len(samples.timestamps), 42)
+    self.assertTrue(np.all(samples.accel == [100, -200, 16384]))
+    self.assertTrue(np.allclose(np.diff(samples.timestamps), 1e9 / 1100, atol=1))
+    self.assertEqual(self.icm20948.fifo_overflows, 1)
+    time.sleep(0.02)
+    samples = self.icm20948.icm20948FifoRead()
+    self.assertGreater(len(samples.timestamps), 5)
+    self.assertTrue(np.all(samples.accel == [100, -200, 16384]))
+
+  def test_a_full_fifo_is_not_an_overflow(self):
+    seconds = [0.0]
+    bus = SimulatedICM20948Bus(accel=(1, 2, 3), clock=lambda: seconds[0])
+    icm20948 = ICM20948.ICM20948(bus=bus)
+    icm20948.icm20948FifoEnable(rate=1100)
+    seconds[0] += 42.5 / 1100   # exactly fills the FIFO
+    self.assertEqual(len(icm20948.icm20948FifoRead().timestamps), 42)
+    self.assertEqual(icm20948.fifo_overflows, 0)
+    seconds[0] += 43 / 1100     # one more than fits
+    self.assertEqual(len(icm20948.icm20948FifoRead().timestamps), 42)
+    self.assertEqual(icm20948.fifo_overflows, 1)
+
+  def test_includes_the_magnetometer(self):
+    self.icm20948.icm20948FifoEnable(rate=220, mag=True)
+    time.sleep(0.05)
+    samples = self.icm20948.icm20948FifoRead()
+    self.assertGreater(len(samples.timestamps), 5)
+    self.assertTrue(np.all(samples.accel == [100, -200, 16384]))
+    self.assertTrue(np.all(samples.mag == [200, 100, -300]))
+
+  def test_requires_enable(self):
+    with self.assertRaises(RuntimeError):
+      self.icm20948.icm20948FifoRead()
+
+class InstanceTests(unittest.TestCase):
+
+  @classmethod
+  def setUpClass(cls):
+    cls.first = ICM20948.ICM20948(bus=SimulatedICM20948Bus(accel=(1, 2, 3), gyro=(0, 0, 0), mag=(10, 20, 30)))
+    cls.second = ICM20948.ICM20948(address=0x69, bus=SimulatedICM20948Bus(accel=(-4, -5, -6), gyro=(0, 0, 0), mag=(-7, 8, 9), address=0x69))
+
+  def test_instances_keep_their_own_readings(self):
+    first = self.first.icm20948Read().copy()
+    second = self.second.icm20948Read()
+    self.assertEqual(first["accel"].tolist(), [1, 2, 3])
+    self.assertEqual(first["mag"].tolist(), [10, -20, -30])
+    self.assertEqual(second["accel"].tolist(), [-4, -5, -6])
+    self.assertEqual(self.first.accel.tolist(), [1, 2, 3])
+    self.assertGreater(second["timestamp"], first["timestamp"])
+    # the legacy globals hold the latest reading of the legacy methods, of any instance
+    self.second.icm20948_Gyro_Accel_Read()
+    self.second.icm20948MagRead()
+    self.assertEqual(ICM20948.Accel, [-4, -5, -6])
+    self.assertEqual(ICM20948.Mag, [-7, -8, -9])
+    self.first.icm20948Read()
+    self.assertEqual(ICM20948.Accel, [-4, -5, -6])
+    self.assertEqual(ICM20948.Mag, [-7, -8, -9])
+    self.assertEqual(self.second.icm20948CalAvgValue()[3:].tolist(), [-4, -5, -6, -7, -8, -9])
+    self.assertEqual(ICM20948.MotionVal[3:], [-4, -5, -6, -7, -8, -9])
+
+  def test_reads_into_a_recording(self):
+    recording = np.zeros(3, dtype=ICM20948.IMU_SAMPLE)
+    for i in range(3):
+      self.first.icm20948Read(mag=False, out=recording[i])
+    self.assertTrue(np.all(recording["accel"] == [1, 2, 3]))
+    self.assertTrue(np.all(np.diff(recording["timestamp"]) > 0))
+
+  def test_threads_read_concurrently(self):
+    # unsynchronized reads would interleave bank selects, and read other registers than accel
+    results = {self.first: [], self.second: []}
+    def read(icm20948):
+      for _ in range(50):
+        icm20948.icm20948_Gyro_Accel_Read()
+        results[icm20948].append(icm20948.accel.tolist())
+    threads = [threading.Thread(target=read, args=(icm20948,)) for icm20948 in (self.first, self.first, self.second)]
+    for thread in threads:
+      thread.start()
+    for thread in threads:
+      thread.join()
+    self.assertEqual(results[self.first], [[1, 2, 3]] * 100)
+    self.assertEqual(results[self.second], [[-4, -5, -6]] * 50)
+
+  def test_magnetometer_is_read_with_accel_and_gyro(self):
+    bus = self.first._bus
+    bus.transactions.clear()
+    start = time.perf_counter()
+    sample = self.first.icm20948Read()
+    self.assertLess(time.perf_counter() - start, 0.005)
+    self.assertEqual(sample["mag"].tolist(), [10, -20, -30])
+    # one block read of accel, gyro and mag (bank 0 is still selected)
+    self.assertEqual(bus.transactions, {"read_i2c_block_data": 1})
+    self.first.icm20948MagRead()
+    self.assertEqual(ICM20948.Mag, [10, -20, -30])
+
+  def test_magnetometer_mode_is_written_once(self):
+    bus = self.first._bus
+    self.assertEqual(bus._banks[3][ICM20948.REG_ADD_I2C_SLV1_CTRL], 0)
+    # while the I2C master auto-reads the magnetometer, nothing writes its mode register again
+    bus._ak[ICM20948.REG_ADD_MAG_CNTL2] = 0
+    self.addCleanup(bus._ak.__setitem__, ICM20948.REG_ADD_MAG_CNTL2, ICM20948.REG_VAL_MAG_MODE_100HZ)
+    time.sleep(0.01)
+    self.first.icm20948Read()
+    self.assertEqual(bus._ak[ICM20948.REG_ADD_MAG_CNTL2], 0)
+
+  def test_orientation_is_per_instance(self):
+    self.first.imuAHRSupdate(0.0, 0.0, 1.0, 0, 0, 16384, 10, 0, 0)
+    self.assertNotEqual(self.first.q.tolist(), [1.0, 0.0, 0.0, 0.0])
+    self.assertEqual(self.second.q.tolist(), [1.0, 0.0, 0.0, 0.0])
+    self.assertEqual(ICM20948.q0, self.first.q[0])
+
+class TransportTests(unittest.TestCase):
+
+  def setUp(self):
+    self.bus = SimulatedICM20948Bus()
+    self.transport = ICM20948.I2CTransport(self.bus, ICM20948.I2C_ADD_ICM20948)
+
+  def test_elides_redundant_bank_selects(self):
+    for bank in (ICM20948.REG_VAL_REG_BANK_0, ICM20948.REG_VAL_REG_BANK_0, ICM20948.REG_VAL_REG_BANK_2, ICM20948.REG_VAL_REG_BANK_2):
+      self.transport.select_bank(bank)
+    self.assertEqual(self.bus.transactions["write_byte_data"], 2)
+    self.assertEqual(self.transport.transactions["bank_select_elided"], 2)
+    self.transport.invalidate()
+    self.transport.select_bank(ICM20948.REG_VAL_REG_BANK_2)
+    self.assertEqual(self.bus.transactions["write_byte_data"], 3)
+
+  def test_multi_register_transfers(self):
+    self.transport.select_bank(ICM20948.REG_VAL_REG_BANK_3)
+    self.transport.write(ICM20948.REG_ADD_I2C_SLV0_ADDR, 0x8C, 0x10, 0x89)
+    self.assertEqual(self.bus._banks[3][0x03:0x06], bytes((0x8C, 0x10, 0x89)))
+    self.transport.select_bank(ICM20948.REG_VAL_REG_BANK_0)
+    self.assertEqual(self.transport.read(ICM20948.REG_ADD_WIA, 40)[0], ICM20948.REG_VAL_WIA)
+    expected = 1 if ICM20948.i2c_msg is not None else 2
+    self.assertEqual(self.bus.transactions["write_i2c_block_data"], 1)
+    self.assertEqual(self.bus.transactions["i2c_rdwr"] + self.bus.transactions["read_i2c_block_data"], expected)
+
+if __name__ == "__main__":
+  unittest.main()
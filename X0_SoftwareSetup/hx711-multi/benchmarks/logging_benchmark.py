@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+"""
+Measure the per-read cost of logging and of the optional read counters in HX711.read_raw().
+Runs anywhere, no Raspberry Pi needed (HX711 is attached to simulated chips)
+
+For each configuration the best time per read (one conversion of every ADC) is printed:
+    logging off:        log_level WARN, the default. Debug messages must cost nothing
+    counters:           as logging off, with enable_counters()
+    debug (discarded):  log_level DEBUG with output to a NullHandler, the worst case of formatting every message
+
+usage: python3 benchmarks/logging_benchmark.py
+"""
+
+from logging import NullHandler
+from timeit import Timer
+from hx711_multi import HX711, SimulatedGPIOBackend, SimulatedHX711, get_logger
+from hx711_multi.instrumentation import _ConsoleHandler
+
+adc_counts = [1, 4]
+readings_to_average = 100
+repeat = 5
+
+# the simulated chips make each clock pulse slower than on hardware, which must not power them down
+HX711._POWER_DOWN_TIME = SimulatedHX711._POWER_DOWN_TIME = 0.005
+
+
+def per_read(hx711):
+    timer = Timer(lambda: hx711.read_raw(readings_to_average=readings_to_average))
+    return min(timer.repeat(repeat, 3)) / 3 / readings_to_average
+
+
+def quiet_debug_logging():
+    """ DEBUG level without printing: the console handler drops everything, a NullHandler receives it """
+    logger = get_logger('DEBUG')
+    for handler in logger.handlers:
+        if isinstance(handler, _ConsoleHandler):
+            handler.setLevel('CRITICAL')
+    logger.addHandler(NullHandler())
+
+
+print(f'{"ADCs":>5} {"logging off":>12} {"counters":>12} {"debug (discarded)":>18}')
+for n_adcs in adc_counts:
+    dout_pins = list(range(2, 2 + n_adcs))
+    backend = SimulatedGPIOBackend.for_pins(1, dout_pins, values=5000, sample_rate=None, noise_stdev=20, seed=0)
+    hx711 = HX711(dout_pins, 1, log_level='WARN', all_or_nothing=False, gpio_backend=backend)
+    logging_off = per_read(hx711)
+    hx711.enable_counters()
+    counters = per_read(hx711)
+    hx711.disable_counters()
+    quiet_debug_logging()
+    debug = per_read(hx711)
+    get_logger('WARN')
+    print(f'{n_adcs:>5} {logging_off * 1e6:>10.1f}us {counters * 1e6:>10.1f}us {debug * 1e6:>16.1f}us')
@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""
+Compare ADC._calculate_measurement() (statistics module, one ADC at a time) with the vectorized
+HX711._calculate_measurements(), which processes the reads of all ADCs as one array.
+Runs anywhere, no Raspberry Pi needed (HX711 is attached to simulated chips)
+
+usage: python3 benchmarks/measurement_benchmark.py
+"""
+
+from logging import getLogger
+from timeit import Timer
+import numpy as np
+from hx711_multi import HX711, SimulatedGPIOBackend
+from hx711_multi.hx711 import ADC
+
+adc_counts = [1, 4, 16]
+readings_to_average = [1, 10, 100, 1000]
+repeat = 5
+
+
+def make_adcs(raw_reads):
+    """ ADCs in the state they have after a set of reads, one per column of raw_reads """
+    adcs = []
+    for column in range(raw_reads.shape[1]):
+        adc = ADC(column, getLogger('hx711-multi-benchmark'), None)
+        adc._init_set_of_reads()
+        adc._ready = True
+        for raw_read in raw_reads[:, column].tolist():
+            adc._current_raw_read = raw_read
+            adc._finish_raw_read()
+        adcs.append(adc)
+    return adcs
+
+
+def reference(adcs):
+    for adc in adcs:
+        adc._ready = True
+        adc._calculate_measurement()
+
+
+def vectorized(hx711):
+    for adc in hx711._adcs:
+        adc._ready = True
+    hx711._calculate_measurements()
+
+
+def best_time(function, argument):
+    timer = Timer(lambda: function(argument))
+    number, _ = timer.autorange()
+    return min(timer.repeat(repeat, number)) / number
+
+
+rng = np.random.default_rng(0)
+print(f'{"ADCs":>5} {"reads":>6} {"reference":>12} {"vectorized":>12} {"speedup":>8}')
+for n_adcs in adc_counts:
+    for n_reads in readings_to_average:
+        # load cell like data: noise of a few counts, 1% failed reads
+        signed = rng.normal(rng.uniform(-1e5, 1e5, n_adcs), 20, (n_reads, n_adcs)).round().astype(np.int64)
+        raw_reads = signed & 0xFFFFFF
+        raw_reads[rng.random(raw_reads.shape) < 0.01] = 0xFFFFFF
+        adcs = make_adcs(raw_reads)
+        dout_pins = list(range(2, 2 + n_adcs))
+        hx711 = HX711(dout_pins, 1, log_level='CRITICAL',
+                      gpio_backend=SimulatedGPIOBackend.for_pins(1, dout_pins, sample_rate=None))
+        hx711._adcs = make_adcs(raw_reads)
+        reference_time = best_time(reference, adcs)
+        vectorized_time = best_time(vectorized, hx711)
+        print(f'{n_adcs:>5} {n_reads:>6} {reference_time * 1e3:>10.3f}ms {vectorized_time * 1e3:>10.3f}ms '
+              f'{reference_time / vectorized_time:>7.1f}x')
@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+"""
+Measure the memory used by HX711.read_raw() and the garbage collector work it causes,
+as seen during a long recording session. Runs anywhere, no Raspberry Pi needed (HX711 is attached to simulated chips)
+
+For each configuration:
+    retained:       memory still allocated after read_raw() returned (samples kept in the ADCs)
+    peak:           highest memory allocated during read_raw(), above what was allocated before
+    gc/1000 reads:  garbage collections (any generation) per 1000 calls of read_raw()
+
+usage: python3 benchmarks/memory_benchmark.py
+"""
+
+import gc
+import tracemalloc
+from hx711_multi import HX711, SimulatedGPIOBackend, SimulatedHX711
+
+adc_counts = [1, 4, 16]
+readings_to_average = [10, 100, 1000]
+calls = 20
+
+# the simulated chips make each clock pulse slower than on hardware, which must not power them down
+HX711._POWER_DOWN_TIME = SimulatedHX711._POWER_DOWN_TIME = 0.005
+
+
+def gc_collections():
+    return sum(stats['collections'] for stats in gc.get_stats())
+
+
+print(f'{"ADCs":>5} {"reads":>6} {"retained":>10} {"peak":>10} {"gc/1000 reads":>14}')
+for n_adcs in adc_counts:
+    dout_pins = list(range(2, 2 + n_adcs))
+    backend = SimulatedGPIOBackend.for_pins(1, dout_pins, values=5000, sample_rate=None, noise_stdev=20, seed=0)
+    hx711 = HX711(dout_pins, 1, log_level='CRITICAL', all_or_nothing=False, gpio_backend=backend)
+    for n_reads in readings_to_average:
+        # warm up, so buffers that are allocated once do not count
+        hx711.read_raw(readings_to_average=n_reads)
+        hx711.read_raw(readings_to_average=n_reads)
+
+        tracemalloc.start()
+        before, _ = tracemalloc.get_traced_memory()
+        hx711.read_raw(readings_to_average=n_reads)
+        after, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        collections = gc_collections()
+        for _ in range(calls):
+            hx711.read_raw(readings_to_average=n_reads)
+        collections = gc_collections() - collections
+
+        print(f'{n_adcs:>5} {n_reads:>6} {(after - before) / 1024:>8.1f}kB {(peak - before) / 1024:>8.1f}kB '
+              f'{collections * 1000 / (calls * n_reads):>14.2f}')
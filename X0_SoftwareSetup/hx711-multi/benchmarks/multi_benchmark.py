@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""
+Measure how the conversions per second of MultiHX711 scale with the number of HX711 groups (clock lines).
+Runs anywhere, no Raspberry Pi needed (HX711 is attached to simulated chips converting at 80Hz).
+Like independent chips on real hardware, the chips of each group convert with a different phase
+
+For each number of groups (2 ADCs per group) the valid ADC conversions per second are printed for the
+following ways of reading. The "+dead" rows add one more group whose only ADC never becomes ready (e.g. a
+disconnected cell), which should not slow down the other groups:
+    sequential:     read_raw(readings_to_average=1) of one group after the other, without MultiHX711
+    interleaved:    MultiHX711 streaming in 'interleaved' mode
+    threads:        MultiHX711 streaming in 'threads' mode
+
+usage: python3 benchmarks/multi_benchmark.py
+"""
+
+import time
+import numpy as np
+from hx711_multi import HX711, MultiHX711, SimulatedGPIOBackend, SimulatedHX711
+
+group_counts = [1, 2, 4]
+adcs_per_group = 2
+seconds = 2.
+
+# the simulated chips make each clock pulse slower than on hardware, which must not power them down
+HX711._POWER_DOWN_TIME = SimulatedHX711._POWER_DOWN_TIME = 0.005
+
+
+def make_groups(n_groups, dead_group=False):
+    backend = SimulatedGPIOBackend()
+    groups = []
+    if dead_group:
+        # no simulated chip on the dout pin, so it reads HIGH (not ready) forever
+        groups.append(HX711([21], 20, log_level='CRITICAL', gpio_backend=backend))
+    for group in range(n_groups):
+        sck_pin = group * (adcs_per_group + 1) + 1
+        dout_pins = list(range(sck_pin + 1, sck_pin + 1 + adcs_per_group))
+        # spread the conversions of the groups over the 12.5ms conversion period
+        time.sleep(0.0125 / n_groups)
+        for dout_pin in dout_pins:
+            backend.add_device(SimulatedHX711(sck_pin, dout_pin, value=5000, sample_rate=80.))
+        groups.append(HX711(dout_pins, sck_pin, log_level='CRITICAL', gpio_backend=backend))
+    return groups
+
+
+def sequential(groups):
+    conversions = 0
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        for group in groups:
+            conversions += sum(value is not None for value in group.read_raw(readings_to_average=1))
+    return conversions / seconds
+
+
+def streaming(groups, mode):
+    multi = MultiHX711(groups, mode=mode)
+    multi.start_streaming(buffer_size=4096)
+    time.sleep(seconds)
+    multi.stop_streaming()
+    return np.count_nonzero(~np.isnan(multi.get_samples().values)) / seconds
+
+
+print(f'{"groups":>11} {"ADCs":>5} {"sequential":>12} {"interleaved":>12} {"threads":>12}')
+for dead_group in (False, True):
+    for n_groups in group_counts:
+        results = [sequential(make_groups(n_groups, dead_group)),
+                   streaming(make_groups(n_groups, dead_group), 'interleaved'),
+                   streaming(make_groups(n_groups, dead_group), 'threads')]
+        label = f'{n_groups}{" +dead" if dead_group else ""}'
+        print(f'{label:>11} {n_groups * adcs_per_group:>5} ' + ' '.join(f'{result:>10.0f}/s' for result in results))
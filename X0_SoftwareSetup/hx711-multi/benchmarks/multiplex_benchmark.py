@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+"""
+Measure how many valid conversions per second an HX711 delivers when sampling both channel A/128 and channel B/32,
+by switching the channel and calling reset() before each block of reads (as the driver required before multiplexing),
+compared to set_multiplexing(), which only discards the settling conversions after each switch.
+Runs anywhere, no Raspberry Pi needed (HX711 is attached to simulated chips converting at 80Hz)
+
+usage: python3 benchmarks/multiplex_benchmark.py
+"""
+
+from time import perf_counter
+from hx711_multi import HX711, SimulatedGPIOBackend, SimulatedHX711
+
+seconds = 5.
+dout_pins = [2, 3]
+
+# the simulated chips make each clock pulse slower than on hardware, which must not power them down
+HX711._POWER_DOWN_TIME = SimulatedHX711._POWER_DOWN_TIME = 0.005
+
+
+def make_hx711():
+    backend = SimulatedGPIOBackend([SimulatedHX711(1, dout_pin, value=5000, channel_B_value=-2000, sample_rate=80.)
+                                    for dout_pin in dout_pins])
+    return HX711(dout_pins, 1, log_level='CRITICAL', gpio_backend=backend)
+
+
+def reset_per_switch(block_A, block_B):
+    hx711 = make_hx711()
+    counts = {'A': 0, 'B': 0}
+    start = perf_counter()
+    while perf_counter() - start < seconds:
+        for channel, block in (('A', block_A), ('B', block_B)):
+            hx711._channel_select = channel
+            hx711.reset()
+            hx711.read_raw(readings_to_average=block)
+            counts[channel] += len(hx711.timestamps)
+    return counts['A'], counts['B'], perf_counter() - start
+
+
+def multiplexed(block_A, block_B):
+    hx711 = make_hx711()
+    hx711.set_multiplexing([('A', 128, block_A), ('B', 32, block_B)])
+    counts = [0, 0]
+    start = perf_counter()
+    while perf_counter() - start < seconds:
+        samples = hx711.read_multiplexed()
+        counts[0] += len(samples[('A', 128)][0])
+        counts[1] += len(samples[('B', 32)][0])
+    return counts[0], counts[1], perf_counter() - start
+
+
+print(f'{"switching":<20} {"pattern":>8} {"A/s":>7} {"B/s":>7} {"combined/s":>11}')
+for block_A, block_B in ((1, 1), (8, 2), (20, 20)):
+    for label, function in (('reset() per switch', reset_per_switch), ('set_multiplexing()', multiplexed)):
+        count_A, count_B, elapsed = function(block_A, block_B)
+        print(f'{label:<20} {f"{block_A}A+{block_B}B":>8} {count_A / elapsed:>7.1f} {count_B / elapsed:>7.1f} '
+              f'{(count_A + count_B) / elapsed:>11.1f}')
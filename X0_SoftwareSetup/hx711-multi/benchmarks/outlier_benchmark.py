@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+Compare the outlier filters of set_outlier_filter() with the default filtering of read_raw(readings_to_average=10),
+which discards every set of 10 reads whose deviations from the median have a standard deviation over 100.
+For each motion trace it prints the fraction of reads that end up in a measurement (retention), the RMS error of
+those measurements against the noise-free load, and the CPU time per read.
+Traces are synthetic (quiet standing, sway, stepping on and off, spikes) unless a recorded trace is given: a .npy file
+or a CSV file with one column of raw reads at 80Hz. Runs anywhere, no Raspberry Pi needed
+
+usage: python3 benchmarks/outlier_benchmark.py [trace.npy|trace.csv]
+"""
+
+import sys
+from logging import getLogger
+from time import perf_counter_ns
+import numpy as np
+from hx711_multi import HampelFilter, MADClipping, RateLimiter, StdevRejection
+from hx711_multi.hx711 import ADC
+
+rate = 80.
+seconds = 120.
+set_size = 10
+
+
+def synthetic_traces():
+    rng = np.random.default_rng(0)
+    t = np.arange(int(seconds * rate)) / rate
+    standing = np.full_like(t, 40000.)
+    sway = 40000. + 1500. * np.sin(2 * np.pi * 0.4 * t) + 600. * np.sin(2 * np.pi * 1.3 * t)
+    steps = np.where((t % 10.) < 5., 40000., 2000.)
+    spikes = standing.copy()
+    spikes[rng.choice(len(t), len(t) // 50, replace=False)] += rng.choice([-1, 1], len(t) // 50) * 30000.
+    traces = {}
+    for name, load in (('standing', standing), ('sway', sway), ('stepping', steps), ('spikes', spikes)):
+        # the clean load is the reference, spikes are not part of it
+        reference = standing if name == 'spikes' else load
+        traces[name] = (np.round(load + rng.normal(0., 30., len(t))).astype(int).tolist(), reference)
+    return traces
+
+
+def recorded_trace(path):
+    reads = np.load(path) if path.endswith('.npy') else np.loadtxt(path, delimiter=',', ndmin=2)[:, 0]
+    reads = np.asarray(reads, dtype=float).ravel()
+    # without a noise-free reference, score against the centered 9-read median
+    padded = np.pad(reads, 4, mode='edge')
+    reference = np.median(np.lib.stride_tricks.sliding_window_view(padded, 9), axis=1)
+    return {path: (np.round(reads).astype(int).tolist(), reference)}
+
+
+def run(reads, reference, outlier_filter):
+    """ measurement of each set of reads as read_raw() computes it, returns (retention, RMS error, ns per read) """
+    logger = getLogger('hx711-multi-benchmark')
+    logger.setLevel('CRITICAL')
+    adc = ADC(0, logger, None)
+    adc.set_outlier_filter(outlier_filter)
+    errors = []
+    kept = 0
+    elapsed = 0
+    for start in range(0, len(reads) - set_size + 1, set_size):
+        adc._init_set_of_reads()
+        adc._ready = True
+        for read in reads[start:start + set_size]:
+            # 24 bit two's complement, as the HX711 sends it
+            adc._current_raw_read = read & 0xFFFFFF
+            adc._finish_raw_read()
+        begin = perf_counter_ns()
+        ok = adc._calculate_measurement()
+        elapsed += perf_counter_ns() - begin
+        if ok:
+            kept += len(adc._reads_filtered)
+            errors.append(adc.measurement - np.mean(reference[start:start + set_size]))
+    rms = np.sqrt(np.mean(np.square(errors))) if errors else float('nan')
+    return kept / len(reads), rms, elapsed / len(reads)
+
+
+strategies = (
+    ('default read_raw()', lambda: None),
+    ('stdev', lambda: StdevRejection()),
+    ('hampel', lambda: HampelFilter()),
+    ('mad', lambda: MADClipping()),
+    ('rate', lambda: RateLimiter(max_step=500)),
+)
+
+traces = recorded_trace(sys.argv[1]) if len(sys.argv) > 1 else synthetic_traces()
+print(f'{"trace":<10} {"filter":<20} {"retention":>10} {"RMS error":>10} {"ns/read":>8}')
+for trace, (reads, reference) in traces.items():
+    for label, factory in strategies:
+        retention, rms, ns = run(reads, reference, factory())
+        print(f'{trace:<10} {label:<20} {retention:>10.1%} {rms:>10.1f} {ns:>8.0f}')
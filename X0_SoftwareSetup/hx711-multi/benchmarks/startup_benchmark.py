@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+"""
+Measure the startup time of a station: create HX711, reset() and zero() it, then save the calibration so that the
+next start only needs load_calibration(). Runs anywhere, no Raspberry Pi needed
+(HX711 is attached to simulated chips converting at 80Hz, with noise like a load cell)
+
+usage: python3 benchmarks/startup_benchmark.py
+"""
+
+import os
+import tempfile
+from contextlib import contextmanager
+from time import perf_counter
+from unittest import mock
+from hx711_multi import HX711, SimulatedGPIOBackend, SimulatedHX711
+
+dout_pins = [2, 3, 4, 14]
+readings_to_average = 128  # as in tests/identify.py
+tolerance = 2.
+
+
+@contextmanager
+def widened_power_down_time(seconds=0.005):
+    """ the simulated chips make each clock pulse slower than on hardware, which must not power them down """
+    with mock.patch.object(HX711, '_POWER_DOWN_TIME', seconds), mock.patch.object(SimulatedHX711, '_POWER_DOWN_TIME', seconds):
+        yield
+
+
+def timed(function, *args, **kwargs):
+    start = perf_counter()
+    result = function(*args, **kwargs)
+    return perf_counter() - start, result
+
+
+def make_hx711():
+    backend = SimulatedGPIOBackend.for_pins(1, dout_pins, values=[-81000, 12000, 5000, -3000],
+                                            sample_rate=80., noise_stdev=10., seed=0)
+    return HX711(dout_pins, 1, log_level='CRITICAL', all_or_nothing=False, gpio_backend=backend)
+
+
+def main():
+    path = os.path.join(tempfile.mkdtemp(), 'calibration.json')
+    print(f'{"startup":<40} {"init":>7} {"reset":>7} {"zero":>7} {"total":>7} {"reads":>6}')
+    for label, zero_kwargs in ((f'zero({readings_to_average})', {}),
+                               (f'zero({readings_to_average}, tolerance={tolerance})', {'tolerance': tolerance})):
+        init_time, hx711 = timed(make_hx711)
+        reset_time, _ = timed(hx711.reset)
+        zero_time, reads = timed(hx711.zero, readings_to_average, **zero_kwargs)
+        hx711.save_calibration(path)
+        print(f'{label:<40} {init_time:>6.2f}s {reset_time:>6.2f}s {zero_time:>6.2f}s '
+              f'{init_time + reset_time + zero_time:>6.2f}s {reads:>6}')
+
+    init_time, hx711 = timed(make_hx711)
+    load_time, loaded = timed(hx711.load_calibration, path)
+    assert loaded
+    print(f'{"load_calibration()":<40} {init_time:>6.2f}s {"-":>7} {load_time:>6.2f}s {init_time + load_time:>6.2f}s {0:>6}')
+
+
+if __name__ == '__main__':
+    with widened_power_down_time():
+        main()
@@ -0,0 +1,243 @@
+#!/usr/bin/env python3
+"""
+Measure how fast the driver itself runs: HX711.read_raw(), HX711.zero() and the measurement calculation
+(ADC._calculate_measurement() and the vectorized HX711._calculate_measurements()) at 1 to 16 ADCs and
+1 to 1000 readings_to_average. The simulated chips are always ready (sample_rate=None), so the results are the cost of
+the driver and of the simulated GPIO, not the 10/80Hz of the HX711. Runs anywhere, no Raspberry Pi needed
+
+For each benchmark and configuration:
+    samples/s:      reads (of all ADCs at once) per second
+    p50/p90/p99:    latency of one read: the time of a call divided by the number of reads it made
+    peak:           highest memory allocated during one call, above what was allocated before
+    retained:       memory still allocated after the call returned
+    gc/1000:        garbage collections (any generation) per 1000 reads
+
+Results are saved as JSON with --output. With --compare the results are checked against an earlier JSON file, and
+the script exits with status 1 if any configuration got more than --tolerance slower, so regressions of the driver
+are caught off-hardware, e.g. in CI
+
+usage: python3 benchmarks/throughput_benchmark.py [--quick] [--output results.json] [--compare baseline.json] [--tolerance 0.25]
+"""
+
+import argparse
+import gc
+import json
+import platform
+import sys
+import time
+import tracemalloc
+from contextlib import contextmanager
+from logging import getLogger
+from unittest import mock
+import numpy as np
+from hx711_multi import HX711, SimulatedGPIOBackend, SimulatedHX711
+from hx711_multi.hx711 import ADC
+
+adc_counts = [1, 2, 4, 8, 16]
+readings_to_average = [1, 10, 100, 1000]
+# each configuration is repeated for at least min_time seconds and min_calls calls
+min_time = 0.5
+min_calls = 3
+
+
+@contextmanager
+def widened_power_down_time(seconds=0.005):
+    """ the simulated chips make each clock pulse slower than on hardware, which must not power them down """
+    with mock.patch.object(HX711, '_POWER_DOWN_TIME', seconds), mock.patch.object(SimulatedHX711, '_POWER_DOWN_TIME', seconds):
+        yield
+
+
+def gc_collections():
+    return sum(stats['collections'] for stats in gc.get_stats())
+
+
+def make_hx711(n_adcs):
+    dout_pins = list(range(2, 2 + n_adcs))
+    backend = SimulatedGPIOBackend.for_pins(1, dout_pins, values=5000, sample_rate=None, noise_stdev=20, seed=0)
+    return HX711(dout_pins, 1, log_level='CRITICAL', all_or_nothing=False, gpio_backend=backend)
+
+
+def make_adcs(n_adcs, n_reads, rng):
+    """ ADCs in the state they have after a set of reads of load cell like data, as in measurement_benchmark.py """
+    signed = rng.normal(rng.uniform(-1e5, 1e5, n_adcs), 20, (n_reads, n_adcs)).round().astype(np.int64)
+    raw_reads = signed & 0xFFFFFF
+    logger = getLogger('hx711-multi-benchmark')
+    logger.setLevel('CRITICAL')
+    adcs = []
+    for column in range(n_adcs):
+        adc = ADC(column, logger, None)
+        adc._init_set_of_reads()
+        adc._ready = True
+        for raw_read in raw_reads[:, column].tolist():
+            adc._current_raw_read = raw_read
+            adc._finish_raw_read()
+        adcs.append(adc)
+    return adcs
+
+
+def read_raw_case(n_adcs, n_reads, rng):
+    hx711 = make_hx711(n_adcs)
+
+    def call():
+        hx711.read_raw(readings_to_average=n_reads)
+        # only successful reads are stamped, failed ones do not count as samples
+        return len(hx711.timestamps)
+
+    return call
+
+
+def zero_case(n_adcs, n_reads, rng):
+    hx711 = make_hx711(n_adcs)
+
+    def call():
+        return hx711.zero(readings_to_average=n_reads)
+
+    return call
+
+
+def calculate_measurement_case(n_adcs, n_reads, rng):
+    adcs = make_adcs(n_adcs, n_reads, rng)
+
+    def call():
+        for adc in adcs:
+            adc._ready = True
+            adc._calculate_measurement()
+        return n_reads
+
+    return call
+
+
+def calculate_measurements_case(n_adcs, n_reads, rng):
+    hx711 = make_hx711(n_adcs)
+    hx711._adcs = make_adcs(n_adcs, n_reads, rng)
+
+    def call():
+        for adc in hx711._adcs:
+            adc._ready = True
+        hx711._calculate_measurements()
+        return n_reads
+
+    return call
+
+
+benchmarks = {
+    'read_raw': read_raw_case,
+    'zero': zero_case,
+    '_calculate_measurement': calculate_measurement_case,
+    '_calculate_measurements': calculate_measurements_case,
+}
+
+
+def run(call):
+    """ returns the result of one configuration, see the module docstring """
+    # warm up, so buffers that are allocated once do not count
+    call()
+    call()
+
+    tracemalloc.start()
+    before, _ = tracemalloc.get_traced_memory()
+    call()
+    after, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    samples = 0
+    latencies = []
+    calls = 0
+    collections = gc_collections()
+    start = time.perf_counter_ns()
+    elapsed = 0
+    while calls < min_calls or elapsed < min_time * 1e9:
+        begin = time.perf_counter_ns()
+        count = call()
+        end = time.perf_counter_ns()
+        samples += count
+        if count:
+            latencies.append((end - begin) / count)
+        calls += 1
+        elapsed = end - start
+    collections = gc_collections() - collections
+    if latencies:
+        p50, p90, p99 = np.percentile(latencies, [50, 90, 99])
+        latency = {'p50': float(p50), 'p90': float(p90), 'p99': float(p99), 'max': float(max(latencies))}
+    else:
+        # no call made a successful read
+        latency = {'p50': None, 'p90': None, 'p99': None, 'max': None}
+    return {
+        'samples_per_s': samples / (elapsed / 1e9),
+        'latency_ns': latency,
+        'peak_bytes': peak - before,
+        'retained_bytes': after - before,
+        'gc_per_1000_samples': collections * 1000 / max(samples, 1),
+        'calls': calls,
+    }
+
+
+def format_latency(latency_ns):
+    return f'{"-":>9}' if latency_ns is None else f'{latency_ns / 1e3:>7.1f}us'
+
+
+def compare(results, baseline, tolerance):
+    """ print the configurations that got slower than the baseline by more than tolerance, returns their number """
+    previous = {(result['benchmark'], result['adcs'], result['readings_to_average']): result
+                for result in baseline['results']}
+    regressions = 0
+    for result in results:
+        old = previous.get((result['benchmark'], result['adcs'], result['readings_to_average']))
+        if old is None or not old['samples_per_s']:
+            continue
+        ratio = result['samples_per_s'] / old['samples_per_s']
+        if ratio < 1 - tolerance:
+            regressions += 1
+            print(f'regression: {result["benchmark"]} {result["adcs"]} ADCs {result["readings_to_average"]} reads '
+                  f'{old["samples_per_s"]:.0f} -> {result["samples_per_s"]:.0f} samples/s ({ratio - 1:+.0%})')
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='throughput of hx711_multi against simulated HX711 chips')
+    parser.add_argument('--quick', action='store_true', help='1, 4 and 16 ADCs and 1, 10 and 100 reads only')
+    parser.add_argument('--output', help='save the results to this JSON file')
+    parser.add_argument('--compare', help='JSON file of earlier results to check for regressions')
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help='fraction of samples/s that may be lost before a configuration counts as a regression')
+    parser.add_argument('--benchmark', action='append', choices=list(benchmarks), help='run only these benchmarks')
+    args = parser.parse_args()
+
+    counts = [1, 4, 16] if args.quick else adc_counts
+    reads = [1, 10, 100] if args.quick else readings_to_average
+    rng = np.random.default_rng(0)
+    results = []
+    print(f'{"benchmark":<24} {"ADCs":>5} {"reads":>6} {"samples/s":>10} {"p50":>9} {"p90":>9} {"p99":>9} '
+          f'{"peak":>9} {"retained":>9} {"gc/1000":>8}')
+    for name in args.benchmark or benchmarks:
+        for n_adcs in counts:
+            for n_reads in reads:
+                result = run(benchmarks[name](n_adcs, n_reads, rng))
+                latency = result['latency_ns']
+                print(f'{name:<24} {n_adcs:>5} {n_reads:>6} {result["samples_per_s"]:>10.0f} '
+                      f'{format_latency(latency["p50"])} {format_latency(latency["p90"])} {format_latency(latency["p99"])} '
+                      f'{result["peak_bytes"] / 1024:>7.1f}kB {result["retained_bytes"] / 1024:>7.1f}kB '
+                      f'{result["gc_per_1000_samples"]:>8.2f}')
+                results.append({'benchmark': name, 'adcs': n_adcs, 'readings_to_average': n_reads, **result})
+
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump({
+                'created': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+                'python': platform.python_version(),
+                'numpy': np.__version__,
+                'machine': platform.machine(),
+                'platform': platform.platform(),
+                'results': results,
+            }, file, indent=1)
+    if args.compare:
+        with open(args.compare) as file:
+            regressions = compare(results, json.load(file), args.tolerance)
+        print(f'{regressions} regressions against {args.compare}')
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    with widened_power_down_time():
+        main()
@@ -1 +1,12 @@
-from .hx711 import HX711
\ No newline at end of file
+from .hx711 import HX711
+from .multi import MultiHX711
+from .ring_buffer import SampleRingBuffer, Samples
+from .backends import GPIOBackend, RPiGPIOBackend, GpiodBackend
+from .simulation import SimulatedHX711, SimulatedGPIOBackend
+from .measurement import calculate_measurements, Measurements
+from .filters import MovingWindowFilter, SortedWindow
+from .instrumentation import get_logger, ReadCounters, ReadStatistics
+from .calibration import save_calibration, load_calibration
+from .multiplex import ChannelSchedule
+from .outliers import OutlierFilter, HampelFilter, MADClipping, RateLimiter, StdevRejection
+from .aio import AsyncHX711
@@ -0,0 +1,240 @@
+#!/usr/bin/env python3
+"""
+This file holds AsyncHX711 class which gives asyncio code access to the samples of a streaming HX711 or MultiHX711
+"""
+
+import asyncio
+import numpy as np
+from .hx711 import HX711
+from .multi import MultiHX711
+from .ring_buffer import Samples
+
+# seconds between checks that the acquisition thread is still alive while waiting for samples
+_ALIVE_CHECK_INTERVAL = 1.0
+
+
+class AsyncHX711:
+    """
+    AsyncHX711 reads an HX711 (or MultiHX711) from asyncio code without blocking the event loop.
+    The reads are done by the acquisition thread of start_streaming(), and every coroutine is served from its ring
+    buffer: any number of coroutines can await read_raw(), read_weight() or iterate samples() at the same time,
+    and they all share the same conversions, so no coroutine causes extra reads.
+
+    The acquisition thread wakes the event loop through loop.call_soon_threadsafe(). Wake-ups are coalesced: while one
+    is pending, new samples do not schedule another, so a busy event loop gets at most one wake-up per iteration.
+
+    Use it as an async context manager, or call start() and stop():
+
+        async with AsyncHX711(hx711) as sensor:
+            weights = await sensor.read_weight(readings_to_average=10)
+            async for samples in sensor.samples():
+                print(samples.timestamps, samples.values)
+
+    Args:
+        hx711 (HX711 or MultiHX711): configured sensor (zero, weight multiples, filters). It is streamed while
+            the AsyncHX711 runs, so it cannot be read directly in the meantime
+        buffer_size (int): Optional, by default 4096
+            number of samples kept in the ring buffer, see HX711.start_streaming()
+
+    Raises:
+        TypeError: if hx711 is not an HX711 or a MultiHX711
+    """
+
+    def __init__(self, hx711, buffer_size: int = 4096):
+        if not isinstance(hx711, (HX711, MultiHX711)):
+            raise TypeError(f'hx711 must be an HX711 or a MultiHX711.\nReceived hx711: {hx711}')
+        self._hx711 = hx711
+        self._buffer_size = buffer_size
+        self._buffer = None
+        self._loop = None
+        self._new_samples = None
+        self._wakeup_pending = False
+        self._started_streaming = False
+        self._running = False
+
+    @property
+    def hx711(self):
+        """ the wrapped HX711 or MultiHX711 """
+        return self._hx711
+
+    @property
+    def is_running(self):
+        """ True between start() and stop() """
+        return self._running
+
+    async def start(self):
+        """
+        start streaming the sensor, unless it is already streaming, and serve its samples to the event loop
+        this is called from. Does nothing if already running
+
+        Raises:
+            RuntimeError: if the sensor is multiplexing, whose streams hold raw values of several inputs
+        """
+        if self._running:
+            return
+        if isinstance(self._hx711, HX711) and self._hx711.multiplexing is not None:
+            raise RuntimeError('AsyncHX711 cannot serve a multiplexing HX711. Call clear_multiplexing() first')
+        self._loop = asyncio.get_running_loop()
+        self._new_samples = asyncio.Event()
+        self._wakeup_pending = False
+        self._started_streaming = not self._hx711.is_streaming
+        if self._started_streaming:
+            self._hx711.start_streaming(buffer_size=self._buffer_size)
+        self._buffer = self._hx711.stream_buffer
+        self._running = True
+        self._buffer.add_listener(self._on_sample)
+
+    async def stop(self):
+        """
+        stop serving samples, and stop streaming if start() started it. Waiting coroutines return what is left:
+        samples() ends, read_raw() and read_weight() raise RuntimeError
+        """
+        if not self._running:
+            return
+        self._running = False
+        self._buffer.remove_listener(self._on_sample)
+        if self._started_streaming:
+            # joining the acquisition thread takes up to one read, which must not block the event loop
+            await self._loop.run_in_executor(None, self._hx711.stop_streaming)
+        self._wake()
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.stop()
+
+    def _on_sample(self, write_index: int):
+        """ ring buffer listener, called on the acquisition thread after each sample """
+        if self._wakeup_pending:
+            return
+        self._wakeup_pending = True
+        try:
+            self._loop.call_soon_threadsafe(self._wake)
+        except RuntimeError:
+            # the event loop is closed, nobody is waiting anymore
+            pass
+
+    def _wake(self):
+        """ wake every waiting coroutine, on the event loop """
+        # cleared before the coroutines read the buffer, so samples published after they read schedule a new wake-up
+        self._wakeup_pending = False
+        new_samples, self._new_samples = self._new_samples, asyncio.Event()
+        new_samples.set()
+
+    async def _next_samples(self, since: int) -> Samples:
+        """
+        wait until samples at or after index `since` are published
+
+        Returns:
+            Samples: the new samples, or None if stopped without any
+        """
+        while True:
+            samples = self._buffer.get_samples(since)
+            if len(samples.timestamps) or samples.dropped:
+                return samples
+            if not self._running:
+                return None
+            new_samples = self._new_samples
+            try:
+                await asyncio.wait_for(new_samples.wait(), _ALIVE_CHECK_INTERVAL)
+            except asyncio.TimeoutError:
+                if not self._hx711.is_streaming:
+                    raise RuntimeError('the acquisition thread of the HX711 stopped')
+
+    async def samples(self, since: int = None):
+        """
+        asynchronous iterator of the stream: yields a Samples batch (see HX711.get_samples()) whenever new samples
+        were acquired, typically one sample per batch unless the event loop was busy. Each iterator has its own
+        cursor, a slow iterator loses its oldest samples (counted in `dropped`) without affecting the others.
+        Ends when stop() is called
+
+        Args:
+            since (int, optional): index of the first sample, e.g. next_index of an earlier batch.
+                Defaults to None, which starts with the next sample acquired
+
+        Yields:
+            Samples: named tuple of (timestamps, values, next_index, dropped)
+
+        Raises:
+            RuntimeError: if not running, or if the acquisition thread stopped
+        """
+        self._check_running('samples')
+        cursor = self._buffer.write_index if since is None else since
+        while True:
+            samples = await self._next_samples(cursor)
+            if samples is None:
+                return
+            cursor = samples.next_index
+            yield samples
+
+    async def read_raw(self, readings_to_average: int = 10):
+        """
+        wait for the next readings_to_average samples and average them per ADC, the asynchronous equivalent of
+        HX711.read_raw(). The samples are the values of the stream, so any set_filter() or set_outlier_filter() of the
+        sensor applies, but not the rejection of whole sets of reads of HX711.read_raw()
+
+        Args:
+            readings_to_average (int, optional): number of samples to average together. Defaults to 10
+
+        Returns:
+            list of float: same as read_raw() of the sensor, None for ADCs without a valid value
+
+        Raises:
+            RuntimeError: if not running, if stopped while waiting, or if the acquisition thread stopped
+        """
+        means = await self._read_means(readings_to_average, 'read_raw')
+        if isinstance(self._hx711, MultiHX711):
+            # MultiHX711.read_raw() returns measurements from zero
+            return means
+        values = [None if mean is None else mean + offset for mean, offset in zip(means, self._hx711.zero_offsets)]
+        return values[0] if self._hx711.single_adc else values
+
+    async def read_weight(self, readings_to_average: int = 10):
+        """
+        wait for the next readings_to_average samples and return the weight of each ADC, the asynchronous equivalent of
+        HX711.read_weight(), see read_raw()
+
+        Args:
+            readings_to_average (int, optional): number of samples to average together. Defaults to 10
+
+        Returns:
+            list of float: weight of each ADC, None for ADCs without a valid value
+
+        Raises:
+            RuntimeError: if not running, if stopped while waiting, or if the acquisition thread stopped
+        """
+        means = await self._read_means(readings_to_average, 'read_weight')
+        weights = [None if mean is None else mean / weight_multiple
+                   for mean, weight_multiple in zip(means, self._hx711.weight_multiples)]
+        if isinstance(self._hx711, HX711) and self._hx711.single_adc:
+            return weights[0]
+        return weights
+
+    async def _read_means(self, readings_to_average: int, caller: str):
+        """ mean of the valid values of each column (from zero) over the next readings_to_average samples """
+        self._check_running(caller)
+        if not (1 <= readings_to_average <= 10000):
+            raise ValueError(
+                f'Parameter "readings_to_average" input to {caller}() is way too high... Received: {readings_to_average}'
+            )
+        batches = []
+        count = 0
+        cursor = self._buffer.write_index
+        while count < readings_to_average:
+            samples = await self._next_samples(cursor)
+            if samples is None:
+                raise RuntimeError(f'AsyncHX711 was stopped during {caller}()')
+            cursor = samples.next_index
+            batches.append(samples.values)
+            count += len(samples.values)
+        values = np.concatenate(batches)[:readings_to_average]
+        valid = ~np.isnan(values)
+        counts = valid.sum(axis=0)
+        sums = np.where(valid, values, 0.).sum(axis=0)
+        return [float(total / n) if n else None for total, n in zip(sums, counts)]
+
+    def _check_running(self, caller: str):
+        if not self._running:
+            raise RuntimeError(f'{caller}() requires the AsyncHX711 to be started first')
@@ -0,0 +1,270 @@
+#!/usr/bin/env python3
+"""
+This file holds the GPIO backends that HX711 uses to drive the clock pin and read the dout pins
+"""
+
+import mmap
+import os
+import threading
+from time import perf_counter, sleep, monotonic_ns
+
+# BCM283x/BCM2711 GPIO register word offsets within /dev/gpiomem
+_GPSET0 = 0x1C // 4
+_GPCLR0 = 0x28 // 4
+_GPLEV0 = 0x34 // 4
+# SoCs whose GPIO block has the register layout above (Raspberry Pi Zero, 1, 2, 3 and 4)
+_GPIOMEM_COMPATIBLE = (b'brcm,bcm2835', b'brcm,bcm2836', b'brcm,bcm2837', b'brcm,bcm2711')
+
+
+class GPIOBackend:
+    """
+    GPIOBackend is the interface between HX711 and a GPIO library.
+    Subclass it and implement the methods below to support another GPIO library (or simulated hardware).
+
+    Pins are identified by the integers passed to HX711 as dout_pins and sck_pin. What those integers
+    mean (BCM numbering, line offsets, ...) is up to the backend.
+
+    Backends that can sample every input pin at once set supports_bulk_read to True and implement
+    read_levels(). HX711 then reads all dout pins with one call per clock pulse instead of one per pin.
+    """
+
+    supports_bulk_read = False
+    # monotonic time (ns) of the falling edge that ended the last wait_for_low(), None if there was none or
+    # the backend cannot tell. HX711 uses it as the data-ready timestamp of a read
+    last_falling_edge_ns = None
+
+    def setup_output(self, pin: int):
+        """ configure pin as an output (used for sck_pin) """
+        raise NotImplementedError
+
+    def setup_input(self, pin: int):
+        """ configure pin as an input (used for dout_pins) """
+        raise NotImplementedError
+
+    def output(self, pin: int, value: bool):
+        """ drive an output pin HIGH (True) or LOW (False) """
+        raise NotImplementedError
+
+    def input(self, pin: int) -> int:
+        """ return the level of an input pin as 1 (HIGH) or 0 (LOW) """
+        raise NotImplementedError
+
+    def read_levels(self) -> int:
+        """ return the levels of all input pins as one bitmask, where bit n is the level of pin n """
+        raise NotImplementedError
+
+    def wait_for_low(self, pins, timeout: float) -> bool:
+        """
+        block until every pin in pins reads LOW, or until timeout (seconds) expires.
+        This default implementation polls every 0.5ms. Backends override it with edge detection where available
+
+        Returns:
+            bool: True if all pins are LOW
+        """
+        deadline = perf_counter() + timeout
+        while any(self.input(pin) for pin in pins):
+            if perf_counter() >= deadline:
+                return False
+            sleep(0.0005)
+        return True
+
+    def cleanup(self):
+        """ release any resources owned by the backend """
+        pass
+
+
+class RPiGPIOBackend(GPIOBackend):
+    """
+    RPiGPIOBackend drives pins with RPi.GPIO. This is the default backend.
+
+    RPi.GPIO is global state shared with the rest of your program, so pin numbering (GPIO.setmode)
+    and GPIO.cleanup() remain the caller's responsibility, exactly as before backends existed.
+
+    When BCM numbering is active on a Pi 0-4, the GPIO registers are also memory mapped through
+    /dev/gpiomem. Pins are then set, cleared and read with single register accesses, and all dout
+    pins are sampled with one read of the level register (see supports_bulk_read).
+    RPi.GPIO is still used to configure pin directions.
+
+    wait_for_low() uses RPi.GPIO falling-edge detection (add_event_detect) on the pins it waits for,
+    so those pins cannot be used with event detection elsewhere in your program.
+
+    Args:
+        use_gpiomem (bool): Optional, by default True
+            set to False to always go through RPi.GPIO
+        gpio (module): Optional, by default RPi.GPIO
+            module with the RPi.GPIO interface to use instead, e.g. a mock in tests
+    """
+
+    def __init__(self, use_gpiomem: bool = True, gpio=None):
+        if gpio is None:
+            import RPi.GPIO as gpio
+        self._GPIO = gpio
+        self._registers = None
+        self._edge_pins = set()
+        self._falling_edge = threading.Event()
+        if use_gpiomem and gpio.getmode() == gpio.BCM:
+            self._registers = _map_gpiomem()
+        if self._registers is not None:
+            self.supports_bulk_read = True
+        else:
+            # bind the hot-path functions directly to skip a method call per clock pulse
+            self.output = gpio.output
+            self.input = gpio.input
+
+    def setup_output(self, pin: int):
+        self._GPIO.setup(pin, self._GPIO.OUT)
+
+    def setup_input(self, pin: int):
+        self._GPIO.setup(pin, self._GPIO.IN)
+
+    def output(self, pin: int, value: bool):
+        self._registers[_GPSET0 if value else _GPCLR0] = 1 << pin
+
+    def input(self, pin: int) -> int:
+        return (self._registers[_GPLEV0] >> pin) & 1
+
+    def read_levels(self) -> int:
+        return self._registers[_GPLEV0]
+
+    def _on_falling_edge(self, channel):
+        # runs in RPi.GPIO's event thread right after the edge, closer to it than the thread that waits
+        self.last_falling_edge_ns = monotonic_ns()
+        self._falling_edge.set()
+
+    def wait_for_low(self, pins, timeout: float) -> bool:
+        for pin in pins:
+            if pin not in self._edge_pins:
+                self._GPIO.add_event_detect(pin, self._GPIO.FALLING, callback=self._on_falling_edge)
+                self._edge_pins.add(pin)
+        deadline = perf_counter() + timeout
+        # edges while data was clocked out are stale
+        self.last_falling_edge_ns = None
+        while True:
+            # clear before checking levels, so an edge right after the check still wakes us up
+            self._falling_edge.clear()
+            if not any(self.input(pin) for pin in pins):
+                return True
+            remaining = deadline - perf_counter()
+            if remaining <= 0 or not self._falling_edge.wait(remaining):
+                return not any(self.input(pin) for pin in pins)
+
+    def cleanup(self):
+        for pin in self._edge_pins:
+            self._GPIO.remove_event_detect(pin)
+        self._edge_pins.clear()
+
+
+def _map_gpiomem():
+    """ memory map the GPIO registers, returns a memoryview of 32-bit words or None if unavailable """
+    try:
+        with open('/proc/device-tree/compatible', 'rb') as f:
+            compatible = f.read().split(b'\0')
+        if not any(soc in compatible for soc in _GPIOMEM_COMPATIBLE):
+            return None
+        fd = os.open('/dev/gpiomem', os.O_RDWR | os.O_SYNC)
+        try:
+            registers = mmap.mmap(fd, 4096, mmap.MAP_SHARED, mmap.PROT_READ | mmap.PROT_WRITE)
+        finally:
+            os.close(fd)
+    except OSError:
+        return None
+    # element access through a 'I' memoryview is a single aligned 32-bit load/store
+    return memoryview(registers).cast('I')
+
+
+class GpiodBackend(GPIOBackend):
+    """
+    GpiodBackend drives pins through the Linux GPIO character device with libgpiod (python3-libgpiod >= 2.0).
+    This works on kernels and boards where RPi.GPIO does not (e.g. Raspberry Pi 5).
+
+    All configured pins are held in a single line request, which is re-created whenever a pin is added.
+    read_levels() fetches every input line with a single get_values() call, and wait_for_low() blocks on
+    falling-edge events from the kernel, which are queued so that no edge is missed between checks.
+
+    Args:
+        chip (str): Optional, by default '/dev/gpiochip0'
+            path of the GPIO chip. Pins are line offsets on this chip (BCM numbers on Pi 0-4)
+        consumer (str): Optional, by default 'hx711-multi'
+            label shown for the requested lines in tools such as gpioinfo
+    """
+
+    supports_bulk_read = True
+
+    def __init__(self, chip: str = '/dev/gpiochip0', consumer: str = 'hx711-multi'):
+        import gpiod
+        from gpiod.line import Direction, Edge, Value
+        self._gpiod = gpiod
+        self._Direction = Direction
+        self._Edge = Edge
+        self._Value = Value
+        self._chip = chip
+        self._consumer = consumer
+        self._settings = {}
+        self._inputs = []
+        self._edge_pins = set()
+        self._request = None
+
+    def _request_lines(self):
+        if self._request is not None:
+            self._request.release()
+        self._request = self._gpiod.request_lines(self._chip,
+                                                  consumer=self._consumer,
+                                                  config=dict(self._settings))
+
+    def setup_output(self, pin: int):
+        self._settings[pin] = self._gpiod.LineSettings(direction=self._Direction.OUTPUT,
+                                                       output_value=self._Value.INACTIVE)
+        self._request_lines()
+
+    def setup_input(self, pin: int):
+        edge = self._Edge.FALLING if pin in self._edge_pins else self._Edge.NONE
+        self._settings[pin] = self._gpiod.LineSettings(direction=self._Direction.INPUT, edge_detection=edge)
+        if pin not in self._inputs:
+            self._inputs.append(pin)
+        self._request_lines()
+
+    def output(self, pin: int, value: bool):
+        self._request.set_value(pin, self._Value.ACTIVE if value else self._Value.INACTIVE)
+
+    def input(self, pin: int) -> int:
+        return 1 if self._request.get_value(pin) == self._Value.ACTIVE else 0
+
+    def read_levels(self) -> int:
+        active = self._Value.ACTIVE
+        levels = 0
+        for pin, value in zip(self._inputs, self._request.get_values(self._inputs)):
+            if value == active:
+                levels |= 1 << pin
+        return levels
+
+    def _drain_edge_events(self):
+        """ discard queued edge events, returns the kernel timestamp (ns, CLOCK_MONOTONIC) of the latest or None """
+        timestamp_ns = None
+        while self._request.wait_edge_events(0):
+            for event in self._request.read_edge_events():
+                timestamp_ns = event.timestamp_ns
+        return timestamp_ns
+
+    def wait_for_low(self, pins, timeout: float) -> bool:
+        if not self._edge_pins.issuperset(pins):
+            self._edge_pins.update(pins)
+            for pin in pins:
+                self.setup_input(pin)
+        deadline = perf_counter() + timeout
+        # edges from previous reads are stale. Any edge after the level check below stays queued
+        self._drain_edge_events()
+        self.last_falling_edge_ns = None
+        while True:
+            if not any(self.input(pin) for pin in pins):
+                return True
+            remaining = deadline - perf_counter()
+            if remaining <= 0 or not self._request.wait_edge_events(remaining):
+                return not any(self.input(pin) for pin in pins)
+            timestamp_ns = self._drain_edge_events()
+            if timestamp_ns is not None:
+                self.last_falling_edge_ns = timestamp_ns
+
+    def cleanup(self):
+        if self._request is not None:
+            self._request.release()
+            self._request = None
@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+This file holds the calibration file of HX711: a JSON file with the zero offset and weight multiple of each ADC,
+so that a station can restart without zeroing and calibrating again
+
+Example file:
+    {
+        "version": 1,
+        "saved_at": 1700000000.0,
+        "sck_pin": 1,
+        "channel_select": "A",
+        "channel_A_gain": 128,
+        "adcs": {"2": {"zero_offset": -81234.5, "weight_multiple": -5176.0}}
+    }
+"""
+
+import json
+import os
+import time
+
+CALIBRATION_VERSION = 1
+
+
+def save_calibration(hx711, path):
+    """
+    write the zero offsets and weight multiples of all ADCs of hx711 to path. The file is written to a temporary
+    file first and then renamed, so a crash while saving never leaves a truncated calibration file behind
+
+    Args:
+        hx711 (HX711): calibrated HX711
+        path (str or Path): calibration file
+    """
+    calibration = {
+        'version': CALIBRATION_VERSION,
+        'saved_at': time.time(),
+        'sck_pin': hx711._sck_pin,
+        'channel_select': hx711._channel_select,
+        'channel_A_gain': hx711._channel_A_gain,
+        'adcs': {
+            str(adc._dout_pin): {'zero_offset': adc._zero_offset, 'weight_multiple': adc._weight_multiple}
+            for adc in hx711._adcs
+        },
+    }
+    temporary_path = f'{path}.tmp'
+    with open(temporary_path, 'w') as f:
+        json.dump(calibration, f, indent=4)
+    os.replace(temporary_path, path)
+
+
+def load_calibration(hx711, path, max_age: float = None) -> bool:
+    """
+    apply the zero offsets and weight multiples in path to the ADCs of hx711.
+    The calibration is only applied if it was saved for the same sck pin, channel and gain, and has an entry
+    for every dout pin of hx711. Otherwise nothing is changed and the reason is logged as a warning
+
+    Args:
+        hx711 (HX711): HX711 to restore
+        path (str or Path): calibration file written by save_calibration()
+        max_age (float, optional): maximum age of the calibration in seconds. Defaults to None (any age)
+
+    Returns:
+        bool: True if the calibration was applied
+    """
+    logger = hx711._logger
+    try:
+        with open(path) as f:
+            calibration = json.load(f)
+    except FileNotFoundError:
+        logger.info('no calibration file at %s', path)
+        return False
+    except (OSError, ValueError) as e:
+        logger.warning('could not read calibration file %s: %s', path, e)
+        return False
+
+    if not isinstance(calibration, dict) or calibration.get('version') != CALIBRATION_VERSION:
+        logger.warning('calibration file %s has an unsupported format', path)
+        return False
+    if max_age is not None and time.time() - calibration.get('saved_at', 0) > max_age:
+        logger.warning('calibration file %s is older than %s seconds', path, max_age)
+        return False
+    expected = {'sck_pin': hx711._sck_pin,
+                'channel_select': hx711._channel_select,
+                'channel_A_gain': hx711._channel_A_gain}
+    for key, value in expected.items():
+        if calibration.get(key) != value:
+            logger.warning('calibration file %s was saved for %s=%s, not %s', path, key, calibration.get(key), value)
+            return False
+    adcs = calibration.get('adcs', {})
+    missing = [adc._dout_pin for adc in hx711._adcs if str(adc._dout_pin) not in adcs]
+    if missing:
+        logger.warning('calibration file %s has no calibration for dout pins %s', path, missing)
+        return False
+
+    for adc in hx711._adcs:
+        entry = adcs[str(adc._dout_pin)]
+        adc.zero(float(entry['zero_offset']))
+        adc.set_weight_multiple(float(entry['weight_multiple']))
+    logger.debug('applied calibration file %s', path)
+    return True
@@ -0,0 +1,227 @@
+#!/usr/bin/env python3
+"""
+This file holds streaming filters, which produce a filtered value for every new conversion
+instead of averaging a whole batch of reads like read_raw()
+"""
+
+import math
+from bisect import bisect_left, bisect_right
+from collections import deque
+
+
+class SortedWindow:
+    """
+    SortedWindow holds the last `size` values both in arrival order and in sorted order,
+    so that order statistics (median) and the sum are available after every new value.
+    It also keeps the sum of squares and the sum of the lower half of the sorted values, from which the deviations
+    from the median are summarized in O(1) (deviation_stdev), and the median absolute deviation in O(log N).
+
+    Finding a value's position is O(log N) (bisect). Inserting into and removing from the sorted list
+    shifts at most N references, which for windows of up to a few thousand values is a memmove
+    that costs less than the Python overhead of a heap based structure.
+
+    Args:
+        size (int): number of values in the window
+
+    Raises:
+        ValueError: if size is less than 1
+    """
+
+    __slots__ = ('_size', '_values', '_sorted', '_sum', '_sum_of_squares', '_low_sum', '_split')
+
+    def __init__(self, size: int):
+        if size < 1:
+            raise ValueError(f'window size must be at least 1.\nReceived size: {size}')
+        self._size = size
+        self._values = deque()
+        self._sorted = []
+        self._sum = 0
+        self._sum_of_squares = 0
+        # sum of the sorted values below index _split, which is kept at len // 2
+        self._low_sum = 0
+        self._split = 0
+
+    def __len__(self):
+        return len(self._values)
+
+    @property
+    def size(self):
+        return self._size
+
+    @property
+    def median(self):
+        """ median of the values in the window, None if empty """
+        n = len(self._sorted)
+        if not n:
+            return None
+        middle = n // 2
+        if n % 2:
+            return self._sorted[middle]
+        return (self._sorted[middle - 1] + self._sorted[middle]) / 2
+
+    @property
+    def mean(self):
+        """ mean of the values in the window, None if empty """
+        if not self._values:
+            return None
+        return self._sum / len(self._values)
+
+    @property
+    def deviation_stdev(self):
+        """
+        sample standard deviation of the absolute deviations of the values from the median, as used by the
+        filtering of read_raw() (see ADC._calculate_measurement). None with less than 2 values
+        """
+        n = len(self._sorted)
+        if n < 2:
+            return None
+        median = self.median
+        # the values below _split deviate by median - value, the ones above the middle by value - median. With an equal
+        # number of each, the median cancels out of the sum of the deviations
+        high_sum = self._sum - self._low_sum - (self._sorted[n // 2] if n % 2 else 0)
+        deviation_sum = high_sum - self._low_sum
+        squared_deviation_sum = self._sum_of_squares - 2 * median * self._sum + n * median * median
+        variance = (n * squared_deviation_sum - deviation_sum * deviation_sum) / (n * (n - 1))
+        return math.sqrt(max(variance, 0.))
+
+    @property
+    def median_absolute_deviation(self):
+        """ median of the absolute deviations of the values from the median, None if empty """
+        n = len(self._sorted)
+        if not n:
+            return None
+        median = self.median
+        if n % 2:
+            return self._kth_deviation(n // 2, median)
+        return (self._kth_deviation(n // 2 - 1, median) + self._kth_deviation(n // 2, median)) / 2
+
+    def _kth_deviation(self, k: int, median: float):
+        """
+        k-th smallest (from 0) absolute deviation from median. The deviations of the values below the median and of
+        the others are two sorted sequences, so this is a selection from two sorted arrays, O(log N)
+        """
+        values = self._sorted
+        below = bisect_left(values, median)
+        # deviation i of the values below is median - values[below - 1 - i], deviation j of the others values[below + j] - median
+        low, high = max(0, k + 1 - (len(values) - below)), min(k + 1, below)
+        # find how many of the k + 1 smallest deviations are below the median
+        while low < high:
+            i = (low + high) // 2
+            if median - values[below - 1 - i] < values[below + k - i] - median:
+                low = i + 1
+            else:
+                high = i
+        deviations = []
+        if low:
+            deviations.append(median - values[below - low])
+        if k + 1 - low:
+            deviations.append(values[below + k - low] - median)
+        return max(deviations)
+
+    def push(self, value):
+        """ add a value to the window, evicting the oldest value once the window is full """
+        values = self._sorted
+        if len(self._values) == self._size:
+            oldest = self._values.popleft()
+            index = bisect_left(values, oldest)
+            del values[index]
+            self._sum -= oldest
+            self._sum_of_squares -= oldest * oldest
+            if index < self._split:
+                self._split -= 1
+                self._low_sum -= oldest
+        self._values.append(value)
+        index = bisect_right(values, value)
+        values.insert(index, value)
+        self._sum += value
+        self._sum_of_squares += value * value
+        if index < self._split:
+            self._split += 1
+            self._low_sum += value
+        # move _split back to the middle, at most one step either way
+        middle = len(values) // 2
+        while self._split < middle:
+            self._low_sum += values[self._split]
+            self._split += 1
+        while self._split > middle:
+            self._split -= 1
+            self._low_sum -= values[self._split]
+
+    def clear(self):
+        self._values.clear()
+        self._sorted.clear()
+        self._sum = 0
+        self._sum_of_squares = 0
+        self._low_sum = 0
+        self._split = 0
+
+
+class MovingWindowFilter:
+    """
+    MovingWindowFilter smooths a stream of reads with a running median or mean over the last `window` reads,
+    optionally followed by a first-order IIR low-pass filter. It outputs a value for every read, so the output rate
+    stays at the ADC's conversion rate.
+
+    The running median rejects spikes shorter than half the window, which is what the median/stdev filtering
+    of read_raw() is for, without blocking for a whole batch of reads or discarding it.
+
+    Args:
+        window (int): Optional, by default 10
+            number of reads in the moving window
+        mode (str): Optional, by default 'median'
+            Options ('median' || 'mean')
+        iir_alpha (float): Optional, by default None (no IIR filter)
+            smoothing factor of the low-pass filter applied after the window, 0 < iir_alpha <= 1.
+            Each output moves iir_alpha of the way from the previous output to the window's value
+
+    Raises:
+        TypeError: if mode is not median or mean
+        ValueError: if window is less than 1 or iir_alpha is out of range
+    """
+
+    __slots__ = ('_window', '_mode', '_iir_alpha', 'value')
+
+    def __init__(self, window: int = 10, mode: str = 'median', iir_alpha: float = None):
+        if mode not in ['median', 'mean']:
+            raise TypeError(f'mode must be median or mean.\nReceived mode: {mode}')
+        if iir_alpha is not None and not (0 < iir_alpha <= 1):
+            raise ValueError(f'iir_alpha must be greater than 0 and at most 1.\nReceived iir_alpha: {iir_alpha}')
+        self._window = SortedWindow(window)
+        self._mode = mode
+        self._iir_alpha = iir_alpha
+        # latest output, None until the first update
+        self.value = None
+
+    @property
+    def window(self):
+        return self._window.size
+
+    @property
+    def mode(self):
+        return self._mode
+
+    @property
+    def iir_alpha(self):
+        return self._iir_alpha
+
+    def update(self, read) -> float:
+        """
+        add a read to the window and return the new filtered value
+
+        Args:
+            read (int or float): new read
+
+        Returns:
+            float: filtered value
+        """
+        self._window.push(read)
+        value = self._window.median if self._mode == 'median' else self._window.mean
+        if self._iir_alpha is not None and self.value is not None:
+            value = self.value + self._iir_alpha * (value - self.value)
+        self.value = value
+        return value
+
+    def reset(self):
+        """ forget all previous reads """
+        self._window.clear()
+        self.value = None
@@ -3,13 +3,25 @@
 This file holds HX711 class and ADC class which is used within HX711 in order to track multiple ADCs
 """
 
-import RPi.GPIO as GPIO
-from time import sleep, perf_counter
+import threading
+import numpy as np
+from time import sleep, perf_counter, perf_counter_ns, monotonic_ns
 from statistics import mean, median, stdev
 from .utils import convert_to_list
-from logging import getLogger, Logger, StreamHandler
+from .ring_buffer import SampleRingBuffer, Samples
+from .measurement import calculate_measurements, Measurements
+from .filters import MovingWindowFilter
+from .instrumentation import get_logger, ReadCounters, ReadStatistics
+from .calibration import save_calibration, load_calibration
+from .multiplex import ChannelSchedule, GAIN_PULSES
+from .outliers import OutlierFilter, OUTLIER_FILTERS
+from .backends import GPIOBackend, RPiGPIOBackend
+from logging import Logger, DEBUG, INFO
 from typing import List
 
+# weight of each of the 24 bits shifted out by the HX711, MSB first
+_BIT_WEIGHTS = 1 << np.arange(23, -1, -1, dtype=np.int64)
+
 class HX711:
     """
     HX711 class holds data for one or multiple ADCs.
@@ -28,13 +40,27 @@ class HX711:
                 (this will be a slower sampling rate if one or more scales is not ready)
         log_level (str or int): Optional, prints out info to consolde based on level of log
             Options (0:'NOTSET', 10:'DEBUG', 20:'INFO', 30:'WARN', 40:'ERROR', 50:'CRITICAL')
+        gpio_backend (GPIOBackend): Optional, by default RPiGPIOBackend()
+            backend used to drive sck_pin and read dout_pins (e.g. GpiodBackend, SimulatedGPIOBackend)
+        ready_mode (str): Optional, by default 'poll'
+            Options ('poll' || 'edge')
+            'poll' checks dout pins up to 20 times with a 10ms sleep in between
+            'edge' blocks on a falling edge of the dout pins (data ready), so a read starts as soon as the ADCs are ready
 
     Raises:
         TypeError:
             if dout_pins not an int or list of ints
-            if gain_channel_A or select_channel not match required values
+            if gain_channel_A, select_channel or ready_mode not match required values
     """
 
+    # maximum time to wait for data ready in 'edge' ready_mode, similar to the 20 x 10ms of 'poll'
+    _ready_timeout = 0.2
+    # SCK held HIGH for this long (seconds) powers the HX711 down
+    _POWER_DOWN_TIME = 0.00006
+    # output settling after power up or a channel/gain change: 4 conversions, at most 400ms (10Hz)
+    _SETTLING_CONVERSIONS = 4
+    _SETTLING_TIME = 0.4
+
     def __init__(
         self,
         dout_pins,
@@ -43,16 +69,29 @@ class HX711:
         channel_select: str = 'A',
         all_or_nothing: bool = True,
         log_level: str = 'WARN',
+        gpio_backend: GPIOBackend = None,
+        ready_mode: str = 'poll',
     ):
-        self._logger: Logger = getLogger('hx711-multi')
-        self._logger.setLevel(log_level)
-        consoleLogHandler = StreamHandler()
-        consoleLogHandler.setLevel(log_level)
-        self._logger.addHandler(consoleLogHandler)
+        self._gpio = gpio_backend if gpio_backend is not None else RPiGPIOBackend()
+        self._logger: Logger = get_logger(log_level)
+        self._counters = None
+        self._statistics = None
+        # data-ready time of the current read, and of each successful read of the last read_raw() or read_filtered()
+        self._ready_ns = 0
+        self._timestamps = np.zeros(16, dtype=np.int64)
+        self._timestamp_count = 0
         self._single_adc = False
         self._all_or_nothing = all_or_nothing
         self._dout_pins = dout_pins
         self._sck_pin = sck_pin
+        self._ready_mode = ready_mode
+        self._stream_thread = None
+        self._stream_stop = threading.Event()
+        self._stream_buffer = None
+        # one ring buffer per input while streaming with multiplexing, see set_multiplexing()
+        self._stream_buffers = None
+        self._filters = None
+        self._schedule = None
         # init GPIO before channel because a read operation is required for channel initialization
         self._init_gpio()
         self._channel_A_gain = channel_A_gain
@@ -60,7 +99,7 @@ class HX711:
         self._init_adcs()
         # perform a read which sets channel and gain
         self._read()
-        sleep(0.4)  # 400ms settling time according to documentation
+        self._settle()
 
     @property
     def _dout_pins(self):
@@ -119,27 +158,57 @@ class HX711:
             )
         self.__channel_select = channel_select
 
+    @property
+    def _ready_mode(self):
+        return self.__ready_mode
+
+    @_ready_mode.setter
+    def _ready_mode(self, ready_mode):
+        if ready_mode not in ['poll', 'edge']:
+            raise TypeError(
+                f'ready_mode must be poll or edge.\nReceived ready_mode: {ready_mode}'
+            )
+        self.__ready_mode = ready_mode
+
     def _init_gpio(self):
         # init GPIO
-        GPIO.setup(self._sck_pin, GPIO.OUT)  # sck_pin is output only
+        self._gpio.setup_output(self._sck_pin)  # sck_pin is output only
         for dout in self._dout_pins:
-            GPIO.setup(dout, GPIO.IN)  # dout_pin is input only
+            self._gpio.setup_input(dout)  # dout_pin is input only
 
     def _init_adcs(self):
         # initialize ADC instances
         self._adcs = []
         for dout_pin in self._dout_pins:
-            self._adcs.append(ADC(dout_pin=dout_pin, logger=self._logger))
-
-    def _prepare_to_read(self):
+            self._adcs.append(ADC(dout_pin=dout_pin, logger=self._logger, gpio=self._gpio))
+        # buffers for the bulk read path: pin levels captured after each of the 24 clock pulses
+        self._levels = [0] * 24
+        self._dout_shifts = np.array(self._dout_pins, dtype=np.int64)
+        # reads of all ADCs for the vectorized measurement calculation, grown to the largest readings_to_average
+        self._raw_reads = np.zeros((0, len(self._adcs)), dtype=np.int64)
+
+    def _prepare_to_read(self, wait: bool = True):
         """
-        prepare to read by setting SCK output to LOW and loop until all dout inputs are LOW
+        prepare to read by setting SCK output to LOW and loop until all dout inputs are LOW.
+        Sets _ready_ns to the monotonic time (ns) at which the data was found to be ready: the time of the falling
+        edge if the GPIO backend reports it ('edge' ready_mode), else the time of the check that found all dout pins LOW
+
+        Args:
+            wait (bool, optional): Defaults to True. If False, check the dout inputs once without waiting
 
         Returns:
             bool : True if ready to read else False 
         """
 
-        GPIO.output(self._sck_pin, False)  # start by setting the pd_sck to 0
+        self._gpio.output(self._sck_pin, False)  # start by setting the pd_sck to 0
+
+        if not wait:
+            ready = all([adc._is_ready() for adc in self._adcs])
+            self._ready_ns = monotonic_ns()
+            return ready
+
+        if self._ready_mode == 'edge':
+            return self._wait_for_ready()
 
         # check if ready a maximum of 20 times (~200ms)
         # should usually be about 10 iterations with 10Hz sampling
@@ -150,15 +219,43 @@ class HX711:
             else:
                 # if not ready sleep for 10ms before next iteration
                 sleep(0.01)
+        self._ready_ns = monotonic_ns()
         ready = all([adc._ready for adc in self._adcs])
         if ready:
-            self._logger.debug(
-                f'checked sensor readiness, completed after {i+1} iterations')
+            self._logger.debug('checked sensor readiness, completed after %d iterations', i + 1)
         else:
-            self._logger.warn(
-                f'checked sensor readiness, not ready after {i+1} iterations')
+            self._logger.warning('checked sensor readiness, not ready after %d iterations', i + 1)
         return ready
 
+    def _wait_for_ready(self):
+        """
+        'edge' ready_mode of _prepare_to_read: block on the backend until the dout pins of the ADCs
+        that are not ready yet go LOW (falling edge), or until _ready_timeout expires
+
+        Returns:
+            bool : True if ready to read else False
+        """
+
+        wait_start = perf_counter()
+        deadline = wait_start + self._ready_timeout
+        edge_ns = None
+        waiting = [adc._dout_pin for adc in self._adcs if not adc._is_ready()]
+        while waiting:
+            remaining = deadline - perf_counter()
+            if remaining <= 0:
+                break
+            self._gpio.wait_for_low(waiting, remaining)
+            edge_ns = self._gpio.last_falling_edge_ns
+            waiting = [adc._dout_pin for adc in self._adcs if not adc._is_ready()]
+        # the last falling edge is the ADC that got ready last, i.e. the moment data of all ADCs was ready
+        self._ready_ns = edge_ns if edge_ns is not None else monotonic_ns()
+        if not waiting:
+            self._logger.debug('checked sensor readiness, ready after %.6f seconds', perf_counter() - wait_start)
+        else:
+            self._logger.warning('checked sensor readiness, dout pins %s not ready after %s seconds',
+                                 waiting, self._ready_timeout)
+        return not waiting
+
     def _pulse_sck_high(self):
         """
         Pulse SCK pin high shortly
@@ -168,19 +265,36 @@ class HX711:
         """
 
         pulse_start = perf_counter()
-        GPIO.output(self._sck_pin, True)
-        GPIO.output(self._sck_pin, False)
+        self._gpio.output(self._sck_pin, True)
+        self._gpio.output(self._sck_pin, False)
         pulse_end = perf_counter()
         # check if pulse lasted 60ms or longer. If so, HX711 enters power down mode
         # check if the hx 711 did not turn off...
-        if pulse_end - pulse_start >= 0.00006:
+        if pulse_end - pulse_start >= self._POWER_DOWN_TIME:
             # if pd_sck pin is HIGH for 60 us and more than the HX 711 enters power down mode.
-            self._logger.warn(
-                f'sck pulse lasted for longer than 60us\nTime elapsed: {pulse_end - pulse_start}'
-            )
+            self._on_long_pulse(pulse_end - pulse_start)
             return False
         return True
 
+    def _on_long_pulse(self, elapsed: float):
+        """ log and count a pulse that may have powered the HX711 down, then make sure it did """
+        self._logger.warning('sck pulse lasted for longer than 60us\nTime elapsed: %s', elapsed)
+        if self._counters is not None:
+            self._counters.long_pulses += 1
+        self._force_power_down()
+        if self._schedule is not None:
+            # powering down reset the input to A/128
+            self._schedule.restart()
+
+    def _force_power_down(self):
+        """
+        after a slow pulse the HX711 may or may not have powered down, depending on how long SCK really was HIGH.
+        Hold SCK HIGH well past 60us so it definitely powers down and the next read starts from a known state
+        """
+        self._gpio.output(self._sck_pin, True)
+        sleep(self._POWER_DOWN_TIME + 0.00004)
+        self._gpio.output(self._sck_pin, False)
+
     def _write_channel_gain(self):
         """
         _write_channel_gain must be run after each 24-bit read
@@ -190,16 +304,19 @@ class HX711:
         A, 64 : total pulses = 27 (24 read data, 3 extra to set dout back to high)
         B, 32 : total pulses = 26 (24 read data, 2 extra to set dout back to high)
 
+        With multiplexing (see set_multiplexing()) the schedule selects the input of the next conversion instead
+
         Returns:
             bool: True if pulses were all successful
         """
 
         # get number of pulses based on channel configuration
-        num_pulses = 2  # default 2 for channel B
-        if self._channel_select == 'A' and self._channel_A_gain == 128:
-            num_pulses = 1
-        elif self._channel_select == 'A' and self._channel_A_gain == 64:
-            num_pulses = 3
+        if self._schedule is not None:
+            num_pulses = self._schedule.advance()
+        elif self._channel_select == 'B':
+            num_pulses = GAIN_PULSES[('B', 32)]
+        else:
+            num_pulses = GAIN_PULSES[('A', self._channel_A_gain)]
 
         # pulse num_pulses
         for _ in range(num_pulses):
@@ -207,7 +324,7 @@ class HX711:
                 return False
         return True
 
-    def _read(self):
+    def _read(self, wait: bool = True):
         """
         _read performs a single datapoint read across all ADCs. The data is stored within the ADC instances
         read each bit from HX711, convert to signed int, and validate
@@ -216,28 +333,69 @@ class HX711:
             2) read first 24 bits of each ADC by pulsing SCK output for each bit
             3) set channel gain following read by pulsing SCK to result in a total of 25, 26, or 27 SCK pulses for a read operation (see documentation)
 
+        Args:
+            wait (bool, optional): Defaults to True. If False, do not wait for the ADCs to become ready,
+                only read the ones that are ready now (used by MultiHX711, which waits for several HX711 at once)
+
         Returns:
             bool : returns True if successful. Readings are assigned to ADC objects
         """
 
         adc: ADC
+        counters = self._counters
+        if counters is not None:
+            read_start = perf_counter_ns()
         # init each ADC raw read data
         for adc in self._adcs:
             adc._init_raw_read()
 
         # prepare for read by setting SCK pin and checking that each ADC is ready
         # if _all_or_nothing and not _prepare_to_read, then do not perform the read
-        if not self._prepare_to_read() and self._all_or_nothing:
-            return False
+        ready = self._prepare_to_read(wait)
+        if not ready and self._all_or_nothing:
+            result = False
+        else:
+            if counters is not None:
+                shift_start = perf_counter_ns()
+            result = self._shift_and_read_all()
+        if counters is not None:
+            read_end = perf_counter_ns()
+            if ready or not self._all_or_nothing:
+                wait_ns, shift_ns = shift_start - read_start, read_end - shift_start
+            else:
+                wait_ns, shift_ns = read_end - read_start, 0
+            counters.record_read(ready, result, wait_ns, shift_ns, self._count_invalid_values() if result else 0)
+        if result and self._statistics is not None:
+            self._statistics.record(self._ready_ns, self._count_invalid_values())
+        return result
 
-        # for each bit in 24 bits, perform ADC read
-        for _ in range(24):
-            # pulse sck high to request each bit
-            if not self._pulse_sck_high():
+    def _count_invalid_values(self):
+        """ number of ready ADCs whose last read was an invalid value """
+        return sum(1 for adc in self._adcs if adc._ready and adc._current_signed_value is None)
+
+    def _shift_and_read_all(self):
+        """
+        second half of _read(), once the ADCs are ready: clock out and store the 24 bits of each ready ADC,
+        then set the channel and gain of the next conversion
+
+        Returns:
+            bool : returns True if successful
+        """
+
+        adc: ADC
+        if self._gpio.supports_bulk_read:
+            # sample all dout pins at once on each pulse, then split the bits per ADC
+            if not self._shift_and_read_bulk():
                 return False
-            for adc in self._adcs:
-                if adc._ready:
-                    adc._shift_and_read()
+        else:
+            # for each bit in 24 bits, perform ADC read
+            for _ in range(24):
+                # pulse sck high to request each bit
+                if not self._pulse_sck_high():
+                    return False
+                for adc in self._adcs:
+                    if adc._ready:
+                        adc._shift_and_read()
         # finalize each ADC raw read
         for adc in self._adcs:
             if adc._ready:
@@ -249,6 +407,39 @@ class HX711:
 
         return True
 
+    def _shift_and_read_bulk(self):
+        """
+        bulk equivalent of calling ADC._shift_and_read() for every ready ADC on each of the 24 pulses.
+        The backend's read_levels() samples every dout pin with a single call per pulse, and the 24 captured
+        level words are de-interleaved into each ADC's raw read afterwards
+
+        Returns:
+            bool: True if all pulses were shorter than 60us
+        """
+
+        levels = self._levels
+        output = self._gpio.output
+        read_levels = self._gpio.read_levels
+        sck_pin = self._sck_pin
+        for i in range(24):
+            # same as _pulse_sck_high(), inlined because this loop is the hot path
+            pulse_start = perf_counter()
+            output(sck_pin, True)
+            output(sck_pin, False)
+            pulse_end = perf_counter()
+            if pulse_end - pulse_start >= self._POWER_DOWN_TIME:
+                self._on_long_pulse(pulse_end - pulse_start)
+                return False
+            levels[i] = read_levels()
+
+        # bits[i, j] is bit i (MSB first) of ADC j
+        bits = (np.array(levels, dtype=np.int64)[:, None] >> self._dout_shifts) & 1
+        raw_reads = (_BIT_WEIGHTS @ bits).tolist()
+        for adc, raw_read in zip(self._adcs, raw_reads):
+            if adc._ready:
+                adc._current_raw_read = raw_read
+        return True
+
     def read_raw(self, readings_to_average: int = 10, use_prev_read: bool = False):
         """ read raw data for all ADCs, does not perform unit conversion
 
@@ -263,6 +454,8 @@ class HX711:
 
         # if not use_prev_read, acquire new measurements
         if not use_prev_read:
+            self._check_not_streaming('read_raw')
+            self._check_not_multiplexing('read_raw')
             # alert user for bad readings to avg value
             if not (1 <= readings_to_average <= 10000):
                 raise ValueError(
@@ -274,17 +467,17 @@ class HX711:
             for adc in self._adcs:
                 adc._init_set_of_reads()
             # perform reads
+            self._timestamp_count = 0
             for _ in range(readings_to_average):
-                self._read()
+                if self._read():
+                    self._record_timestamp()
 
-            # for each adc, calculate measurement values
-            for adc in self._adcs:
-                if adc._ready:
-                    adc._calculate_measurement()
+            # calculate measurement values of all ready adcs at once
+            self._calculate_measurements()
 
-            all_adc_vars = "\n".join([str(vars(adc)) for adc in self._adcs])
-            self._logger.info(
-                f'Finished read operation. ADC results:\n{all_adc_vars}')
+            if self._logger.isEnabledFor(INFO):
+                self._logger.info('Finished read operation. ADC results:\n%s',
+                                  '\n'.join(repr(adc) for adc in self._adcs))
 
             adc_measurements = [
                 adc.measurement_from_zero for adc in self._adcs]
@@ -306,6 +499,62 @@ class HX711:
         else:
             return adc_measurements
 
+    def _record_timestamp(self):
+        """ append the data-ready time of the read that just succeeded to timestamps """
+        if self._timestamp_count == len(self._timestamps):
+            # grow once, the larger buffer is reused for all following sets of reads
+            self._timestamps = np.concatenate([self._timestamps, np.zeros_like(self._timestamps)])
+        self._timestamps[self._timestamp_count] = self._ready_ns
+        self._timestamp_count += 1
+
+    @property
+    def timestamps(self):
+        """
+        monotonic timestamps (ns) of each successful read of the last read_raw() or read_filtered(), taken when the data
+        became ready. In 'edge' ready_mode this is the time of the falling edge of the dout pin that got ready last,
+        in 'poll' ready_mode the time of the check that found all dout pins ready (up to 10ms late).
+        A read whose data was already ready when it started is stamped when it started
+
+        Returns:
+            np.ndarray: int64 array, one timestamp per successful read
+        """
+        return self._timestamps[:self._timestamp_count].copy()
+
+    def _calculate_measurements(self):
+        """
+        vectorized equivalent of calling ADC._calculate_measurement() for every ready ADC.
+        The raw reads of all ready ADCs without an outlier filter are filtered and averaged as one 2-D array
+        (see calculate_measurements) and the results are stored in each ADC exactly as _calculate_measurement() would
+        """
+
+        adcs = [adc for adc in self._adcs if adc._ready]
+        # ADCs with an outlier filter process their reads one by one, the others are filtered as a set
+        for adc in adcs:
+            if adc._outlier_filter is not None:
+                adc._calculate_measurement()
+        adcs = [adc for adc in adcs if adc._outlier_filter is None]
+        if not adcs:
+            return
+        length = max(adc._read_count for adc in adcs)
+        if length <= 1:
+            # nothing to filter, and the per-ADC calculation is cheaper than the overhead of the array operations
+            for adc in adcs:
+                adc._calculate_measurement()
+            return
+        if len(self._raw_reads) < length:
+            # grow once, the larger array is reused for all following reads
+            self._raw_reads = np.zeros((length, len(self._adcs)), dtype=np.int64)
+        raw_reads = self._raw_reads[:length, :len(adcs)]
+        for column, adc in enumerate(adcs):
+            raw_reads[:adc._read_count, column] = adc.raw_reads
+            # ADCs with fewer reads are padded with 0x000000, an invalid value that gets filtered out
+            raw_reads[adc._read_count:, column] = 0
+        measurements = calculate_measurements(raw_reads,
+                                              [adc._max_stdev for adc in adcs],
+                                              [adc._max_number_of_stdev_from_med for adc in adcs])
+        for column, adc in enumerate(adcs):
+            adc._set_measurement(measurements, column)
+
     def read_weight(self,
                     readings_to_average: int = 10,
                     use_prev_read: bool = False,
@@ -350,22 +599,298 @@ class HX711:
         """ simply returns the most recent calibrated weight value(s) without performing any new measurements IF FRESH else None"""
         return self.read_weight(use_prev_read=True, fresh_only=True)
 
+    @property
+    def counters(self):
+        """ ReadCounters collected since enable_counters(), or None if counters are disabled """
+        return self._counters
+
+    def enable_counters(self) -> ReadCounters:
+        """
+        start collecting ReadCounters for every read (success/failure, invalid values, long pulses and
+        time spent waiting for data ready and clocking out data). Counters continue from their current
+        values if they were already enabled. The cost is a few timestamps per read, not per sample bit
+
+        Returns:
+            ReadCounters: the counters, export them with as_dict()
+        """
+        if self._counters is None:
+            self._counters = ReadCounters()
+        return self._counters
+
+    def disable_counters(self):
+        """ stop collecting counters, returning the read path to zero overhead """
+        self._counters = None
+
+    @property
+    def statistics(self):
+        """ ReadStatistics collected since enable_statistics(), or None if statistics are disabled """
+        return self._statistics
+
+    def enable_statistics(self, window: int = 1000) -> ReadStatistics:
+        """
+        start collecting rolling statistics of the data-ready timestamps of successful reads, by any of read_raw(),
+        read_filtered() or streaming: effective sample rate, inter-sample jitter percentiles, conversions that were
+        dropped because the reads did not keep up, and invalid values. Use them to tune sample rates and to
+        detect when the CPU is overloaded. Statistics are kept if they were already enabled
+
+        Args:
+            window (int, optional): number of most recent reads the statistics are calculated over. Defaults to 1000
+
+        Returns:
+            ReadStatistics: the statistics, export them with as_dict()
+        """
+        if self._statistics is None:
+            self._statistics = ReadStatistics(window)
+        return self._statistics
+
+    def disable_statistics(self):
+        """ stop collecting statistics """
+        self._statistics = None
+
+    def set_filter(self, window: int = 10, mode: str = 'median', iir_alpha: float = None):
+        """
+        configure the moving-window filter used by read_filtered() and by start_streaming().
+        Each ADC gets its own MovingWindowFilter, previously filtered reads are forgotten
+
+        Args:
+            window (int, optional): number of reads in the moving window. Defaults to 10
+            mode (str, optional): 'median' or 'mean' of the window. Defaults to 'median', which rejects spikes
+            iir_alpha (float, optional): smoothing factor of an IIR low-pass filter applied after the window,
+                0 < iir_alpha <= 1. Defaults to None (no IIR filter)
+
+        Raises:
+            TypeError: if mode is not median or mean
+            ValueError: if window or iir_alpha is out of range
+        """
+        self._check_not_streaming('set_filter')
+        self._filters = [MovingWindowFilter(window, mode, iir_alpha) for _ in self._adcs]
+
+    def clear_filter(self):
+        """ remove the filter configured with set_filter(), so streaming returns unfiltered reads again """
+        self._check_not_streaming('clear_filter')
+        self._filters = None
+
+    def set_outlier_filter(self, strategy='hampel', **kwargs):
+        """
+        replace the filtering of read_raw(), which discards every read of a set whose deviations from the median have a
+        standard deviation over 100 (which happens constantly while a person moves on the scale), by a streaming
+        outlier filter that decides read by read. Each ADC gets its own filter, which also applies to read_filtered()
+        and streaming, before the filter of set_filter(). The measurement of read_raw() is the mean of the reads
+        the outlier filter returns
+
+        Args:
+            strategy (str or type, optional): 'hampel' (HampelFilter), 'mad' (MADClipping), 'rate' (RateLimiter),
+                'stdev' (StdevRejection) or another OutlierFilter subclass. None restores the default filtering
+                of read_raw(). Defaults to 'hampel'
+            **kwargs: passed to the OutlierFilter of each ADC, e.g. window and threshold, or max_step for 'rate'
+
+        Raises:
+            TypeError: if strategy is not one of the above
+        """
+        self._check_not_streaming('set_outlier_filter')
+        if strategy is None:
+            factory = None
+        elif isinstance(strategy, str) and strategy in OUTLIER_FILTERS:
+            factory = OUTLIER_FILTERS[strategy]
+        elif isinstance(strategy, type) and issubclass(strategy, OutlierFilter):
+            factory = strategy
+        else:
+            raise TypeError(
+                f'strategy must be one of {list(OUTLIER_FILTERS)}, an OutlierFilter subclass or None.\nReceived strategy: {strategy}')
+        for adc in self._adcs:
+            adc.set_outlier_filter(factory(**kwargs) if factory is not None else None)
+
+    @property
+    def outlier_filters(self):
+        """ OutlierFilter of each ADC (with their kept, replaced and dropped counters), None without set_outlier_filter() """
+        return [adc._outlier_filter for adc in self._adcs]
+
+    def read_filtered(self):
+        """
+        perform a single read of all ADCs and return each ADC's filtered value.
+        Unlike read_raw(readings_to_average=N), this returns after every conversion (up to 80Hz),
+        while the filter configured with set_filter() still smooths over the last `window` reads.
+        set_filter() is called with default arguments if no filter was configured.
+
+        An ADC whose read failed keeps its previous filtered value. The measurement, measurement_from_zero
+        and weight of each ADC are updated, so get_raw() and get_weight() work as they do after read_raw()
+
+        Returns:
+            list of float: filtered values as delta from zero(), None for ADCs without a valid read yet
+        """
+
+        self._check_not_streaming('read_filtered')
+        self._check_not_multiplexing('read_filtered')
+        if self._filters is None:
+            self.set_filter()
+
+        adc: ADC
+        for adc in self._adcs:
+            adc._init_set_of_reads()
+        self._timestamp_count = 0
+        if self._read():
+            self._record_timestamp()
+        for adc, adc_filter in zip(self._adcs, self._filters):
+            if adc._read_count and adc._current_signed_value is not None:
+                value = adc._filter_outlier(adc._current_signed_value)
+                if value is not None:
+                    adc_filter.update(value)
+                    adc._weight_is_fresh = True
+            if adc_filter.value is not None:
+                adc.measurement = adc_filter.value
+                adc.measurement_from_zero = adc.measurement - adc._zero_offset
+                adc.weight = adc.measurement_from_zero / adc._weight_multiple
+
+        adc_measurements = [adc.measurement_from_zero for adc in self._adcs]
+        if self._single_adc:
+            return adc_measurements[0]
+        else:
+            return adc_measurements
+
+    @property
+    def multiplexing(self):
+        """ ChannelSchedule set with set_multiplexing(), or None """
+        return self._schedule
+
+    def set_multiplexing(self, pattern, settling_conversions: int = 3):
+        """
+        alternate the input of the conversions on a fixed pattern, e.g. channel A/128 and channel B/32, so that both
+        are sampled without the power down and settling of reset() on every switch. The gain pulses at the end of each
+        read select the input of the next conversion, and only the `settling_conversions` conversions after each switch
+        are discarded. Read the inputs with read_multiplexed() or start_streaming(), which then stream each input separately.
+
+        Multiplexed values are raw signed ADC values: zero(), weight multiples and set_filter() apply to the configured
+        channel_select and channel_A_gain, which read_raw() and the other reads use as soon as multiplexing is cleared
+
+        Args:
+            pattern ([(str, int, int)]): (channel, gain, conversions) of each block, see ChannelSchedule.
+                For example [('A', 128, 8), ('B', 32, 2)]
+            settling_conversions (int, optional): conversions discarded after each switch. Defaults to 3
+
+        Raises:
+            TypeError, ValueError: if the pattern is invalid, see ChannelSchedule
+            ValueError: if all_or_nothing is False, because an ADC that is not ready ignores the gain pulses
+                and would no longer follow the pattern
+        """
+        self._check_not_streaming('set_multiplexing')
+        if not self._all_or_nothing:
+            raise ValueError('multiplexing requires all_or_nothing=True, so that every ADC switches input together')
+        self._schedule = ChannelSchedule(pattern, settling_conversions)
+
+    def clear_multiplexing(self):
+        """ stop multiplexing and return to the configured channel and gain, waiting for the output to settle """
+        self._check_not_streaming('clear_multiplexing')
+        if self._schedule is None:
+            return
+        self._schedule = None
+        # the read writes the configured gain pulses, then the output settles like after a reset
+        self._read()
+        self._settle()
+
+    def _check_multiplexing(self, caller: str):
+        if self._schedule is None:
+            raise RuntimeError(f'{caller}() requires set_multiplexing() to be called first')
+
+    def _check_not_multiplexing(self, caller: str):
+        if self._schedule is not None:
+            raise RuntimeError(f'{caller}() cannot be used while multiplexing. Call clear_multiplexing() first')
+
+    def read_multiplexed(self, conversions: int = None):
+        """
+        read conversions following the pattern of set_multiplexing() and return the valid ones per input
+
+        Args:
+            conversions (int, optional): number of conversions to read, including the discarded ones.
+                Defaults to one cycle of the pattern (see ChannelSchedule.cycle_length)
+
+        Returns:
+            dict: (channel, gain) of each input of the pattern to a tuple of
+                timestamps (np.ndarray): int64 monotonic timestamps (ns) of the valid conversions of the input
+                values (np.ndarray): float64 array of shape (n, ADCs), raw signed values, NaN if invalid
+
+        Raises:
+            RuntimeError: if multiplexing is not set, or while streaming
+        """
+        self._check_multiplexing('read_multiplexed')
+        self._check_not_streaming('read_multiplexed')
+        if conversions is None:
+            conversions = self._schedule.cycle_length
+        inputs = self._schedule.inputs
+        timestamps = [[] for _ in inputs]
+        rows = [[] for _ in inputs]
+        values = [float('nan')] * len(self._adcs)
+        for _ in range(conversions):
+            sample = self._read_multiplexed_sample(values)
+            if sample is not None:
+                timestamp, input_index = sample
+                timestamps[input_index].append(timestamp)
+                rows[input_index].append(list(values))
+        return {
+            input_: (np.array(timestamps[i], dtype=np.int64),
+                     np.array(rows[i], dtype=np.float64).reshape(len(rows[i]), len(self._adcs)))
+            for i, input_ in enumerate(inputs)
+        }
+
+    def _read_multiplexed_sample(self, values: list, wait: bool = True):
+        """
+        read one conversion of the multiplexing pattern. values is filled in place with the raw signed value of each ADC,
+        NaN for ADCs without a valid read
+
+        Returns:
+            (int, int): monotonic timestamp (ns) and input index of the conversion, or None if it was not read or
+                is discarded while the input settles
+        """
+        adc: ADC
+        input_index, valid = self._schedule.current
+        for adc in self._adcs:
+            adc._init_set_of_reads()
+        if not self._read(wait) or not valid:
+            return None
+        for i, adc in enumerate(self._adcs):
+            if adc._ready and adc._read_count and adc._current_signed_value is not None:
+                values[i] = adc._current_signed_value
+            else:
+                values[i] = float('nan')
+        return self._ready_ns, input_index
+
     def power_down(self):
         """ turn off all hx711 by setting SCK pin LOW then HIGH """
-        GPIO.output(self._sck_pin, False)
-        GPIO.output(self._sck_pin, True)
+        self._check_not_streaming('power_down')
+        self._gpio.output(self._sck_pin, False)
+        self._gpio.output(self._sck_pin, True)
         sleep(0.01)
 
     def power_up(self):
         """ turn on all hx711 by setting SCK pin LOW """
-        GPIO.output(self._sck_pin, False)
-        result = self._read()
-        sleep(0.4)  # 400ms settling time according to documentation
+        self._check_not_streaming('power_up')
+        self._gpio.output(self._sck_pin, False)
+        if self._schedule is not None:
+            # powering up resets the input to A/128
+            self._schedule.restart()
+        result = self._settle()
         if result:
             return True
         else:
             return False
 
+    def _settle(self):
+        """
+        wait for the output to settle after power up or a channel/gain change. According to the documentation this takes
+        4 conversions (400ms at 10Hz, 50ms at 80Hz). Instead of always sleeping 400ms, read and discard conversions
+        until 4 have been read or 400ms have passed, whichever comes first
+
+        Returns:
+            bool: True if a conversion of every ADC was read
+        """
+        deadline = perf_counter() + self._SETTLING_TIME
+        settled = 0
+        while settled < self._SETTLING_CONVERSIONS:
+            if self._read() and all([adc._ready for adc in self._adcs]):
+                settled += 1
+            if perf_counter() >= deadline:
+                break
+        return settled > 0
+
     def reset(self):
         """ resets the hx711 and prepare it for the next reading.
 
@@ -378,77 +903,259 @@ class HX711:
         else:
             return False
 
-    """ internal helper: returns true if the reading is valid (i.e. non-None and within some threshold limits)"""
-    def _is_valid_reading(self, reading, lower_threshold, upper_threshold):
-        if not reading:
-            return False
-        for v in reading:
-            if not v:
-                return False
-            if v < lower_threshold:
-                return False
-            if v > upper_threshold:
-                return False
-        return True
+    @property
+    def is_streaming(self):
+        """ True while the acquisition thread started by start_streaming() is running """
+        return self._stream_thread is not None and self._stream_thread.is_alive()
+
+    @property
+    def stream_buffer(self):
+        """ SampleRingBuffer of the current (or last) start_streaming(), None if it was never called """
+        return self._stream_buffer
+
+    def start_streaming(self, buffer_size: int = 4096):
+        """
+        start a dedicated acquisition thread that reads all ADCs back-to-back and pushes each
+        conversion into a preallocated ring buffer. Drain the buffer with get_samples()
+
+        Each sample holds a monotonic timestamp (ns) taken when the data became ready (see timestamps) and one value per ADC, as a delta from zero()
+        (same units as read_raw(readings_to_average=1)). ADCs that returned an invalid value are NaN.
+        If a filter was configured with set_filter(), each value is the filtered value after that conversion.
+        While streaming, read_raw(), power_down(), power_up(), reset() and zero() raise RuntimeError
+        because they would compete with the acquisition thread for the clock line.
+        With multiplexing (see set_multiplexing()) each input of the pattern is streamed into a ring buffer of its own,
+        with raw signed values, and get_samples() takes the input to return.
+
+        Note: if the acquisition thread is preempted while SCK is high for 60us or more, the HX711 powers
+        down and that conversion is dropped. Avoid running CPU-heavy Python threads alongside it.
+
+        Args:
+            buffer_size (int, optional): number of samples kept in the ring buffer. Defaults to 4096
+                (~50 seconds at 80Hz). Consumers that fall further behind lose the oldest samples
+
+        Raises:
+            RuntimeError: if already streaming
+        """
+        if self.is_streaming:
+            raise RuntimeError('HX711 is already streaming')
+        self._stream_buffer = SampleRingBuffer(capacity=buffer_size, channels=len(self._adcs))
+        if self._schedule is not None:
+            # the first input shares the default buffer, so get_samples() without an input returns it
+            self._stream_buffers = {input_: SampleRingBuffer(capacity=buffer_size, channels=len(self._adcs))
+                                    for input_ in self._schedule.inputs[1:]}
+            self._stream_buffers[self._schedule.inputs[0]] = self._stream_buffer
+        else:
+            self._stream_buffers = None
+        self._stream_stop.clear()
+        self._stream_thread = threading.Thread(target=self._stream_loop,
+                                               name='hx711-multi-stream',
+                                               daemon=True)
+        self._stream_thread.start()
+
+    def stop_streaming(self, timeout: float = 1.0):
+        """
+        stop the acquisition thread started by start_streaming(). Samples already in the
+        ring buffer remain available through get_samples()
+
+        Args:
+            timeout (float, optional): seconds to wait for the thread to finish its current read. Defaults to 1.0
+        """
+        if self._stream_thread is None:
+            return
+        self._stream_stop.set()
+        self._stream_thread.join(timeout)
+        if self._stream_thread.is_alive():
+            self._logger.warning('acquisition thread did not stop within %s seconds', timeout)
+        else:
+            self._stream_thread = None
+
+    def get_samples(self, since: int = 0, channel=None) -> Samples:
+        """
+        copy out samples acquired by the streaming thread without blocking it
+
+        Args:
+            since (int, optional): index of the first sample to return. Pass `next_index` of the
+                previous call to only receive new samples. Defaults to 0 (everything still buffered)
+            channel ((str, int) or str, optional): when streaming with multiplexing, the (channel, gain) input to return,
+                or just its channel if the pattern has one gain of it. Defaults to None (the first input of the pattern)
+
+        Returns:
+            Samples: named tuple of (timestamps, values, next_index, dropped)
+
+        Raises:
+            RuntimeError: if start_streaming() has never been called
+            ValueError: if channel is not streamed
+        """
+        if self._stream_buffer is None:
+            raise RuntimeError('get_samples() requires start_streaming() to be called first')
+        if channel is None:
+            return self._stream_buffer.get_samples(since)
+        buffers = self._stream_buffers or {}
+        matches = [key for key in buffers if key == tuple(channel) or key[0] == channel]
+        if len(matches) != 1:
+            raise ValueError(f'channel must be one of the streamed inputs {list(buffers)}.\nReceived channel: {channel}')
+        return buffers[matches[0]].get_samples(since)
+
+    def _stream_loop(self):
+        """ body of the acquisition thread: read continuously and publish each conversion to the ring buffer """
+        buffer = self._stream_buffer
+        values = [float('nan')] * len(self._adcs)
+        try:
+            if self._schedule is not None:
+                buffers = [self._stream_buffers[input_] for input_ in self._schedule.inputs]
+                while not self._stream_stop.is_set():
+                    sample = self._read_multiplexed_sample(values)
+                    if sample is not None:
+                        buffers[sample[1]].push(sample[0], values)
+                return
+            while not self._stream_stop.is_set():
+                timestamp = self._read_sample(values)
+                if timestamp is not None:
+                    buffer.push(timestamp, values)
+        except Exception:
+            self._logger.exception('acquisition thread stopped due to an error')
+
+    def _read_sample(self, values: list, wait: bool = True):
+        """
+        read one conversion of all ADCs as a streaming sample: each value is the (filtered) read as a
+        delta from zero(), NaN for ADCs without a valid read
+
+        Args:
+            values (list of float): filled in place, one value per ADC
+            wait (bool, optional): passed to _read(). Defaults to True
+
+        Returns:
+            int: monotonic timestamp (ns) of the sample, or None if no ADC was read
+        """
+        filters = self._filters
+        adc: ADC
+        for adc in self._adcs:
+            adc._init_set_of_reads()
+        if not self._read(wait):
+            return None
+        timestamp = self._ready_ns
+        any_ready = False
+        for i, adc in enumerate(self._adcs):
+            value = None
+            if adc._ready and adc._read_count and adc._current_signed_value is not None:
+                value = adc._filter_outlier(adc._current_signed_value)
+            if value is not None:
+                if filters is not None:
+                    value = filters[i].update(value)
+                values[i] = value - adc._zero_offset
+            else:
+                values[i] = float('nan')
+            any_ready = any_ready or adc._ready
+        return timestamp if any_ready else None
+
+    def _check_not_streaming(self, caller: str):
+        if self.is_streaming:
+            raise RuntimeError(f'{caller}() cannot be used while streaming. Call stop_streaming() first')
 
-    """ perform raw read of a few samples to get a raw mean measurement, and set this as zero offset """
     def zero(
         self,
         readings_to_average: int = 30,
         retry_limit: int = 20,
         lower_threshold: float=-1000000.0,
-        upper_threshold: float= 1000000.0):
+        upper_threshold: float= 1000000.0,
+        tolerance: float = None,
+        min_readings: int = 10):
+        """
+        set the zero offset of every ADC to the median of its valid reads.
+        All ADCs are sampled by the same reads straight from the ADCs (no read_raw() per sample), and each ADC
+        collects its own valid values, so an invalid value of one ADC does not discard the values of the others.
+
+        With tolerance set, zeroing converges early: an ADC is done as soon as the standard error of its median
+        (estimated robustly from the median absolute deviation) is within tolerance, after at least min_readings values.
+        With low noise this takes a fraction of readings_to_average reads
+
+        Args:
+            readings_to_average (int, optional): maximum number of valid values per ADC. Defaults to 30
+            retry_limit (int, optional): number of consecutive reads without a valid value after which an ADC fails. Defaults to 20
+            lower_threshold (float, optional): values below this (relative to the current zero) are not valid. Defaults to -1000000.0
+            upper_threshold (float, optional): values above this (relative to the current zero) are not valid. Defaults to 1000000.0
+            tolerance (float, optional): standard error (raw counts) at which the offset of an ADC is good enough.
+                Defaults to None, which always uses readings_to_average values
+            min_readings (int, optional): minimum number of valid values per ADC before converging early. Defaults to 10
+
+        Returns:
+            int: number of reads performed
+
+        Raises:
+            RuntimeError: if an ADC had no valid value in retry_limit consecutive reads
+        """
 
         assert readings_to_average > 0
         assert retry_limit > 0
+        self._check_not_streaming('zero')
+        self._check_not_multiplexing('zero')
 
-        # accumulate each measurement into a rolling average
-        num_readings = 0
-        rolling_averages = []
-        while num_readings < readings_to_average:
-
-            # take a measurement, with retries and validation (thresholding, etc.)
-            reading = None
-            tries = 0
-            while not self._is_valid_reading(reading, lower_threshold, upper_threshold) and tries < retry_limit:
-                reading = self.read_raw(1)
-                if not hasattr(reading, '__iter__'):
-                    reading = [reading]
-                tries += 1
-
-            if not self._is_valid_reading(reading, lower_threshold, upper_threshold):
-                raise RuntimeError(f"failed to take a measurement after {retry_limit} tries")
-
-            # accumulate the reading into the rolling average
-            if num_readings == 0:
-                rolling_averages = reading
-            else:
-                assert len(rolling_averages) == len(reading)
-                for i in range(0, len(rolling_averages)):
-                    v = num_readings*rolling_averages[i] + reading[i]
-                    rolling_averages[i] = v / (num_readings + 1)
+        adc: ADC
+        values = np.empty((readings_to_average, len(self._adcs)), dtype=np.float64)
+        counts = [0] * len(self._adcs)
+        tries = [0] * len(self._adcs)
+        offsets = [None] * len(self._adcs)
+        reads = 0
+        while None in offsets:
+            for adc in self._adcs:
+                adc._init_set_of_reads()
+            self._read()
+            reads += 1
+            for i, adc in enumerate(self._adcs):
+                if offsets[i] is not None:
+                    continue
+                value = adc._current_signed_value if adc._ready and adc._read_count else None
+                if value is None or not (lower_threshold <= value - adc._zero_offset <= upper_threshold):
+                    tries[i] += 1
+                    if tries[i] >= retry_limit:
+                        raise RuntimeError(
+                            f'failed to take a measurement of ADC (dout {adc._dout_pin}) after {retry_limit} tries')
+                    continue
+                tries[i] = 0
+                values[counts[i], i] = value
+                counts[i] += 1
+                offsets[i] = self._converged_offset(values[:counts[i], i], readings_to_average, tolerance, min_readings)
+
+        for adc, offset, count in zip(self._adcs, offsets, counts):
+            self._logger.debug('zeroing ADC (dout %s) with %d datapoints', adc._dout_pin, count)
+            adc.zero(offset)
+        return reads
+
+    @staticmethod
+    def _converged_offset(values: np.ndarray, readings_to_average: int, tolerance: float, min_readings: int):
+        """ median of values once there are readings_to_average of them, or earlier once it is within tolerance, else None """
+        if len(values) >= readings_to_average:
+            return float(np.median(values))
+        if tolerance is None or len(values) < min_readings:
+            return None
+        offset = np.median(values)
+        # standard error of the median of normal data, with the stdev estimated from the MAD
+        standard_error = 1.2533 * 1.4826 * np.median(np.abs(values - offset)) / np.sqrt(len(values))
+        return float(offset) if standard_error <= tolerance else None
+
+    def save_calibration(self, path):
+        """
+        write the zero offsets and weight multiples of all ADCs to a JSON calibration file, see calibration.save_calibration()
 
-            num_readings += 1
+        Args:
+            path (str or Path): calibration file
+        """
+        save_calibration(self, path)
 
-        assert num_readings == readings_to_average
-        assert len(rolling_averages) == len(self._adcs)
+    def load_calibration(self, path, max_age: float = None):
+        """
+        restore zero offsets and weight multiples from a calibration file written by save_calibration(), so that a
+        restart can skip zeroing. Nothing is applied if the file is missing, unreadable, too old, or was written for
+        different pins, channel or gain (see calibration.load_calibration())
 
-        # set the zero point of each ADC
-        zeroing_errors = []
-        for i in range(0, len(self._adcs)):
-            adc = self._adcs[i]
-            avg = rolling_averages[i]
-            if adc._ready:
-                self._logger.debug(
-                    f'zeroing with {len(adc._reads_filtered)} datapoints')
-                try:
-                    adc.zero(avg)
-                except Exception as e:
-                    zeroing_errors.append(e)
-                    continue
-        if zeroing_errors:
-            raise Exception(
-                f'Failed to zero all ADCs. Errors: {str(zeroing_errors)}')
+        Args:
+            path (str or Path): calibration file
+            max_age (float, optional): maximum age of the file in seconds. Defaults to None (any age)
+
+        Returns:
+            bool: True if the calibration was applied
+        """
+        return load_calibration(self, path, max_age)
 
     def set_weight_multiples(self,
                              weight_multiples,
@@ -485,7 +1192,26 @@ class HX711:
         for adc, weight_multiple in zip(adcs, weight_multiples):
             adc._weight_multiple = weight_multiple
 
-    def run_calibration(self, known_weights: List[float] = [], readings_to_average: int = 10, adc_index: int = 0):
+    @property
+    def weight_multiples(self):
+        """ weight multiple of each ADC, in the order of the dout pins, see set_weight_multiples() """
+        return [adc._weight_multiple for adc in self._adcs]
+
+    @property
+    def zero_offsets(self):
+        """ zero offset of each ADC, in the order of the dout pins, see zero() """
+        return [adc._zero_offset for adc in self._adcs]
+
+    @property
+    def single_adc(self):
+        """ True if dout_pins was a single pin, then reads return a single value instead of a list """
+        return self._single_adc
+
+    def run_calibration(self,
+                        known_weights: List[float] = [],
+                        readings_to_average: int = 10,
+                        adc_index: int = 0,
+                        zero_tolerance: float = 2.):
         """ initialize ADC, zero it, prompt user for inputs if needed
         User runs function with no weight on scale, then adds known weights to scale in order to calculate real-world weight multiple
 
@@ -496,12 +1222,14 @@ class HX711:
                 default 10
             adc_index (int, optional): index of adc to calibrate (if multiple pins have been initialized
                 default 0
+            zero_tolerance (float, optional): tolerance (raw counts) of zero(), which stops zeroing early once
+                the offset is this accurate. Defaults to 2. None always uses 128 * readings_to_average reads
 
         Returns:
             weight_multiple (float): real-world weight multiple
         """
 
-        self._logger.debug(f'Running calibration for ADC {adc_index} with {len(known_weights)} known weights')
+        self._logger.debug('Running calibration for ADC %d with %d known weights', adc_index, len(known_weights))
 
         # if known weights were entered, speed up script by not prompting user to prepare
         if not known_weights:
@@ -509,7 +1237,7 @@ class HX711:
 
         # reset ADCs, zero them, set adc multiple to 1
         self.reset()
-        self.zero(readings_to_average=128*readings_to_average)
+        self.zero(readings_to_average=128*readings_to_average, tolerance=zero_tolerance)
         self._adcs[adc_index]._weight_multiple = 1
 
         # loop until no more known weights or user has not supplied a known weight input
@@ -587,16 +1315,22 @@ class ADC:
     Args:
         dout_pin (int): Raspberry Pi GPIO pin where data from HX711 is received
         logger (logger): logger from main class to use for logging
+        gpio (GPIOBackend): backend from main class used to read dout_pin
 
     Attrs:
         _dout_pin (int):            gpio pin for read
         _logger (logger):           logger from main HX711 class
+        _gpio (GPIOBackend):        GPIO backend from main HX711 class
         _zero_offset (float):       offset set after performing a zero read
         _weight_multiple (float):   multiple to convert from raw measurement to real world value
         _ready (bool):              bool for checking sensor ready
         _current_raw_read (int):    current raw read from binary bit read
-        raw_reads ([int]):          raw reads from binary bit read as 2s complement from ADC
-        reads ([signed int])        raw reads after convert to signed integer
+        _current_signed_value (int): current raw read after convert to signed integer, None if invalid
+        _raw_read_buffer (np.ndarray): preallocated int64 storage for raw reads, reused for every set of reads
+        _read_count (int):          number of raw reads in _raw_read_buffer
+        raw_reads (np.ndarray):     raw reads from binary bit read as 2s complement from ADC.
+                                    This is a view of _raw_read_buffer, copy it to keep it past the next read
+        reads ([signed int])        raw reads after convert to signed integer, None if invalid
         _max_stdev (int):           max standard deviation value of raw reads (future todo: expose for user input? Does this vary per hardware?)
         _reads_filtered ([int])     filtered reads after removing failed reads and bad datapoints
         _max_number_of_stdev_from_med (float): maximium number of deviations from median (future todo: expose for user input?)
@@ -608,21 +1342,35 @@ class ADC:
         measurement_from_zero (float): measurement minus offset
         weight (float):             measurement_from_zero divided by weight_multiple
         _weight_is_fresh (bool) :   set to False when reading is initialized, set to True at the same time as a new weight
+        _outlier_filter (OutlierFilter): filters each read instead of the set of reads in _calculate_measurement(), None by default
     """
 
+    __slots__ = (
+        '_dout_pin', '_logger', '_gpio', '_zero_offset', '_weight_multiple', '_ready', '_current_raw_read',
+        '_current_signed_value', '_raw_read_buffer', '_read_count', '_max_stdev', '_reads_filtered',
+        '_max_number_of_stdev_from_med', '_read_med', '_devs_from_med', '_read_stdev', '_ratios_to_stdev',
+        'measurement', 'measurement_from_zero', 'weight', '_weight_is_fresh', '_outlier_filter',
+    )
+
+    # initial capacity of _raw_read_buffer, which doubles whenever a set of reads does not fit
+    _initial_buffer_size = 16
+
     def __init__(
         self,
         dout_pin: int,
         logger: Logger,
+        gpio: GPIOBackend,
     ):
         self._dout_pin = dout_pin
         self._logger = logger
+        self._gpio = gpio
         self._zero_offset = 0.
         self._weight_multiple = 1.
         self._ready = False
         self._current_raw_read = 0
-        self.raw_reads = []
-        self.reads = []
+        self._current_signed_value = None
+        self._raw_read_buffer = np.zeros(self._initial_buffer_size, dtype=np.int64)
+        self._read_count = 0
         self._max_stdev = 100
         self._reads_filtered = []
         self._max_number_of_stdev_from_med = 2.0
@@ -634,6 +1382,21 @@ class ADC:
         self.measurement_from_zero = None
         self.weight = None
         self._weight_is_fresh = None
+        self._outlier_filter = None
+
+    def __repr__(self):
+        return (f'ADC(dout_pin={self._dout_pin}, ready={self._ready}, reads={self._read_count}, '
+                f'median={self._read_med}, stdev={self._read_stdev}, filtered={len(self._reads_filtered)}, '
+                f'measurement={self.measurement}, measurement_from_zero={self.measurement_from_zero}, '
+                f'weight={self.weight})')
+
+    @property
+    def raw_reads(self):
+        return self._raw_read_buffer[:self._read_count]
+
+    @property
+    def reads(self):
+        return [self.convert_to_signed_value(raw_read) for raw_read in self.raw_reads.tolist()]
 
     def zero_from_last_measurement(self):
         """ sets offset based on current value for measurement """
@@ -655,10 +1418,20 @@ class ADC:
         """ simply sets multiple. example: scale indicates value of 5000 for 1 gram on scale, weight_multiple = 5000 """
         self._weight_multiple = weight_multiple
 
+    def set_outlier_filter(self, outlier_filter: OutlierFilter = None):
+        """ filter each read with outlier_filter instead of filtering whole sets of reads, None for the default filtering """
+        self._outlier_filter = outlier_filter
+
+    def _filter_outlier(self, value):
+        """ value of a valid read after the outlier filter, None if the filter drops it """
+        if self._outlier_filter is None:
+            return value
+        return self._outlier_filter.update(value)
+
     def _init_set_of_reads(self):
         """ init arrays and calculated values before beginning a set of reads for a measurement """
-        self.raw_reads = []
-        self.reads = []
+        # the buffer is kept, only the count is reset
+        self._read_count = 0
         self._reads_filtered = []
         self._read_med = None
         self._devs_from_med = []
@@ -680,32 +1453,35 @@ class ADC:
         if self._ready:
             return True
         else:
-            self._ready = (GPIO.input(self._dout_pin) == 0)
+            self._ready = (self._gpio.input(self._dout_pin) == 0)
             return self._ready
 
     def _shift_and_read(self):
         """ left shift by one bit then bitwise OR with the new bit """
-        self._current_raw_read = (self._current_raw_read << 1) | GPIO.input(
+        self._current_raw_read = (self._current_raw_read << 1) | self._gpio.input(
             self._dout_pin)
 
     def _finish_raw_read(self):
-        """ append current raw read value and signed value to raw_reads list and reads list """
-        self.raw_reads.append(self._current_raw_read)
+        """ append current raw read value to raw_reads and convert it to a signed value """
+        if self._read_count == len(self._raw_read_buffer):
+            # grow once, the larger buffer is reused for all following sets of reads
+            buffer = np.zeros(2 * len(self._raw_read_buffer), dtype=np.int64)
+            buffer[:self._read_count] = self._raw_read_buffer
+            self._raw_read_buffer = buffer
+        self._raw_read_buffer[self._read_count] = self._current_raw_read
+        self._read_count += 1
         # convert to signed value
         self._current_signed_value = self.convert_to_signed_value(
             self._current_raw_read)
-        self.reads.append(self._current_signed_value)
-        # log 2's complement value and signed value
-        self._logger.debug(
-            f'Binary value: {bin(self._current_raw_read)} -> Signed: {self._current_signed_value}'
-        )
+        # log 2's complement value and signed value. Guarded, as this runs for every sample
+        if self._logger.isEnabledFor(DEBUG):
+            self._logger.debug('Binary value: %s -> Signed: %s', bin(self._current_raw_read), self._current_signed_value)
 
     def convert_to_signed_value(self, raw_value):
         # convert to signed value after verifying value is valid
         # return None if value is exactly zero, the min or max value, or a value of all 1's
         if raw_value in [0x000000, 0x800000, 0x7FFFFF, 0xFFFFFF]:
-            self._logger.debug('Invalid raw value detected: {}'.format(
-                hex(raw_value)))
+            self._logger.debug('Invalid raw value detected: %#x', raw_value)
             return None  # return None because the data is invalid
         # calculate int from 2's complement
         # check if the sign bit is 1, indicating a negative number
@@ -728,6 +1504,9 @@ class ADC:
             bool: pass or fail boolean based on filtering of data
         """
 
+        if self._outlier_filter is not None:
+            return self._calculate_outlier_filtered_measurement()
+
         # filter reads to valid data only
         self._reads_filtered = [
             r for r in self.reads if ((r is not None) and (type(r) is int))
@@ -759,15 +1538,17 @@ class ADC:
             # if standard deviation is too large, the scale isn't actually ready
             # sometimes with a bad scale connection, the bit will come back ready out of chance and the binary values are garbage data
             self._ready = False
-            self._logger.warn(
-                f'ADC (dout {self._dout_pin}) not ready, stdev from median was over {self._max_stdev}: {self._read_stdev}'
-            )
+            self._logger.warning('ADC (dout %s) not ready, stdev from median was over %s: %s',
+                                 self._dout_pin, self._max_stdev, self._read_stdev)
         elif self._read_stdev:
             self._ratios_to_stdev = [(dev / self._read_stdev)
                                      for dev in self._devs_from_med]
         else:
             # stdev is 0. Therefore set to the median
             self.measurement = self._read_med
+            self.measurement_from_zero = self.measurement - self._zero_offset
+            self.weight = self.measurement_from_zero / self._weight_multiple
+            self._weight_is_fresh = True
             return True
         _new_reads_filtered = []
         for (read_val, ratio) in zip(self._reads_filtered,
@@ -786,3 +1567,81 @@ class ADC:
         self._weight_is_fresh = True
 
         return True
+
+    def _calculate_outlier_filtered_measurement(self):
+        """
+        _calculate_measurement() with an outlier filter: pass each valid read through the filter in order, and
+        take the mean of the values it returns. A set of reads only fails if the filter drops all of them
+
+        Returns:
+            bool: pass or fail boolean based on filtering of data
+        """
+        self._reads_filtered = []
+        for read in self.reads:
+            if read is not None:
+                value = self._outlier_filter.update(read)
+                if value is not None:
+                    self._reads_filtered.append(value)
+        if not self._reads_filtered:
+            return False
+        self.measurement = sum(self._reads_filtered) / len(self._reads_filtered)
+        self.measurement_from_zero = self.measurement - self._zero_offset
+        self.weight = self.measurement_from_zero / self._weight_multiple
+        self._weight_is_fresh = True
+        return True
+
+    def _set_measurement(self, measurements: Measurements, column: int):
+        """
+        store the result of calculate_measurements() for this ADC, with the same outcome as _calculate_measurement()
+
+        Args:
+            measurements (Measurements): result of calculate_measurements() for a set of ADCs
+            column (int): column of this ADC in measurements
+
+        Returns:
+            bool: pass or fail boolean based on filtering of data
+        """
+
+        valid = measurements.valid[:, column]
+        self._reads_filtered = measurements.signed[valid, column]
+        count = measurements.counts[column]
+        if not count:
+            # no values after filter, so return False to indicate no read value
+            return False
+        elif count == 1:
+            # see _calculate_measurement() on why single reads are not filtered and not fresh
+            self.measurement = int(self._reads_filtered[0])
+            self.measurement_from_zero = self.measurement - self._zero_offset
+            self.weight = self.measurement_from_zero / self._weight_multiple
+            return True
+
+        self._read_med = float(measurements.medians[column])
+        self._devs_from_med = measurements.deviations[valid, column]
+        self._read_stdev = float(measurements.stdevs[column])
+
+        if self._read_stdev > self._max_stdev:
+            self._ready = False
+            self._logger.warning('ADC (dout %s) not ready, stdev from median was over %s: %s',
+                                 self._dout_pin, self._max_stdev, self._read_stdev)
+            self._reads_filtered = self._reads_filtered[:0]
+            return False
+        elif self._read_stdev:
+            self._ratios_to_stdev = self._devs_from_med / self._read_stdev
+        else:
+            # stdev is 0. Therefore set to the median
+            self.measurement = self._read_med
+            self.measurement_from_zero = self.measurement - self._zero_offset
+            self.weight = self.measurement_from_zero / self._weight_multiple
+            self._weight_is_fresh = True
+            return True
+        self._reads_filtered = measurements.signed[measurements.kept[:, column], column]
+
+        # get mean value
+        if not len(self._reads_filtered):
+            # no values after filter, so return False to indicate no read value
+            return False
+        self.measurement = float(measurements.means[column])
+        self.measurement_from_zero = self.measurement - self._zero_offset
+        self.weight = self.measurement_from_zero / self._weight_multiple
+        self._weight_is_fresh = True
+        return True
@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+"""
+This file holds the logging setup and the optional read counters and statistics of the driver.
+They are designed to cost nothing per sample unless they are switched on
+"""
+
+from logging import getLogger, Logger, StreamHandler
+import numpy as np
+
+LOGGER_NAME = 'hx711-multi'
+
+
+class _ConsoleHandler(StreamHandler):
+    """ console handler added by HX711, a distinct class so that it is only ever added once """
+
+
+def get_logger(log_level='WARN') -> Logger:
+    """
+    return the shared hx711-multi logger with a single console handler, both set to log_level.
+    Creating several HX711 instances therefore no longer prints every message several times
+
+    Args:
+        log_level (str or int): Optional, by default 'WARN'
+            Options (0:'NOTSET', 10:'DEBUG', 20:'INFO', 30:'WARN', 40:'ERROR', 50:'CRITICAL')
+
+    Returns:
+        Logger: logger named hx711-multi
+    """
+    logger = getLogger(LOGGER_NAME)
+    logger.setLevel(log_level)
+    handler = next((h for h in logger.handlers if isinstance(h, _ConsoleHandler)), None)
+    if handler is None:
+        handler = _ConsoleHandler()
+        logger.addHandler(handler)
+    handler.setLevel(log_level)
+    return logger
+
+
+class ReadCounters:
+    """
+    ReadCounters accumulates what happened during each HX711._read(): how often reads succeeded,
+    why they failed, and how long waiting for data ready and clocking out the data took.
+    Counters are only collected after HX711.enable_counters(), otherwise the driver skips them entirely.
+
+    Attrs:
+        reads (int):            number of read operations (one conversion of every ADC)
+        failed_reads (int):     reads that returned no data (not ready with all_or_nothing, or a long pulse)
+        not_ready (int):        reads where at least one ADC was not ready in time
+        long_pulses (int):      SCK pulses of 60us or more, which power the HX711 down
+        invalid_values (int):   ADC values discarded as invalid (0, min, max or all 1's)
+        wait_ns (int):          total time spent waiting for data ready, in nanoseconds
+        shift_ns (int):         total time spent clocking out data and setting the gain, in nanoseconds
+        max_wait_ns (int):      longest single wait for data ready
+        max_shift_ns (int):     longest single clock out
+    """
+
+    __slots__ = ('reads', 'failed_reads', 'not_ready', 'long_pulses', 'invalid_values',
+                 'wait_ns', 'shift_ns', 'max_wait_ns', 'max_shift_ns')
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        """ set all counters back to zero """
+        for name in self.__slots__:
+            setattr(self, name, 0)
+
+    def record_read(self, ready: bool, success: bool, wait_ns: int, shift_ns: int, invalid_values: int):
+        """ called by HX711 at the end of each read """
+        self.reads += 1
+        if not success:
+            self.failed_reads += 1
+        if not ready:
+            self.not_ready += 1
+        self.invalid_values += invalid_values
+        self.wait_ns += wait_ns
+        self.shift_ns += shift_ns
+        if wait_ns > self.max_wait_ns:
+            self.max_wait_ns = wait_ns
+        if shift_ns > self.max_shift_ns:
+            self.max_shift_ns = shift_ns
+
+    def as_dict(self) -> dict:
+        """
+        export the counters, plus mean wait and clock out times per read
+
+        Returns:
+            dict: counter name to value, ready for json.dumps() or a metrics system
+        """
+        counters = {name: getattr(self, name) for name in self.__slots__}
+        counters['mean_wait_ns'] = self.wait_ns / self.reads if self.reads else 0.
+        counters['mean_shift_ns'] = self.shift_ns / self.reads if self.reads else 0.
+        return counters
+
+
+class ReadStatistics:
+    """
+    ReadStatistics keeps the data-ready timestamps of the last `window` successful reads of an HX711 and calculates
+    rolling statistics from them on request. Recording a read is O(1), all the work happens in as_dict().
+    Statistics are only collected after HX711.enable_statistics()
+
+    Conversions that were dropped (the HX711 converted, but the next read came too late and got a later conversion)
+    are estimated from the intervals between reads: an interval of k times the median interval means k - 1 dropped
+    conversions. This relies on reads keeping up most of the time, so that the median interval is the conversion period.
+
+    Args:
+        window (int): Optional, by default 1000
+            number of most recent reads kept
+
+    Raises:
+        ValueError: if window is less than 2
+    """
+
+    __slots__ = ('_window', '_timestamps', '_invalid_values', '_count')
+
+    def __init__(self, window: int = 1000):
+        if window < 2:
+            raise ValueError(f'window must be at least 2.\nReceived window: {window}')
+        self._window = window
+        self._timestamps = np.zeros(window, dtype=np.int64)
+        self._invalid_values = np.zeros(window, dtype=np.int64)
+        self._count = 0
+
+    @property
+    def window(self):
+        return self._window
+
+    def reset(self):
+        """ forget all recorded reads """
+        self._count = 0
+
+    def record(self, timestamp_ns: int, invalid_values: int = 0):
+        """ called by HX711 after each successful read, with its data-ready timestamp """
+        slot = self._count % self._window
+        self._timestamps[slot] = timestamp_ns
+        self._invalid_values[slot] = invalid_values
+        self._count += 1
+
+    def timestamps(self) -> np.ndarray:
+        """ data-ready timestamps (ns) in the window, oldest first """
+        if self._count <= self._window:
+            return self._timestamps[:self._count].copy()
+        return np.roll(self._timestamps, -(self._count % self._window))
+
+    def as_dict(self) -> dict:
+        """
+        calculate the statistics over the reads in the window
+
+        Returns:
+            dict: with the keys
+                reads (int):                reads in the window
+                rate_hz (float):            effective rate of successful reads
+                interval_ns (float):        median interval between reads, the conversion period if reads keep up
+                jitter_p50_ns, jitter_p95_ns, jitter_p99_ns, jitter_max_ns (float):
+                                            percentiles of the deviation of each interval from the median interval
+                dropped (int):              estimated conversions that were not read
+                invalid_values (int):       ADC values discarded as invalid
+                Values that need at least two reads are None before then
+        """
+        reads = min(self._count, self._window)
+        invalid_values = int(self._invalid_values[:reads].sum())
+        statistics = dict(reads=reads, rate_hz=None, interval_ns=None, jitter_p50_ns=None, jitter_p95_ns=None,
+                          jitter_p99_ns=None, jitter_max_ns=None, dropped=0, invalid_values=invalid_values)
+        if reads < 2:
+            return statistics
+        timestamps = self.timestamps()
+        intervals = np.diff(timestamps)
+        interval = float(np.median(intervals))
+        jitter = np.abs(intervals - interval)
+        p50, p95, p99 = np.percentile(jitter, [50, 95, 99])
+        duration = timestamps[-1] - timestamps[0]
+        statistics.update(
+            rate_hz=(reads - 1) * 1e9 / duration if duration > 0 else None,
+            interval_ns=interval,
+            jitter_p50_ns=float(p50),
+            jitter_p95_ns=float(p95),
+            jitter_p99_ns=float(p99),
+            jitter_max_ns=float(jitter.max()),
+            dropped=int(np.maximum(np.rint(intervals / interval) - 1, 0).sum()) if interval > 0 else 0,
+        )
+        return statistics
@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""
+This file holds the vectorized measurement calculation, which filters and averages the reads of all ADCs at once.
+It is the array equivalent of ADC._calculate_measurement()
+"""
+
+import math
+import sys
+from typing import NamedTuple
+import numpy as np
+
+# sorts after any 24-bit value, so invalid reads end up behind the valid ones
+_SORT_SENTINEL = 1 << 30
+# bits of precision needed so that a round-to-odd integer square root rounds correctly to a float
+_SQRT_BIT_WIDTH = 2 * sys.float_info.mant_dig + 3
+
+
+class Measurements(NamedTuple):
+    """
+    Measurements returned from calculate_measurements(). Arrays of shape (n, m) hold one column per ADC
+
+    Attrs:
+        signed (np.ndarray):        int64 (n, m) reads converted to signed values, 0 where invalid
+        valid (np.ndarray):         bool (n, m) reads that are not 0, the min or max value, or all 1's (see ADC.convert_to_signed_value)
+        counts (np.ndarray):        int64 (m,) number of valid reads per ADC
+        medians (np.ndarray):       float64 (m,) median of valid reads, NaN without valid reads
+        deviations (np.ndarray):    float64 (n, m) absolute deviation of each read from the median, 0 where invalid
+        stdevs (np.ndarray):        float64 (m,) sample standard deviation of the deviations, 0 with less than 2 valid reads
+        kept (np.ndarray):          bool (n, m) valid reads within max_number_of_stdev_from_med standard deviations.
+                                    All valid reads if the standard deviation is 0, none if it is over max_stdev
+        means (np.ndarray):         float64 (m,) mean of kept reads, NaN if no reads were kept
+    """
+    signed: np.ndarray
+    valid: np.ndarray
+    counts: np.ndarray
+    medians: np.ndarray
+    deviations: np.ndarray
+    stdevs: np.ndarray
+    kept: np.ndarray
+    means: np.ndarray
+
+
+def calculate_measurements(raw_reads, max_stdev=100, max_number_of_stdev_from_med=2.0) -> Measurements:
+    """
+    filter and average raw reads of many ADCs in one pass, with the same result as ADC._calculate_measurement()
+        1) convert 2's complement to signed values and mask invalid values
+        2) calculate median and deviations from median
+        3) filter based on the standard deviation of the deviations from the median
+        4) calculate mean of remaining values
+
+    The standard deviation is calculated exactly from integer sums and correctly rounded, as statistics.stdev()
+    does since Python 3.11, so filtering decisions at the boundary match the reference implementation bit for bit
+
+    Args:
+        raw_reads (array_like): integer array of shape (n, m) with n raw 24-bit reads for each of m ADCs.
+            Pad ADCs with fewer reads with 0, which is an invalid value
+        max_stdev (float or array_like): Optional, by default 100
+            maximum standard deviation, per ADC or for all of them
+        max_number_of_stdev_from_med (float or array_like): Optional, by default 2.0
+            reads further than this many standard deviations from the median are filtered out
+
+    Returns:
+        Measurements: intermediate and final values for all ADCs
+
+    Raises:
+        ValueError: if raw_reads is not 2-dimensional
+    """
+
+    raw = np.asarray(raw_reads, dtype=np.int64)
+    if raw.ndim != 2:
+        raise ValueError(f'raw_reads must be a 2-dimensional array of shape (reads, ADCs).\nReceived shape: {raw.shape}')
+    columns = np.arange(raw.shape[1])
+
+    # signed values, invalid reads masked. The invalid values are exactly those whose lower 23 bits are all 0 or all 1
+    valid = ((raw + 1) & 0x7FFFFF) > 1
+    signed = np.where(valid, np.where(raw & 0x800000, raw - 0x1000000, raw), 0)
+    counts = np.count_nonzero(valid, axis=0)
+
+    # median of the valid reads of each column. Twice the median is an integer, which keeps the next step exact
+    ordered = np.sort(np.where(valid, signed, _SORT_SENTINEL), axis=0)
+    if len(ordered):
+        middle_sums = (ordered[np.maximum(counts - 1, 0) // 2, columns] + ordered[counts // 2, columns])
+    else:
+        middle_sums = np.zeros(len(columns), dtype=np.int64)
+    medians = np.where(counts > 0, middle_sums / 2, np.nan)
+
+    # deviations from median, in halves so they are integers
+    twice_deviations = np.where(valid, np.abs(2 * signed - middle_sums), 0)
+    deviations = twice_deviations / 2
+
+    # exact sample variance of the deviations: (n * sum(d^2) - sum(d)^2) / (n * (n - 1)), with d = twice_deviations / 2
+    sums = twice_deviations.sum(axis=0)
+    sums_of_squares = (twice_deviations.astype(np.uint64) ** 2).sum(axis=0, dtype=np.uint64)
+    stdevs = np.zeros(len(columns))
+    for column in columns[counts >= 2]:
+        n = int(counts[column])
+        total = int(sums[column])
+        stdevs[column] = _sqrt_of_fraction(n * int(sums_of_squares[column]) - total * total, 4 * n * (n - 1))
+
+    # filter by number of standard deviations from median. With a stdev of 0 all deviations are equal, so all reads are kept
+    ratios_to_stdev = np.divide(deviations, stdevs, out=np.zeros_like(deviations), where=stdevs > 0)
+    kept = valid & (ratios_to_stdev <= max_number_of_stdev_from_med) & (stdevs <= max_stdev)
+
+    # mean of remaining values. Sums of 24-bit integers are exact, so this is the correctly rounded mean
+    kept_counts = np.count_nonzero(kept, axis=0)
+    means = np.full(len(columns), np.nan)
+    np.divide(np.where(kept, signed, 0).sum(axis=0), kept_counts, out=means, where=kept_counts > 0)
+
+    return Measurements(signed, valid, counts, medians, deviations, stdevs, kept, means)
+
+
+def _sqrt_of_fraction(numerator: int, denominator: int) -> float:
+    """ correctly rounded square root of numerator / denominator, same method as statistics.stdev() in Python 3.11 """
+    shift = (numerator.bit_length() - denominator.bit_length() - _SQRT_BIT_WIDTH) // 2
+    if shift >= 0:
+        return float(_isqrt_round_to_odd(numerator, denominator << 2 * shift) << shift)
+    return _isqrt_round_to_odd(numerator << -2 * shift, denominator) / (1 << -shift)
+
+
+def _isqrt_round_to_odd(numerator: int, denominator: int) -> int:
+    """ integer square root of numerator / denominator, with an odd result if it was not exact """
+    root = _isqrt(numerator // denominator)
+    return root | (root * root * denominator != numerator)
+
+
+def _newton_isqrt(n: int) -> int:
+    """ integer square root of n >= 0 (the largest root with root * root <= n), by Newton's method """
+    if n == 0:
+        return 0
+    # start above the root, from where the iteration decreases monotonically to it
+    root = 1 << (n.bit_length() + 1) // 2
+    while True:
+        smaller = (root + n // root) // 2
+        if smaller >= root:
+            return root
+        root = smaller
+
+
+# math.isqrt is only available from Python 3.8
+_isqrt = getattr(math, 'isqrt', _newton_isqrt)
@@ -0,0 +1,336 @@
+#!/usr/bin/env python3
+"""
+This file holds MultiHX711 class which reads several HX711 groups, each on its own clock line, in parallel
+"""
+
+import threading
+from time import sleep, perf_counter
+from typing import List
+from .hx711 import HX711, ADC
+from .ring_buffer import SampleRingBuffer, Samples
+
+
+class _FrameAligner:
+    """
+    _FrameAligner merges the samples of several groups into frames, one row of the merged stream.
+    A frame collects at most one sample per group. It is published when every group has contributed,
+    or when a sample arrives that cannot join it (its group already contributed, or it is more than
+    `window_ns` after the first sample of the frame). Columns of groups that did not contribute are NaN.
+    The timestamp of a frame is the mean timestamp of its samples.
+
+    Args:
+        buffer (SampleRingBuffer): merged stream, the aligner is its only producer
+        slices ([slice]): columns of each group within a frame
+        window_ns (int): maximum time between the first and the last sample of a frame
+    """
+
+    def __init__(self, buffer: SampleRingBuffer, slices: List[slice], window_ns: int):
+        self._buffer = buffer
+        self._slices = slices
+        self._window_ns = window_ns
+        self._lock = threading.Lock()
+        self._values = [float('nan')] * buffer.channels
+        self._filled = [False] * len(slices)
+        self._count = 0
+        self._first_ns = 0
+        self._sum_ns = 0
+
+    def add(self, group: int, timestamp_ns: int, values: list):
+        """ add the sample of one group, publishing frames as they complete. Safe to call from several threads """
+        with self._lock:
+            if self._count and (self._filled[group] or timestamp_ns - self._first_ns > self._window_ns):
+                self._publish()
+            if not self._count:
+                self._first_ns = timestamp_ns
+            self._values[self._slices[group]] = values
+            self._filled[group] = True
+            self._count += 1
+            self._sum_ns += timestamp_ns
+            if self._count == len(self._slices):
+                self._publish()
+
+    def flush(self):
+        """ publish the incomplete frame, if any """
+        with self._lock:
+            if self._count:
+                self._publish()
+
+    def _publish(self):
+        self._buffer.push(self._sum_ns // self._count, self._values)
+        self._values = [float('nan')] * len(self._values)
+        self._filled = [False] * len(self._filled)
+        self._count = 0
+        self._sum_ns = 0
+
+
+class MultiHX711:
+    """
+    MultiHX711 coordinates several HX711 groups, each with its own sck pin, so that more ADCs can be read than
+    one clock line reliably drives, and so that a slow or unready ADC only stalls its own group.
+
+    Columns of read_raw(), read_weight() and get_samples() are the ADCs of all groups, in the order
+    of the groups and of the dout pins within each group (see `channels`).
+
+    Args:
+        groups ([HX711]): HX711 instances, each on a different sck pin
+        mode (str): Optional, by default 'interleaved'
+            Options ('interleaved' || 'threads')
+            'interleaved' reads all groups from one thread, each group as soon as all its ADCs are ready.
+                Each read is a single burst of 25-27 SCK pulses, so groups never wait for each other, and nothing
+                else can preempt the thread halfway through a pulse
+            'threads' reads each group from its own thread, like HX711.read_raw() and start_streaming() would.
+                Threads are switched at most every few ms (sys.getswitchinterval()), which can hold SCK HIGH for longer
+                than 60us and power an HX711 down. Only use it if the GPIO backend releases the GIL (e.g. GpiodBackend)
+        align_window (float): Optional, by default 0.0125 (one conversion at 80Hz)
+            maximum time in seconds between the samples of different groups merged into one row of the stream
+
+    Raises:
+        TypeError: if groups are not HX711 instances, or mode is not interleaved or threads
+        ValueError: if there are no groups, or two groups share an sck pin
+    """
+
+    # sleep between readiness checks of the interleaved loop when no group is ready
+    _idle_sleep = 0.0005
+
+    def __init__(self, groups: List[HX711], mode: str = 'interleaved', align_window: float = 0.0125):
+        if not groups:
+            raise ValueError('MultiHX711 requires at least one HX711 group')
+        if not all(isinstance(group, HX711) for group in groups):
+            raise TypeError(f'groups must be a list of HX711.\nReceived groups: {groups}')
+        sck_pins = [group._sck_pin for group in groups]
+        if len(set(sck_pins)) != len(sck_pins):
+            raise ValueError(f'each HX711 group must have its own sck pin.\nReceived sck pins: {sck_pins}')
+        if mode not in ['interleaved', 'threads']:
+            raise TypeError(f'mode must be interleaved or threads.\nReceived mode: {mode}')
+        self._groups = list(groups)
+        self._mode = mode
+        self._align_window = align_window
+        self._slices = []
+        start = 0
+        for group in self._groups:
+            self._slices.append(slice(start, start + len(group._adcs)))
+            start += len(group._adcs)
+        self._threads = []
+        self._stop = threading.Event()
+        self._stream_buffer = None
+        self._aligner = None
+
+    @property
+    def groups(self):
+        return list(self._groups)
+
+    @property
+    def mode(self):
+        return self._mode
+
+    @property
+    def channels(self):
+        """ (sck_pin, dout_pin) of each column, in column order """
+        return [(group._sck_pin, adc._dout_pin) for group in self._groups for adc in group._adcs]
+
+    def _is_due(self, group: HX711, last_read: float, now: float):
+        """ a group is due once all its ADCs are ready, or once its _ready_timeout has passed since its last read """
+        if all([adc._is_ready() for adc in group._adcs]):
+            return True
+        return now - last_read >= group._ready_timeout
+
+    def read_raw(self, readings_to_average: int = 10):
+        """
+        read raw data of the ADCs of all groups in parallel, see HX711.read_raw()
+
+        Args:
+            readings_to_average (int, optional): number of raw readings of each group to average together. Defaults to 10
+
+        Returns:
+            list of float: raw measurements of all ADCs in column order, None for failed ADCs
+
+        Raises:
+            RuntimeError: if this MultiHX711 or one of its groups is streaming, or a group is multiplexing
+        """
+        self._check_not_streaming('read_raw')
+        for group in self._groups:
+            group._check_not_streaming('read_raw')
+            group._check_not_multiplexing('read_raw')
+        if not (1 <= readings_to_average <= 10000):
+            raise ValueError(
+                f'Parameter "readings_to_average" input to read_raw() is way too high... Received: {readings_to_average}'
+            )
+        if self._mode == 'threads':
+            errors = [None] * len(self._groups)
+
+            def read(index: int):
+                try:
+                    self._groups[index].read_raw(readings_to_average)
+                except Exception as error:
+                    errors[index] = error
+
+            threads = [threading.Thread(target=read, args=(i,)) for i in range(len(self._groups))]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            # raise on the calling thread, like a failing read_raw() of a single HX711
+            for error in errors:
+                if error is not None:
+                    raise error
+        else:
+            self._read_interleaved(readings_to_average)
+        return [adc.measurement_from_zero for group in self._groups for adc in group._adcs]
+
+    def _read_interleaved(self, readings_to_average: int):
+        """ equivalent of HX711.read_raw() for every group, with the reads of all groups interleaved in one loop """
+        adc: ADC
+        for group in self._groups:
+            for adc in group._adcs:
+                adc._init_set_of_reads()
+        now = perf_counter()
+        remaining = [readings_to_average] * len(self._groups)
+        last_read = [now] * len(self._groups)
+        while any(remaining):
+            read_any = False
+            for i, group in enumerate(self._groups):
+                if remaining[i] and self._is_due(group, last_read[i], now):
+                    group._read(wait=False)
+                    remaining[i] -= 1
+                    last_read[i] = now = perf_counter()
+                    read_any = True
+            if not read_any:
+                sleep(self._idle_sleep)
+            now = perf_counter()
+        for group in self._groups:
+            group._calculate_measurements()
+
+    def read_weight(self, readings_to_average: int = 10):
+        """
+        read raw data of all groups in parallel and return with weight conversion, see HX711.read_weight()
+
+        Returns:
+            list of float: weights of all ADCs in column order
+        """
+        self.read_raw(readings_to_average)
+        return self.get_weight()
+
+    def get_weight(self):
+        """ simply returns the most recent calibrated weight values without performing any new measurements """
+        return [adc.weight for group in self._groups for adc in group._adcs]
+
+    @property
+    def weight_multiples(self):
+        """ weight multiple of each ADC in column order, see HX711.set_weight_multiples() """
+        return [weight_multiple for group in self._groups for weight_multiple in group.weight_multiples]
+
+    @property
+    def zero_offsets(self):
+        """ zero offset of each ADC in column order, see HX711.zero() """
+        return [zero_offset for group in self._groups for zero_offset in group.zero_offsets]
+
+    @property
+    def is_streaming(self):
+        return any(thread.is_alive() for thread in self._threads)
+
+    @property
+    def stream_buffer(self):
+        """ SampleRingBuffer of the merged stream of the current (or last) start_streaming(), None if it was never called """
+        return self._stream_buffer
+
+    def start_streaming(self, buffer_size: int = 4096):
+        """
+        start acquiring all groups continuously into one timestamp-aligned stream, drained with get_samples().
+        Each row holds the samples of the groups that converted within `align_window` of each other, see HX711.start_streaming()
+        for the values. While streaming, the groups cannot be read directly
+
+        Args:
+            buffer_size (int, optional): number of rows kept in the ring buffer. Defaults to 4096
+
+        Raises:
+            RuntimeError: if this MultiHX711 or one of its groups is already streaming, or a group is multiplexing
+        """
+        if self.is_streaming or any(group.is_streaming for group in self._groups):
+            raise RuntimeError('MultiHX711 or one of its groups is already streaming')
+        for group in self._groups:
+            group._check_not_multiplexing('start_streaming')
+        self._stream_buffer = SampleRingBuffer(capacity=buffer_size, channels=self._slices[-1].stop)
+        self._aligner = _FrameAligner(self._stream_buffer, self._slices, int(self._align_window * 1e9))
+        self._stop.clear()
+        if self._mode == 'threads':
+            self._threads = [threading.Thread(target=self._group_loop, args=(i,), name=f'hx711-multi-group-{i}', daemon=True)
+                             for i in range(len(self._groups))]
+            owners = self._threads
+        else:
+            self._threads = [threading.Thread(target=self._interleaved_loop, name='hx711-multi-interleaved', daemon=True)]
+            owners = self._threads * len(self._groups)
+        # groups reject direct reads while their thread is set
+        for group, thread in zip(self._groups, owners):
+            group._stream_thread = thread
+        for thread in self._threads:
+            thread.start()
+
+    def stop_streaming(self, timeout: float = 1.0):
+        """
+        stop acquiring. Rows already in the ring buffer remain available through get_samples()
+
+        Args:
+            timeout (float, optional): seconds to wait for each thread to finish its current read. Defaults to 1.0
+        """
+        if not self._threads:
+            return
+        self._stop.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        if self.is_streaming:
+            self._groups[0]._logger.warning('acquisition threads did not stop within %s seconds', timeout)
+            return
+        # a group streaming on its own keeps its thread
+        for group in self._groups:
+            if group._stream_thread in self._threads:
+                group._stream_thread = None
+        self._threads = []
+        if self._aligner is not None:
+            self._aligner.flush()
+
+    def get_samples(self, since: int = 0) -> Samples:
+        """
+        copy out rows of the merged stream without blocking the acquisition, see HX711.get_samples()
+
+        Raises:
+            RuntimeError: if start_streaming() has never been called
+        """
+        if self._stream_buffer is None:
+            raise RuntimeError('get_samples() requires start_streaming() to be called first')
+        return self._stream_buffer.get_samples(since)
+
+    def _interleaved_loop(self):
+        """ body of the 'interleaved' acquisition thread: read whichever group is due """
+        values = [[float('nan')] * len(group._adcs) for group in self._groups]
+        last_read = [perf_counter()] * len(self._groups)
+        try:
+            while not self._stop.is_set():
+                read_any = False
+                now = perf_counter()
+                for i, group in enumerate(self._groups):
+                    if self._is_due(group, last_read[i], now):
+                        timestamp = group._read_sample(values[i], wait=False)
+                        if timestamp is not None:
+                            self._aligner.add(i, timestamp, values[i])
+                        last_read[i] = now = perf_counter()
+                        read_any = True
+                if not read_any:
+                    sleep(self._idle_sleep)
+        except Exception:
+            self._groups[0]._logger.exception('acquisition thread stopped due to an error')
+
+    def _group_loop(self, index: int):
+        """ body of the acquisition thread of one group in 'threads' mode """
+        group = self._groups[index]
+        values = [float('nan')] * len(group._adcs)
+        try:
+            while not self._stop.is_set():
+                timestamp = group._read_sample(values)
+                if timestamp is not None:
+                    self._aligner.add(index, timestamp, values)
+        except Exception:
+            group._logger.exception('acquisition thread stopped due to an error')
+
+    def _check_not_streaming(self, caller: str):
+        if self.is_streaming:
+            raise RuntimeError(f'{caller}() cannot be used while streaming. Call stop_streaming() first')
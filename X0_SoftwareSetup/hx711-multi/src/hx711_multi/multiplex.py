@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+This file holds ChannelSchedule class which alternates the input (channel and gain) of HX711 conversions on a fixed pattern
+"""
+
+from typing import List, Tuple
+
+# SCK pulses after the 24 data bits that select the input of the next conversion
+GAIN_PULSES = {('A', 128): 1, ('B', 32): 2, ('A', 64): 3}
+
+
+class ChannelSchedule:
+    """
+    ChannelSchedule is a repeating pattern of HX711 inputs, used by HX711.set_multiplexing().
+    The extra SCK pulses at the end of every read select the input of the next conversion, so switching input costs no
+    power down and no sleep. Only the output settling after the switch remains: the first `settling_conversions`
+    conversions after each switch are marked invalid, every other conversion is valid.
+
+    The schedule holds one slot per conversion of a cycle of the pattern. The HX711 reads the conversion of the current
+    slot, then calls advance() while writing the gain pulses, which moves to the next slot and returns the pulses that
+    select its input.
+
+    Example: [('A', 128, 8), ('B', 32, 2)] with settling_conversions=3 gives a cycle of 16 conversions,
+    3 settling + 8 valid on channel A, then 3 settling + 2 valid on channel B
+
+    Args:
+        pattern ([(str, int, int)]): (channel, gain, conversions) of each block of the pattern, where conversions is
+            the number of valid conversions of the block. Inputs are ('A', 128), ('A', 64) and ('B', 32)
+        settling_conversions (int): Optional, by default 3
+            conversions discarded after each switch. The documentation specifies 4 conversions of settling
+            time, counted from the switch: the 4th conversion after it is the first stable one
+
+    Raises:
+        TypeError: if a block is not (channel, gain, conversions) of a supported input
+        ValueError: if the pattern is empty, or conversions or settling_conversions are out of range
+    """
+
+    def __init__(self, pattern: List[Tuple[str, int, int]], settling_conversions: int = 3):
+        if not pattern:
+            raise ValueError('pattern must have at least one (channel, gain, conversions) block')
+        if settling_conversions < 0:
+            raise ValueError(f'settling_conversions must be 0 or more.\nReceived settling_conversions: {settling_conversions}')
+        self._inputs = []
+        blocks = []
+        for block in pattern:
+            try:
+                channel, gain, conversions = block
+            except (TypeError, ValueError):
+                raise TypeError(f'each block of pattern must be (channel, gain, conversions).\nReceived block: {block}')
+            if (channel, gain) not in GAIN_PULSES:
+                raise TypeError(f'channel and gain must be A/128, A/64 or B/32.\nReceived block: {block}')
+            if conversions < 1:
+                raise ValueError(f'each block must have at least 1 conversion.\nReceived block: {block}')
+            if (channel, gain) not in self._inputs:
+                self._inputs.append((channel, gain))
+            blocks.append((self._inputs.index((channel, gain)), conversions))
+
+        # (input index, valid) of each conversion of a cycle. Blocks that follow a block of the same input need no settling
+        self._slots = []
+        for i, (input_index, conversions) in enumerate(blocks):
+            settling = settling_conversions if blocks[i - 1][0] != input_index else 0
+            self._slots += [(input_index, False)] * settling + [(input_index, True)] * conversions
+        self._pulses = [GAIN_PULSES[input_] for input_ in self._inputs]
+        # the first valid conversion, where the pattern starts after the lead-in of restart()
+        self._start = next(i for i, (_, valid) in enumerate(self._slots) if valid)
+        self._settling_conversions = settling_conversions
+        self.restart()
+
+    @property
+    def inputs(self):
+        """ distinct (channel, gain) inputs of the pattern, in order of their first block """
+        return list(self._inputs)
+
+    @property
+    def cycle_length(self):
+        """ conversions in one cycle of the pattern, including settling conversions """
+        return len(self._slots)
+
+    @property
+    def valid_fraction(self):
+        """ fraction of the conversions that are valid, i.e. the combined rate relative to the conversion rate """
+        return sum(valid for _, valid in self._slots) / len(self._slots)
+
+    def restart(self):
+        """
+        forget which input the HX711 converts, e.g. after it powered down and reset itself to A/128.
+        The next conversion is discarded, and the first input of the pattern settles before the pattern starts
+        """
+        self._position = None
+        self._lead_in = 0
+
+    @property
+    def current(self):
+        """ (input index, valid) of the conversion the HX711 reads next. The input index is None if it is unknown """
+        if self._position is None:
+            return None, False
+        if self._lead_in:
+            return self._slots[self._position][0], False
+        return self._slots[self._position]
+
+    def advance(self) -> int:
+        """
+        move to the next conversion, called by HX711 after reading the current one
+
+        Returns:
+            int: number of gain pulses (1, 2 or 3) that select the input of the next conversion
+        """
+        if self._position is None:
+            # the HX711 may be converting any input, so switch to the first input and let it settle
+            self._position = self._start
+            self._lead_in = self._settling_conversions
+        elif self._lead_in:
+            self._lead_in -= 1
+        else:
+            self._position = (self._position + 1) % len(self._slots)
+        return self._pulses[self._slots[self._position][0]]
@@ -0,0 +1,208 @@
+#!/usr/bin/env python3
+"""
+This file holds the outlier filters of an ADC: streaming strategies that decide, read by read, whether a read is kept,
+replaced or dropped, instead of discarding a whole set of reads whose spread is too large
+"""
+
+from .filters import SortedWindow
+
+# scales the median absolute deviation to the standard deviation of normally distributed reads
+_MAD_TO_STDEV = 1.4826
+
+
+class OutlierFilter:
+    """
+    OutlierFilter is the base class of the outlier filters set with HX711.set_outlier_filter() or ADC.set_outlier_filter().
+    Each ADC has its own instance, which receives every valid read of that ADC in order and keeps its state across
+    read_raw() calls, streaming and read_filtered()
+
+    Attrs:
+        kept (int):     reads returned unchanged
+        replaced (int): reads returned as a different value (clipped or replaced by the median)
+        dropped (int):  reads discarded
+    """
+
+    __slots__ = ('kept', 'replaced', 'dropped')
+
+    def __init__(self):
+        self.kept = 0
+        self.replaced = 0
+        self.dropped = 0
+
+    def update(self, read):
+        """
+        filter the next read
+
+        Args:
+            read (int): signed value of a valid read
+
+        Returns:
+            int or float: value to use instead of read, or None to discard it
+        """
+        raise NotImplementedError
+
+    def reset(self):
+        """ forget all previous reads, the counters are kept """
+
+    def _count(self, read, value):
+        if value is None:
+            self.dropped += 1
+        elif value == read:
+            self.kept += 1
+        else:
+            self.replaced += 1
+        return value
+
+
+class HampelFilter(OutlierFilter):
+    """
+    HampelFilter replaces a read by the median of the last `window` reads if it is more than `threshold` robust standard
+    deviations (1.4826 times the median absolute deviation) from that median. Spikes are removed without losing samples,
+    while steps (a person stepping on the plate) pass once they fill half of the window. O(log N) per read
+
+    Args:
+        window (int): Optional, by default 15
+            number of reads, including the current one, that the median and the deviation are taken over
+        threshold (float): Optional, by default 3.0
+            number of robust standard deviations beyond which a read is an outlier
+        min_deviation (float): Optional, by default 1.0
+            lower bound of the robust standard deviation in counts, so that a window of identical reads
+            does not turn every 1-count change into an outlier
+
+    Raises:
+        ValueError: if window is less than 3, or threshold or min_deviation are negative
+    """
+
+    __slots__ = ('_window', '_threshold', '_min_deviation')
+
+    def __init__(self, window: int = 15, threshold: float = 3.0, min_deviation: float = 1.0):
+        super().__init__()
+        if window < 3:
+            raise ValueError(f'window must be at least 3.\nReceived window: {window}')
+        if threshold < 0 or min_deviation < 0:
+            raise ValueError(f'threshold and min_deviation must not be negative.\n'
+                             f'Received threshold: {threshold}, min_deviation: {min_deviation}')
+        self._window = SortedWindow(window)
+        self._threshold = threshold
+        self._min_deviation = min_deviation
+
+    def _limit(self):
+        """ median of the window and the largest deviation from it that is not an outlier """
+        deviation = max(_MAD_TO_STDEV * self._window.median_absolute_deviation, self._min_deviation)
+        return self._window.median, self._threshold * deviation
+
+    def update(self, read):
+        self._window.push(read)
+        if len(self._window) < 3:
+            return self._count(read, read)
+        median, limit = self._limit()
+        return self._count(read, median if abs(read - median) > limit else read)
+
+    def reset(self):
+        self._window.clear()
+
+
+class MADClipping(HampelFilter):
+    """
+    MADClipping limits each read to `threshold` robust standard deviations around the median of the last `window`
+    reads, see HampelFilter. Unlike the Hampel filter an outlier keeps its direction, so a fast change shows up
+    immediately, at a limited size. O(log N) per read
+
+    Args:
+        window (int): Optional, by default 15
+        threshold (float): Optional, by default 3.0
+        min_deviation (float): Optional, by default 1.0
+
+    Raises:
+        ValueError: if window is less than 3, or threshold or min_deviation are negative
+    """
+
+    __slots__ = ()
+
+    def update(self, read):
+        self._window.push(read)
+        if len(self._window) < 3:
+            return self._count(read, read)
+        median, limit = self._limit()
+        return self._count(read, min(max(read, median - limit), median + limit))
+
+
+class RateLimiter(OutlierFilter):
+    """
+    RateLimiter limits the change from one output to the next to `max_step` counts, so a spike moves the output by
+    at most max_step and a real change is followed at max_step per read. O(1) per read
+
+    Args:
+        max_step (float): largest change between consecutive outputs, in counts
+
+    Raises:
+        ValueError: if max_step is not positive
+    """
+
+    __slots__ = ('_max_step', '_previous')
+
+    def __init__(self, max_step: float):
+        super().__init__()
+        if not max_step > 0:
+            raise ValueError(f'max_step must be positive.\nReceived max_step: {max_step}')
+        self._max_step = max_step
+        self._previous = None
+
+    def update(self, read):
+        value = read
+        if self._previous is not None:
+            value = min(max(read, self._previous - self._max_step), self._previous + self._max_step)
+        self._previous = value
+        return self._count(read, value)
+
+    def reset(self):
+        self._previous = None
+
+
+class StdevRejection(OutlierFilter):
+    """
+    StdevRejection applies the rule of the default filtering of read_raw() (see ADC._calculate_measurement) to a moving
+    window instead of a set of reads: a read is dropped if it is more than max_number_of_stdev_from_med standard
+    deviations from the median of the last `window` reads, or if that standard deviation is over max_stdev.
+    Only the reads of a noisy stretch are dropped, not everything read with them. O(log N) per read
+
+    Args:
+        window (int): Optional, by default 10
+        max_stdev (float): Optional, by default 100
+            maximum standard deviation of the deviations from the median
+        max_number_of_stdev_from_med (float): Optional, by default 2.0
+
+    Raises:
+        ValueError: if window is less than 2
+    """
+
+    __slots__ = ('_window', '_max_stdev', '_max_number_of_stdev_from_med')
+
+    def __init__(self, window: int = 10, max_stdev: float = 100, max_number_of_stdev_from_med: float = 2.0):
+        super().__init__()
+        if window < 2:
+            raise ValueError(f'window must be at least 2.\nReceived window: {window}')
+        self._window = SortedWindow(window)
+        self._max_stdev = max_stdev
+        self._max_number_of_stdev_from_med = max_number_of_stdev_from_med
+
+    def update(self, read):
+        self._window.push(read)
+        stdev = self._window.deviation_stdev
+        if stdev is None or stdev == 0:
+            return self._count(read, read)
+        if stdev > self._max_stdev or abs(read - self._window.median) / stdev > self._max_number_of_stdev_from_med:
+            return self._count(read, None)
+        return self._count(read, read)
+
+    def reset(self):
+        self._window.clear()
+
+
+# strategies accepted by name in HX711.set_outlier_filter()
+OUTLIER_FILTERS = {
+    'hampel': HampelFilter,
+    'mad': MADClipping,
+    'rate': RateLimiter,
+    'stdev': StdevRejection,
+}
@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+"""
+This file holds SampleRingBuffer class which stores timestamped samples from a streaming HX711
+"""
+
+from typing import NamedTuple
+import numpy as np
+
+
+class Samples(NamedTuple):
+    """
+    Samples returned from SampleRingBuffer.get_samples()
+
+    Attrs:
+        timestamps (np.ndarray):    int64 array of shape (n,) with monotonic timestamps in nanoseconds
+        values (np.ndarray):        float64 array of shape (n, channels). Invalid reads are NaN
+        next_index (int):           index to pass as `since` on the next call to only receive newer samples
+        dropped (int):              number of requested samples that were overwritten before they could be read
+    """
+    timestamps: np.ndarray
+    values: np.ndarray
+    next_index: int
+    dropped: int
+
+
+class SampleRingBuffer:
+    """
+    SampleRingBuffer is a preallocated, fixed-size ring buffer of timestamped samples.
+    It is written by a single producer (the acquisition thread) and read by any number of consumers.
+
+    The producer never waits for consumers: it writes a sample into the next slot and then publishes it
+    by incrementing the write index. Consumers keep their own cursor (the `next_index` of the previous
+    call) and copy out whatever has been published since. The slot the producer may currently be writing
+    is never handed out, so at most `capacity - 1` samples can be read back. If a consumer falls further
+    behind than that, the oldest samples are overwritten and reported as `dropped`.
+
+    Consumers that wait for samples instead of polling (e.g. AsyncHX711) register a listener, which the producer
+    calls after publishing each sample.
+
+    Args:
+        capacity (int): number of samples the buffer can hold before overwriting the oldest sample
+        channels (int): number of values stored per sample (e.g. one per ADC)
+
+    Raises:
+        ValueError: if capacity is less than 2 or channels is less than 1
+    """
+
+    def __init__(self, capacity: int, channels: int):
+        if capacity < 2 or channels < 1:
+            raise ValueError(
+                f'capacity must be at least 2 and channels at least 1.\nReceived capacity: {capacity}, channels: {channels}')
+        self._capacity = capacity
+        self._channels = channels
+        self._timestamps = np.zeros(capacity, dtype=np.int64)
+        self._values = np.full((capacity, channels), np.nan, dtype=np.float64)
+        # total number of samples ever written. Only ever assigned by the producer
+        self._write_index = 0
+        # replaced rather than modified, so the producer can iterate it while listeners are added or removed
+        self._listeners = ()
+
+    @property
+    def capacity(self):
+        return self._capacity
+
+    @property
+    def channels(self):
+        return self._channels
+
+    @property
+    def write_index(self):
+        """ index that the next written sample will receive (i.e. total number of samples written so far) """
+        return self._write_index
+
+    def add_listener(self, listener):
+        """
+        call listener(write_index) from the producer thread after each sample is published.
+        Listeners run on the acquisition thread, so they must return quickly and must not raise
+
+        Args:
+            listener (callable): receives the write index after the new sample
+        """
+        self._listeners = self._listeners + (listener,)
+
+    def remove_listener(self, listener):
+        """ stop calling a listener added with add_listener() """
+        self._listeners = tuple(existing for existing in self._listeners if existing is not listener)
+
+    def clear(self):
+        """ discard all samples. Must not be called while a producer is writing """
+        self._values.fill(np.nan)
+        self._timestamps.fill(0)
+        self._write_index = 0
+
+    def push(self, timestamp_ns: int, values):
+        """
+        write one sample into the buffer, overwriting the oldest sample if the buffer is full
+
+        Args:
+            timestamp_ns (int): monotonic timestamp of the sample in nanoseconds
+            values (sequence of float): one value per channel, use NaN for invalid values
+        """
+        index = self._write_index
+        slot = index % self._capacity
+        self._timestamps[slot] = timestamp_ns
+        self._values[slot] = values
+        # publish the sample only after it has been fully written
+        self._write_index = index + 1
+        for listener in self._listeners:
+            listener(index + 1)
+
+    def get_samples(self, since: int = 0) -> Samples:
+        """
+        copy out all samples written at or after index `since`, without blocking the producer
+
+        Args:
+            since (int, optional): index of the first sample to return, typically `next_index` from the previous call.
+                Defaults to 0, which returns everything still held in the buffer
+
+        Returns:
+            Samples: copies of the timestamps and values, plus the cursor for the next call
+        """
+        end = self._write_index
+        # the slot after `end` may be being written right now, so it is not readable
+        start = max(since, end - self._capacity + 1, 0)
+        dropped = start - since if since < start else 0
+        count = end - start
+        if count <= 0:
+            return Samples(np.empty(0, dtype=np.int64),
+                           np.empty((0, self._channels), dtype=np.float64),
+                           max(since, end), 0)
+
+        timestamps = np.empty(count, dtype=np.int64)
+        values = np.empty((count, self._channels), dtype=np.float64)
+        first_slot = start % self._capacity
+        first_count = min(count, self._capacity - first_slot)
+        timestamps[:first_count] = self._timestamps[first_slot:first_slot + first_count]
+        values[:first_count] = self._values[first_slot:first_slot + first_count]
+        if first_count < count:
+            timestamps[first_count:] = self._timestamps[:count - first_count]
+            values[first_count:] = self._values[:count - first_count]
+
+        # the producer may have lapped us while copying. Discard any slots that were (or are being) overwritten
+        overwritten = self._write_index + 1 - self._capacity - start
+        if overwritten > 0:
+            overwritten = min(overwritten, count)
+            timestamps = timestamps[overwritten:]
+            values = values[overwritten:]
+            dropped += overwritten
+
+        return Samples(timestamps, values, end, dropped)
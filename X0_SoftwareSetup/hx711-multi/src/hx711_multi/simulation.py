@@ -0,0 +1,249 @@
+#!/usr/bin/env python3
+"""
+This file holds a pure-Python simulation of HX711 chips, so the driver can be tested and benchmarked without a Raspberry Pi
+"""
+
+import math
+import random
+from time import perf_counter, sleep, monotonic_ns
+from typing import List
+from .backends import GPIOBackend
+
+
+class SimulatedHX711:
+    """
+    SimulatedHX711 models a single HX711 chip as seen from its SCK and DOUT pins
+
+    Modelled behaviour (see docs/hx711.pdf):
+        - conversions complete on a fixed grid at sample_rate, DOUT goes LOW when data is ready
+        - each SCK rising edge shifts out the next of 24 bits (2's complement, MSB first)
+        - 25, 26 or 27 pulses select channel A/128, channel B/32 or channel A/64 for the next conversion
+        - after a switch of channel or gain the output settles over 4 conversions: the k-th conversion
+          after the switch is k/4 of the way from the previous input to the new one
+        - holding SCK HIGH for 60us or more powers the chip down. Pulling SCK LOW again resets it to
+          channel A/128 and the first conversion is only ready after the settling time (4 conversions)
+
+    Args:
+        sck_pin (int): pin number of the clock line the chip is attached to
+        dout_pin (int): pin number of the data line of the chip
+        value (float or callable): Optional, by default 0
+            channel A input in ADC counts at gain 128. A callable receives the seconds since the chip was
+            created and returns the counts, which allows simulating loads that change over time
+        channel_B_value (float or callable): Optional, by default 0
+            channel B input in ADC counts at gain 32
+        sample_rate (float): Optional, by default 80
+            conversions per second (10 or 80 on real hardware, depending on the RATE pin).
+            None makes data ready immediately, which measures the speed of the driver alone
+        noise_stdev (float): Optional, by default 0
+            standard deviation of gaussian noise (in counts) added to every conversion
+        seed (int): Optional, seed for the noise generator
+    """
+
+    _POWER_DOWN_TIME = 60e-6
+    _SETTLING_CONVERSIONS = 4
+
+    def __init__(
+        self,
+        sck_pin: int,
+        dout_pin: int,
+        value=0,
+        channel_B_value=0,
+        sample_rate: float = 80.,
+        noise_stdev: float = 0.,
+        seed: int = None,
+    ):
+        self.sck_pin = sck_pin
+        self.dout_pin = dout_pin
+        self.value = value
+        self.channel_B_value = channel_B_value
+        self.sample_rate = sample_rate
+        self.noise_stdev = noise_stdev
+        self._random = random.Random(seed)
+        self._created = perf_counter()
+        self._sck = False
+        self._sck_rise_time = 0.
+        self._powered = True
+        self._pulses = 0
+        self._gain_pulses = 1  # 1: A/128, 2: B/32, 3: A/64
+        self._data = 0
+        self._last_counts = 0
+        self.conversions_read = 0
+        self._power_up(self._created)
+
+    @property
+    def _period(self):
+        return 1. / self.sample_rate if self.sample_rate else 0.
+
+    def _power_up(self, now: float):
+        self._powered = True
+        self._pulses = 0
+        self._gain_pulses = 1
+        self._epoch = now
+        self._ready_at = now + self._SETTLING_CONVERSIONS * self._period
+        # the power up settling is covered by _ready_at, there is no switch to settle from
+        self._switched_at = -math.inf
+        self._settle_from = 0
+
+    def _next_conversion_after(self, now: float):
+        """ time of the next conversion on the chip's conversion grid """
+        if not self.sample_rate:
+            return now
+        return self._epoch + (math.floor((now - self._epoch) / self._period) + 1) * self._period
+
+    def _input_counts(self, now: float):
+        if self._gain_pulses == 2:
+            source = self.channel_B_value
+            scale = 1.
+        else:
+            source = self.value
+            scale = 1. if self._gain_pulses == 1 else 0.5
+        counts = source(now - self._created) if callable(source) else source
+        counts = counts * scale
+        if self.noise_stdev:
+            counts += self._random.gauss(0., self.noise_stdev)
+        since_switch = now - self._switched_at
+        if self.sample_rate and since_switch < (self._SETTLING_CONVERSIONS - 1) * self._period:
+            # k-th conversion since the last switch of input
+            k = math.floor(since_switch / self._period) + 1
+            counts = self._settle_from + (counts - self._settle_from) * k / self._SETTLING_CONVERSIONS
+        self._last_counts = min(max(int(round(counts)), -0x800000), 0x7FFFFF)
+        return self._last_counts
+
+    def set_sck(self, level: bool, now: float):
+        """ called by the backend when the SCK pin changes """
+        level = bool(level)
+        if level and not self._sck:
+            self._sck_rise_time = now
+            if self._powered:
+                if self._pulses == 0:
+                    # pulses are ignored until a conversion is ready
+                    if now >= self._ready_at:
+                        self._data = self._input_counts(now) & 0xFFFFFF
+                        self._pulses = 1
+                elif self._pulses < 27:
+                    self._pulses += 1
+                    if self._pulses == 25:
+                        self.conversions_read += 1
+                        self._ready_at = self._next_conversion_after(now)
+        elif not level and self._sck:
+            if now - self._sck_rise_time >= self._POWER_DOWN_TIME:
+                # SCK was held high long enough to power down, pulling it low powers up and resets the chip
+                self._power_up(now)
+        self._sck = level
+
+    def ready_time(self) -> float:
+        """ time at which DOUT will go LOW if SCK is left alone, or inf if it will not """
+        if not self._powered or self._sck or 0 < self._pulses < 25:
+            return math.inf
+        return self._ready_at
+
+    def dout(self, now: float) -> int:
+        """ level of the DOUT pin at time now """
+        if not self._powered or self._sck and now - self._sck_rise_time >= self._POWER_DOWN_TIME:
+            return 1
+        if self._pulses >= 25:
+            if now < self._ready_at:
+                return 1
+            # the extra pulses of the previous read select the gain for this conversion
+            if self._pulses - 24 != self._gain_pulses:
+                self._switched_at = self._ready_at
+                self._settle_from = self._last_counts
+            self._gain_pulses = self._pulses - 24
+            self._pulses = 0
+        if self._pulses == 0:
+            return 0 if now >= self._ready_at else 1
+        return (self._data >> (24 - self._pulses)) & 1
+
+
+class SimulatedGPIOBackend(GPIOBackend):
+    """
+    SimulatedGPIOBackend connects HX711 to SimulatedHX711 chips instead of real GPIO pins.
+    Chips may share a clock pin or use separate ones. A dout pin without a chip reads HIGH (never ready)
+
+    Args:
+        devices (list of SimulatedHX711): simulated chips attached to the backend
+        bulk_read (bool): Optional, by default True
+            whether to offer read_levels(), which lets HX711 sample all dout pins with one call per clock pulse
+    """
+
+    def __init__(self, devices: List[SimulatedHX711] = (), bulk_read: bool = True):
+        self.supports_bulk_read = bulk_read
+        self._devices = []
+        self._by_sck = {}
+        self._by_dout = {}
+        self.outputs = set()
+        self.inputs = set()
+        for device in devices:
+            self.add_device(device)
+
+    @classmethod
+    def for_pins(cls, sck_pin: int, dout_pins: List[int], values=0, **kwargs):
+        """
+        create a backend with one SimulatedHX711 per dout pin, all on the same clock pin
+
+        Args:
+            sck_pin (int): clock pin shared by all chips
+            dout_pins (list of int): one chip is created per dout pin
+            values (float, callable or list of those): Optional, channel A input of each chip. A single value is used for all chips
+            **kwargs: bulk_read is passed to the backend, everything else to every SimulatedHX711 (e.g. sample_rate, noise_stdev)
+        """
+        if not isinstance(values, (list, tuple)):
+            values = [values] * len(dout_pins)
+        seed = kwargs.pop('seed', None)
+        bulk_read = kwargs.pop('bulk_read', True)
+        return cls([
+            SimulatedHX711(sck_pin, dout_pin, value=value,
+                           seed=None if seed is None else seed + i, **kwargs)
+            for i, (dout_pin, value) in enumerate(zip(dout_pins, values))
+        ], bulk_read=bulk_read)
+
+    @property
+    def devices(self):
+        return list(self._devices)
+
+    def add_device(self, device: SimulatedHX711):
+        if device.dout_pin in self._by_dout:
+            raise ValueError(f'dout pin {device.dout_pin} already has a simulated HX711 attached')
+        self._devices.append(device)
+        self._by_sck.setdefault(device.sck_pin, []).append(device)
+        self._by_dout[device.dout_pin] = device
+
+    def setup_output(self, pin: int):
+        self.outputs.add(pin)
+
+    def setup_input(self, pin: int):
+        self.inputs.add(pin)
+
+    def output(self, pin: int, value: bool):
+        now = perf_counter()
+        for device in self._by_sck.get(pin, ()):
+            device.set_sck(value, now)
+
+    def input(self, pin: int) -> int:
+        device = self._by_dout.get(pin)
+        if device is None:
+            return 1
+        return device.dout(perf_counter())
+
+    def read_levels(self) -> int:
+        now = perf_counter()
+        levels = 0
+        for pin in self.inputs:
+            device = self._by_dout.get(pin)
+            if device is None or device.dout(now):
+                levels |= 1 << pin
+        return levels
+
+    def wait_for_low(self, pins, timeout: float) -> bool:
+        # the simulated chips know when they will be ready, so sleep exactly until then
+        now = perf_counter()
+        ready_times = [self._by_dout[pin].ready_time() if pin in self._by_dout else math.inf for pin in pins]
+        wait = max(ready_times, default=now) - now
+        self.last_falling_edge_ns = None
+        if wait > timeout:
+            sleep(timeout)
+        elif wait > 0:
+            sleep(wait)
+            # report the exact time the chip got ready, like an edge timestamped by the kernel
+            self.last_falling_edge_ns = monotonic_ns() - round((perf_counter() - now - wait) * 1e9)
+        return not any(self.input(pin) for pin in pins)
@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+# https://docs.python.org/3/library/unittest.html
+
+import asyncio
+import time
+import unittest
+from hx711_multi import AsyncHX711, HX711, MultiHX711, SimulatedGPIOBackend
+from simulation_tests import widen_power_down_time
+
+
+class TestAsyncHX711(unittest.TestCase):
+
+    def setUp(self):
+        widen_power_down_time(self)
+        backend = SimulatedGPIOBackend.for_pins(1, [2, 3], values=[5000, -2000], sample_rate=80., noise_stdev=20, seed=0)
+        self.hx711 = HX711([2, 3], 1, log_level='CRITICAL', gpio_backend=backend)
+        self.hx711.set_weight_multiples([10., -20.])
+
+    def test_consumers_share_the_same_conversions(self):
+        async def main():
+            async with AsyncHX711(self.hx711) as sensor:
+                batches = []
+
+                async def collect():
+                    async for samples in sensor.samples():
+                        batches.append(samples)
+                        if sum(len(batch.timestamps) for batch in batches) >= 5:
+                            return
+
+                results = await asyncio.gather(sensor.read_raw(5), sensor.read_raw(5), sensor.read_weight(5), collect())
+                return results, batches, sensor.hx711.stream_buffer.write_index
+
+        (raw_1, raw_2, weights, _), batches, written = asyncio.run(main())
+        # noisy reads, so equal means prove the coroutines averaged the same conversions
+        self.assertEqual(raw_1, raw_2)
+        self.assertAlmostEqual(raw_1[0], 5000, delta=30)
+        self.assertAlmostEqual(weights[0], raw_1[0] / 10.)
+        self.assertAlmostEqual(weights[1], raw_1[1] / -20.)
+        self.assertGreaterEqual(sum(len(batch.timestamps) for batch in batches), 5)
+        # no coroutine read on its own: the stream only holds about the 5 conversions they waited for
+        self.assertLess(written, 12)
+        self.assertFalse(self.hx711.is_streaming)
+
+    def test_does_not_block_the_event_loop(self):
+        async def main():
+            async with AsyncHX711(self.hx711) as sensor:
+                gaps = []
+
+                async def ticker():
+                    last = time.perf_counter()
+                    while True:
+                        await asyncio.sleep(0.005)
+                        now = time.perf_counter()
+                        gaps.append(now - last)
+                        last = now
+
+                task = asyncio.ensure_future(ticker())
+                await sensor.read_weight(readings_to_average=10)
+                task.cancel()
+                return gaps
+
+        gaps = asyncio.run(main())
+        # reading 10 conversions at 80Hz takes 125ms, while the ticker keeps running
+        self.assertGreater(len(gaps), 10)
+        self.assertLess(max(gaps), 0.05)
+
+    def test_stop_ends_waiting_consumers(self):
+        async def main():
+            sensor = AsyncHX711(self.hx711)
+            with self.assertRaises(RuntimeError):
+                await sensor.read_raw(1)
+            await sensor.start()
+            read = asyncio.ensure_future(sensor.read_raw(10000))
+            iterated = []
+
+            async def iterate():
+                async for samples in sensor.samples():
+                    iterated.append(len(samples.timestamps))
+
+            iteration = asyncio.ensure_future(iterate())
+            await asyncio.sleep(0.1)
+            await sensor.stop()
+            with self.assertRaises(RuntimeError):
+                await read
+            await iteration
+            return iterated
+
+        self.assertTrue(asyncio.run(main()))
+        self.assertFalse(self.hx711.is_streaming)
+
+    def test_multi_hx711(self):
+        backend = SimulatedGPIOBackend.for_pins(4, [5], values=7000, sample_rate=80.)
+        multi = MultiHX711([self.hx711, HX711([5], 4, log_level='CRITICAL', gpio_backend=backend)])
+
+        async def main():
+            async with AsyncHX711(multi) as sensor:
+                return await sensor.read_raw(3)
+
+        values = asyncio.run(main())
+        self.assertEqual(len(values), 3)
+        self.assertEqual(values[2], 7000)
+
+    def test_rejects_other_sensors(self):
+        self.assertRaises(TypeError, AsyncHX711, object())
+
+    def test_rejects_multiplexing(self):
+        self.hx711.set_multiplexing([('A', 128, 2), ('B', 32, 2)])
+        self.assertRaises(RuntimeError, asyncio.run, AsyncHX711(self.hx711).start())
+        self.assertFalse(self.hx711.is_streaming)
+
+
+if __name__ == '__main__':
+    unittest.main()
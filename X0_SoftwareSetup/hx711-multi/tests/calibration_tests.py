@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+# https://docs.python.org/3/library/unittest.html
+
+import json
+import os
+import tempfile
+import unittest
+from hx711_multi import HX711, SimulatedGPIOBackend
+from simulation_tests import widen_power_down_time
+
+
+def make_hx711(values, sck_pin=1, noise_stdev=0., **kwargs):
+    dout_pins = [2, 3]
+    backend = SimulatedGPIOBackend.for_pins(sck_pin, dout_pins, values=values, sample_rate=None,
+                                            noise_stdev=noise_stdev, seed=0)
+    return HX711(dout_pins, sck_pin, log_level='CRITICAL', all_or_nothing=False, gpio_backend=backend, **kwargs)
+
+
+class TestZero(unittest.TestCase):
+
+    def setUp(self):
+        widen_power_down_time(self)
+
+    def test_zero_uses_all_readings_without_tolerance(self):
+        hx711 = make_hx711([1000, -2000])
+        self.assertEqual(hx711.zero(readings_to_average=25), 25)
+        self.assertEqual(hx711.zero_offsets, [1000, -2000])
+        # zeroing again measures the absolute offset, not the remainder after the previous zero
+        hx711.zero(readings_to_average=5)
+        self.assertEqual([adc._zero_offset for adc in hx711._adcs], [1000, -2000])
+        self.assertEqual(hx711.read_raw(readings_to_average=3), [0, 0])
+
+    def test_zero_converges_early_within_tolerance(self):
+        hx711 = make_hx711([1000, -2000], noise_stdev=10.)
+        reads = hx711.zero(readings_to_average=1000, tolerance=2., min_readings=10)
+        # the standard error of the median of n reads with a stdev of 10 is about 12.5 / sqrt(n)
+        self.assertLess(reads, 200)
+        self.assertAlmostEqual(hx711._adcs[0]._zero_offset, 1000, delta=8)
+        self.assertAlmostEqual(hx711._adcs[1]._zero_offset, -2000, delta=8)
+
+    def test_zero_fails_for_an_adc_without_valid_reads(self):
+        # a value of exactly zero is invalid
+        hx711 = make_hx711([1000, 0])
+        self.assertRaises(RuntimeError, hx711.zero, 10, 5)
+
+
+class TestCalibrationFile(unittest.TestCase):
+
+    def setUp(self):
+        widen_power_down_time(self)
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'calibration.json')
+
+    def test_saved_calibration_is_restored(self):
+        hx711 = make_hx711([1000, -2000])
+        hx711.zero(readings_to_average=5)
+        hx711.set_weight_multiples([50., -25.])
+        hx711.save_calibration(self.path)
+
+        restarted = make_hx711([1500, -2500])
+        self.assertTrue(restarted.load_calibration(self.path, max_age=60))
+        self.assertEqual(restarted.weight_multiples, [50., -25.])
+        self.assertEqual(restarted.read_weight(readings_to_average=3), [10., 20.])
+
+    def test_mismatching_or_missing_calibration_is_not_applied(self):
+        self.assertFalse(make_hx711(1000).load_calibration(self.path))
+        hx711 = make_hx711([1000, -2000])
+        hx711.zero(readings_to_average=5)
+        hx711.save_calibration(self.path)
+        other_clock = make_hx711([1000, -2000], sck_pin=4)
+        self.assertFalse(other_clock.load_calibration(self.path))
+        self.assertEqual(other_clock._adcs[0]._zero_offset, 0)
+        self.assertFalse(make_hx711(1000, channel_A_gain=64).load_calibration(self.path))
+        self.assertFalse(make_hx711(1000).load_calibration(self.path, max_age=-1))
+
+        with open(self.path, 'w') as f:
+            f.write('{not json')
+        self.assertFalse(make_hx711(1000).load_calibration(self.path))
+        with open(self.path, 'w') as f:
+            json.dump({'version': 0}, f)
+        self.assertFalse(make_hx711(1000).load_calibration(self.path))
+
+
+if __name__ == '__main__':
+    unittest.main()
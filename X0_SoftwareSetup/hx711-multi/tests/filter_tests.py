@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+# https://docs.python.org/3/library/unittest.html
+
+import time
+import unittest
+import numpy as np
+from hx711_multi import HX711, MovingWindowFilter, SortedWindow, SimulatedGPIOBackend
+from simulation_tests import widen_power_down_time
+
+
+class TestMovingWindowFilter(unittest.TestCase):
+
+    def test_sorted_window_matches_numpy(self):
+        rng = np.random.default_rng(0)
+        reads = rng.integers(-1000, 1000, 500).tolist()
+        for size in (1, 2, 7, 64):
+            window = SortedWindow(size)
+            for i, read in enumerate(reads):
+                window.push(read)
+                expected = reads[max(0, i + 1 - size):i + 1]
+                self.assertEqual(len(window), len(expected))
+                self.assertEqual(window.median, np.median(expected))
+                self.assertAlmostEqual(window.mean, np.mean(expected))
+
+    def test_median_rejects_spikes_and_outputs_every_read(self):
+        reads = [100] * 20
+        reads[10] = reads[11] = 90000
+        adc_filter = MovingWindowFilter(window=5, mode='median')
+        self.assertEqual([adc_filter.update(read) for read in reads], [100] * 20)
+
+    def test_iir_low_pass(self):
+        adc_filter = MovingWindowFilter(window=1, mode='mean', iir_alpha=0.5)
+        self.assertEqual([adc_filter.update(read) for read in (0, 8, 8, 8)], [0, 4, 6, 7])
+        adc_filter.reset()
+        self.assertIsNone(adc_filter.value)
+        self.assertEqual(adc_filter.update(8), 8)
+
+    def test_rejects_bad_arguments(self):
+        self.assertRaises(TypeError, MovingWindowFilter, 5, 'mode')
+        self.assertRaises(ValueError, MovingWindowFilter, 0)
+        self.assertRaises(ValueError, MovingWindowFilter, 5, 'mean', 0)
+        self.assertRaises(ValueError, MovingWindowFilter, 5, 'mean', 1.5)
+
+
+class TestReadFiltered(unittest.TestCase):
+
+    def setUp(self):
+        widen_power_down_time(self)
+
+    def test_read_filtered_returns_a_value_per_conversion(self):
+        load = [1000]
+        backend = SimulatedGPIOBackend.for_pins(1, [2], values=lambda t: load[0], sample_rate=80)
+        hx711 = HX711(2, 1, 128, 'A', log_level='CRITICAL', gpio_backend=backend)
+        hx711.zero(readings_to_average=1)
+        hx711.set_filter(window=5)
+        start = time.perf_counter()
+        values = [hx711.read_filtered() for _ in range(10)]
+        # a single spike is rejected by the median
+        load[0] = 90000
+        values.append(hx711.read_filtered())
+        load[0] = 5000
+        values += [hx711.read_filtered() for _ in range(9)]
+        # one value per conversion, not per batch of reads
+        self.assertLess(time.perf_counter() - start, 20 / 80 + 0.15)
+        self.assertEqual(values[:12], [0] * 12)
+        self.assertEqual(values[-1], 4000)
+        self.assertEqual(hx711.get_raw(), 4000)
+
+    def test_streaming_applies_filter(self):
+        backend = SimulatedGPIOBackend.for_pins(7, [5], values=1000, sample_rate=None, noise_stdev=50, seed=3)
+        hx711 = HX711(5, 7, 128, 'A', log_level='CRITICAL', gpio_backend=backend)
+        hx711.set_filter(window=15)
+        hx711.start_streaming(buffer_size=512)
+        self.assertRaises(RuntimeError, hx711.set_filter)
+        deadline = time.monotonic() + 5
+        while hx711.get_samples().next_index < 100 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        hx711.stop_streaming()
+        values = hx711.get_samples().values[20:, 0]
+        # the median of 15 reads is far less noisy than the reads themselves
+        self.assertLess(np.std(values), 30)
+
+
+if __name__ == '__main__':
+    unittest.main()
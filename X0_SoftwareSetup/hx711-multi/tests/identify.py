@@ -28,7 +28,7 @@ def _run_unguarded(
     hx711.reset()
 
     try:
-        hx711.zero(_readings_to_average_for_zeroing)  # can raise `Exception` if connection is broken
+        hx711.zero(_readings_to_average_for_zeroing, tolerance=2.)  # can raise `Exception` if connection is broken
     except Exception as e:
         if ignore_errors:
             print(e)
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+# https://docs.python.org/3/library/unittest.html
+
+import unittest
+import numpy as np
+from hx711_multi import HX711, ReadCounters, ReadStatistics, SimulatedGPIOBackend, get_logger
+from hx711_multi.instrumentation import _ConsoleHandler
+from simulation_tests import widen_power_down_time
+
+
+class TestInstrumentation(unittest.TestCase):
+
+    def setUp(self):
+        widen_power_down_time(self)
+
+    def make_hx711(self, values, sample_rate=None, **kwargs):
+        dout_pins = [2, 3]
+        backend = SimulatedGPIOBackend.for_pins(1, dout_pins, values=values, sample_rate=sample_rate)
+        return HX711(dout_pins, 1, gpio_backend=backend, **kwargs)
+
+    def test_console_handler_is_added_once(self):
+        self.make_hx711(5000, log_level='CRITICAL')
+        hx711 = self.make_hx711(5000, log_level='ERROR')
+        handlers = [h for h in hx711._logger.handlers if isinstance(h, _ConsoleHandler)]
+        self.assertEqual(len(handlers), 1)
+        self.assertEqual(handlers[0].level, 40)
+        self.assertIs(get_logger('CRITICAL'), hx711._logger)
+
+    def test_counters_are_off_by_default(self):
+        hx711 = self.make_hx711(5000, log_level='CRITICAL')
+        self.assertIsNone(hx711.counters)
+        hx711.read_raw(readings_to_average=3)
+        self.assertIsNone(hx711.counters)
+
+    def test_counters_count_reads_and_invalid_values(self):
+        # a value of exactly zero is discarded as invalid
+        hx711 = self.make_hx711([5000, 0], log_level='CRITICAL', all_or_nothing=False)
+        counters = hx711.enable_counters()
+        self.assertIs(hx711.enable_counters(), counters)
+        hx711.read_raw(readings_to_average=5)
+        exported = counters.as_dict()
+        self.assertEqual(exported['reads'], 5)
+        self.assertEqual(exported['failed_reads'], 0)
+        self.assertEqual(exported['not_ready'], 0)
+        self.assertEqual(exported['invalid_values'], 5)
+        self.assertGreater(exported['shift_ns'], 0)
+        self.assertGreaterEqual(exported['max_shift_ns'], exported['mean_shift_ns'])
+        counters.reset()
+        self.assertEqual(counters.reads, 0)
+        hx711.disable_counters()
+        hx711.read_raw(readings_to_average=2)
+        self.assertEqual(counters.reads, 0)
+        self.assertIsNone(hx711.counters)
+
+    def test_as_dict_of_empty_counters(self):
+        exported = ReadCounters().as_dict()
+        self.assertEqual(exported['reads'], 0)
+        self.assertEqual(exported['mean_wait_ns'], 0.)
+
+    def test_statistics_of_known_timestamps(self):
+        statistics = ReadStatistics(window=6)
+        self.assertEqual(statistics.as_dict()['rate_hz'], None)
+        # 10ms period, one late read (+1ms) and a gap of two dropped conversions, which pushes out the first read
+        for i, timestamp_ms in enumerate([0, 10, 20, 30, 41, 50, 80]):
+            statistics.record(timestamp_ms * 1000000, invalid_values=i % 2)
+        exported = statistics.as_dict()
+        self.assertEqual(list(statistics.timestamps()), [10e6, 20e6, 30e6, 41e6, 50e6, 80e6])
+        self.assertEqual(exported['reads'], 6)
+        self.assertEqual(exported['interval_ns'], 10e6)
+        self.assertAlmostEqual(exported['rate_hz'], 5 / 0.07)
+        self.assertEqual(exported['jitter_max_ns'], 20e6)
+        self.assertEqual(exported['dropped'], 2)
+        self.assertEqual(exported['invalid_values'], 3)
+        self.assertRaises(ValueError, ReadStatistics, 1)
+
+    def test_reads_are_stamped_when_data_is_ready(self):
+        hx711 = self.make_hx711(5000, sample_rate=80., log_level='CRITICAL', ready_mode='edge')
+        statistics = hx711.enable_statistics()
+        hx711.read_raw(readings_to_average=20)
+        timestamps = hx711.timestamps
+        self.assertEqual(len(timestamps), 20)
+        # the simulated chips convert exactly every 12.5ms and edge timestamps are exact. The first read did not
+        # wait for an edge (data was already ready), so it is stamped when it was found ready
+        np.testing.assert_allclose(np.diff(timestamps)[1:], 12.5e6, atol=0.2e6)
+        exported = statistics.as_dict()
+        self.assertEqual(exported['reads'], 20)
+        self.assertAlmostEqual(exported['rate_hz'], 80, delta=2)
+        self.assertEqual(exported['dropped'], 0)
+        hx711.read_filtered()
+        self.assertEqual(len(hx711.timestamps), 1)
+        self.assertEqual(statistics.as_dict()['reads'], 21)
+
+
+if __name__ == '__main__':
+    unittest.main()
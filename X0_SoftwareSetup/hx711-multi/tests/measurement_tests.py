@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+# https://docs.python.org/3/library/unittest.html
+
+import math
+import sys
+import unittest
+from logging import getLogger
+from statistics import stdev
+import numpy as np
+from hx711_multi.hx711 import ADC
+from hx711_multi.measurement import calculate_measurements, _sqrt_of_fraction, _newton_isqrt
+
+
+def make_adc(raw_reads, zero_offset=0., weight_multiple=1.):
+    adc = ADC(0, getLogger('hx711-multi-tests'), None)
+    adc._init_set_of_reads()
+    adc._ready = True
+    adc.zero(zero_offset)
+    adc.set_weight_multiple(weight_multiple)
+    for raw_read in raw_reads:
+        adc._current_raw_read = int(raw_read)
+        adc._finish_raw_read()
+    return adc
+
+
+def outcome(adc, result):
+    return (result, adc.measurement, adc.measurement_from_zero, adc.weight, adc._ready, adc._weight_is_fresh,
+            adc._read_stdev, len(adc._reads_filtered))
+
+
+class TestCalculateMeasurements(unittest.TestCase):
+
+    def assertMatchesReference(self, raw_reads, zero_offset=12.5, weight_multiple=3.):
+        """ every column of raw_reads must give the same ADC state with both implementations """
+        raw_reads = np.asarray(raw_reads, dtype=np.int64)
+        measurements = calculate_measurements(raw_reads)
+        for column in range(raw_reads.shape[1]):
+            reference = make_adc(raw_reads[:, column], zero_offset, weight_multiple)
+            vectorized = make_adc(raw_reads[:, column], zero_offset, weight_multiple)
+            expected = outcome(reference, reference._calculate_measurement())
+            actual = outcome(vectorized, vectorized._set_measurement(measurements, column))
+            self.assertEqual(actual, expected, f'column {column}: {raw_reads[:, column].tolist()}')
+
+    def test_matches_reference_on_random_reads(self):
+        rng = np.random.default_rng(0)
+        for n in (1, 2, 3, 4, 5, 10, 31, 100):
+            signed = rng.normal(rng.uniform(-1e5, 1e5, 8), rng.choice([0.4, 3, 30, 60, 500], 8), (n, 8)).round()
+            raw_reads = signed.astype(np.int64) & 0xFFFFFF
+            # sprinkle in failed reads
+            raw_reads[rng.random((n, 8)) < 0.1] = rng.choice([0x000000, 0x800000, 0x7FFFFF, 0xFFFFFF])
+            self.assertMatchesReference(raw_reads)
+
+    def test_matches_reference_on_small_integer_ties(self):
+        # small integers produce exact standard deviations, so reads sit exactly on the 2 stdev boundary
+        rng = np.random.default_rng(1)
+        for _ in range(200):
+            n = rng.integers(2, 9)
+            self.assertMatchesReference(rng.integers(1, 6, (n, 4)))
+
+    def test_corner_cases(self):
+        self.assertMatchesReference([[0x000000, 5, 7, 1000, 0xFFFFFF],
+                                     [0xFFFFFF, 5, 9, 1000, 0xFFFFFE],
+                                     [0x7FFFFF, 5, 7, 1000 + 300, 0xFFFFFE]])
+        # constant reads are set to the median, including measurement_from_zero
+        adc = make_adc([5, 5, 5], zero_offset=1.)
+        adc._set_measurement(calculate_measurements([[5], [5], [5]]), 0)
+        self.assertEqual(adc.measurement_from_zero, 4.)
+
+    def test_reads_over_max_stdev_are_not_ready(self):
+        measurements = calculate_measurements([[0], [1000], [5000], [-20000 & 0xFFFFFF]])
+        self.assertFalse(measurements.kept.any())
+        self.assertTrue(np.isnan(measurements.means[0]))
+
+    def test_no_reads(self):
+        measurements = calculate_measurements(np.zeros((0, 3), dtype=np.int64))
+        self.assertTrue(np.isnan(measurements.medians).all())
+        self.assertRaises(ValueError, calculate_measurements, [1, 2, 3])
+
+    @unittest.skipIf(sys.version_info < (3, 11), 'statistics.stdev is correctly rounded since Python 3.11')
+    def test_sqrt_of_fraction_matches_statistics_stdev(self):
+        rng = np.random.default_rng(2)
+        for _ in range(1000):
+            data = rng.integers(-1 << 24, 1 << 24, rng.integers(2, 50)).tolist()
+            n, total = len(data), sum(data)
+            variance = (n * sum(x * x for x in data) - total * total, n * (n - 1))
+            self.assertEqual(_sqrt_of_fraction(*variance), stdev(data))
+
+    @unittest.skipIf(sys.version_info < (3, 8), 'math.isqrt is available since Python 3.8')
+    def test_newton_isqrt_matches_math_isqrt(self):
+        rng = np.random.default_rng(3)
+        for n in list(range(100)) + [int(rng.integers(1 << 62)) << int(rng.integers(60)) for _ in range(1000)]:
+            self.assertEqual(_newton_isqrt(n), math.isqrt(n))
+
+
+if __name__ == '__main__':
+    unittest.main()
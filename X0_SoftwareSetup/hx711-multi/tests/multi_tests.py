@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+# https://docs.python.org/3/library/unittest.html
+
+import time
+import unittest
+from unittest import mock
+import numpy as np
+from hx711_multi import HX711, MultiHX711, SimulatedGPIOBackend, SimulatedHX711
+from simulation_tests import widen_power_down_time
+
+
+def make_group(backend, sck_pin, dout_pins, values, sample_rate=80., **kwargs):
+    """ attach simulated chips to the shared backend and create the HX711 of one clock line """
+    for dout_pin, value in zip(dout_pins, values):
+        backend.add_device(SimulatedHX711(sck_pin, dout_pin, value=value, sample_rate=sample_rate))
+    return HX711(dout_pins, sck_pin, log_level='CRITICAL', gpio_backend=backend, **kwargs)
+
+
+def stream_for(multi, seconds):
+    multi.start_streaming(buffer_size=1024)
+    time.sleep(seconds)
+    multi.stop_streaming()
+    return multi.get_samples()
+
+
+class TestMultiHX711(unittest.TestCase):
+
+    def setUp(self):
+        widen_power_down_time(self)
+        self.backend = SimulatedGPIOBackend()
+
+    def test_read_raw_returns_columns_of_all_groups(self):
+        groups = [make_group(self.backend, 1, [2, 3], [100, 200], sample_rate=None),
+                  make_group(self.backend, 4, [5], [300], sample_rate=None)]
+        for mode in ('interleaved', 'threads'):
+            multi = MultiHX711(groups, mode=mode)
+            self.assertEqual(multi.channels, [(1, 2), (1, 3), (4, 5)])
+            self.assertEqual(multi.read_raw(readings_to_average=5), [100, 200, 300])
+        groups[1].set_weight_multiples([4.])
+        self.assertEqual(multi.weight_multiples, [1., 1., 4.])
+
+    def test_rejects_bad_groups(self):
+        group = make_group(self.backend, 1, [2], [100], sample_rate=None)
+        self.assertRaises(ValueError, MultiHX711, [])
+        self.assertRaises(ValueError, MultiHX711, [group, group])
+        self.assertRaises(TypeError, MultiHX711, [group], 'mode')
+        self.assertRaises(TypeError, MultiHX711, [1])
+
+    def test_interleaved_stream_is_aligned_and_scales_with_groups(self):
+        groups = [make_group(self.backend, sck_pin, [sck_pin + 1], [sck_pin * 100]) for sck_pin in (1, 3, 5)]
+        multi = MultiHX711(groups, mode='interleaved')
+        multi.start_streaming(buffer_size=1024)
+        self.assertRaises(RuntimeError, groups[0].read_raw, 1)
+        self.assertRaises(RuntimeError, multi.read_raw, 1)
+        time.sleep(1.)
+        multi.stop_streaming()
+        self.assertFalse(groups[0].is_streaming)
+        samples = multi.get_samples()
+
+        # every group converts at close to its full 80Hz, there is one row per conversion period
+        self.assertGreater(len(samples.timestamps), 60)
+        self.assertTrue(np.all(np.diff(samples.timestamps) > 0))
+        for column, value in enumerate([100, 300, 500]):
+            values = samples.values[:, column]
+            self.assertGreater(np.count_nonzero(values == value), 60)
+            self.assertTrue(np.all((values == value) | np.isnan(values)))
+
+    def test_slow_group_does_not_stall_the_others(self):
+        groups = [make_group(self.backend, 1, [2], [100]),
+                  make_group(self.backend, 3, [4], [200], sample_rate=10.)]
+        samples = stream_for(MultiHX711(groups), 1.)
+        self.assertGreater(np.count_nonzero(samples.values[:, 0] == 100), 60)
+        self.assertLess(np.count_nonzero(samples.values[:, 1] == 200), 15)
+
+    def test_threads_mode_streams_all_groups(self):
+        groups = [make_group(self.backend, 1, [2], [100], sample_rate=None),
+                  make_group(self.backend, 3, [4], [200], sample_rate=None)]
+        samples = stream_for(MultiHX711(groups, mode='threads'), 0.3)
+        self.assertGreater(np.count_nonzero(samples.values[:, 0] == 100), 10)
+        self.assertGreater(np.count_nonzero(samples.values[:, 1] == 200), 10)
+
+    def test_read_raw_rejects_groups_in_use(self):
+        groups = [make_group(self.backend, 1, [2], [100], sample_rate=None),
+                  make_group(self.backend, 3, [4], [200], sample_rate=None)]
+        groups[0].start_streaming(buffer_size=64)
+        for mode in ('interleaved', 'threads'):
+            self.assertRaises(RuntimeError, MultiHX711(groups, mode=mode).read_raw, 1)
+        groups[0].stop_streaming()
+        groups[1].set_multiplexing([('A', 128, 2), ('B', 32, 2)])
+        for mode in ('interleaved', 'threads'):
+            self.assertRaises(RuntimeError, MultiHX711(groups, mode=mode).read_raw, 1)
+            self.assertRaises(RuntimeError, MultiHX711(groups, mode=mode).start_streaming)
+
+    def test_threads_mode_raises_errors_of_groups(self):
+        groups = [make_group(self.backend, 1, [2], [100], sample_rate=None),
+                  make_group(self.backend, 3, [4], [200], sample_rate=None)]
+        with mock.patch.object(groups[0], 'read_raw', side_effect=OSError('bus error')):
+            self.assertRaises(OSError, MultiHX711(groups, mode='threads').read_raw, 1)
+
+    def test_stop_streaming_leaves_groups_streaming_on_their_own(self):
+        groups = [make_group(self.backend, 1, [2], [100], sample_rate=None),
+                  make_group(self.backend, 3, [4], [200], sample_rate=None)]
+        multi = MultiHX711(groups)
+        groups[0].start_streaming(buffer_size=64)
+        multi.stop_streaming()
+        self.assertTrue(groups[0].is_streaming)
+        self.assertRaises(RuntimeError, groups[0].read_raw, 1)
+        groups[0].stop_streaming()
+        self.assertFalse(groups[0].is_streaming)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+# https://docs.python.org/3/library/unittest.html
+
+import time
+import unittest
+import numpy as np
+from hx711_multi import HX711, ChannelSchedule, SimulatedGPIOBackend, SimulatedHX711
+from simulation_tests import widen_power_down_time
+
+
+class TestChannelSchedule(unittest.TestCase):
+
+    def test_settling_conversions_follow_each_switch(self):
+        schedule = ChannelSchedule([('A', 128, 2), ('B', 32, 1)], settling_conversions=1)
+        self.assertEqual(schedule.inputs, [('A', 128), ('B', 32)])
+        self.assertEqual(schedule.cycle_length, 5)
+        self.assertEqual(schedule.valid_fraction, 3 / 5)
+
+        # the input of the first conversion is unknown, then the first input settles before the pattern starts
+        self.assertEqual(schedule.current, (None, False))
+        sequence = []
+        for _ in range(8):
+            pulses = schedule.advance()
+            sequence.append((pulses, schedule.current))
+        self.assertEqual(sequence, [
+            (1, (0, False)),
+            (1, (0, True)), (1, (0, True)),
+            (2, (1, False)), (2, (1, True)),
+            (1, (0, False)), (1, (0, True)), (1, (0, True)),
+        ])
+
+    def test_blocks_of_the_same_input_need_no_settling(self):
+        self.assertEqual(ChannelSchedule([('A', 64, 3)]).cycle_length, 3)
+        self.assertEqual(ChannelSchedule([('A', 128, 1), ('A', 128, 1), ('B', 32, 1)]).cycle_length, 9)
+
+    def test_rejects_bad_patterns(self):
+        self.assertRaises(ValueError, ChannelSchedule, [])
+        self.assertRaises(ValueError, ChannelSchedule, [('A', 128, 0)])
+        self.assertRaises(ValueError, ChannelSchedule, [('A', 128, 1)], -1)
+        self.assertRaises(TypeError, ChannelSchedule, [('B', 64, 1)])
+        self.assertRaises(TypeError, ChannelSchedule, [('A', 128)])
+
+
+class TestMultiplexing(unittest.TestCase):
+
+    def setUp(self):
+        widen_power_down_time(self)
+        self.backend = SimulatedGPIOBackend([
+            SimulatedHX711(1, 2, value=5000, channel_B_value=-2000, sample_rate=80.),
+            SimulatedHX711(1, 3, value=7000, channel_B_value=-3000, sample_rate=80.),
+        ])
+        self.hx711 = HX711([2, 3], 1, log_level='CRITICAL', gpio_backend=self.backend)
+
+    def test_read_multiplexed_discards_only_settling_conversions(self):
+        self.hx711.set_multiplexing([('A', 128, 4), ('B', 32, 2)])
+        self.assertRaises(RuntimeError, self.hx711.read_raw, 1)
+        samples = self.hx711.read_multiplexed(conversions=40)
+        timestamps, values = samples[('A', 128)]
+        self.assertGreaterEqual(len(timestamps), 11)
+        self.assertTrue(np.all(values == [5000, 7000]))
+        timestamps, values = samples[('B', 32)]
+        self.assertGreaterEqual(len(timestamps), 5)
+        self.assertTrue(np.all(values == [-2000, -3000]))
+
+        self.hx711.clear_multiplexing()
+        self.assertEqual(self.hx711.read_raw(readings_to_average=3), [5000, 7000])
+
+    def test_too_few_settling_conversions_give_unsettled_values(self):
+        self.hx711.set_multiplexing([('A', 128, 2), ('B', 32, 2)], settling_conversions=1)
+        _, values = self.hx711.read_multiplexed(conversions=20)[('B', 32)]
+        self.assertTrue(np.any(values[:, 0] != -2000))
+
+    def test_streams_each_input_separately(self):
+        self.hx711.set_multiplexing([('A', 128, 3), ('B', 32, 3)])
+        self.hx711.start_streaming(buffer_size=256)
+        self.assertRaises(RuntimeError, self.hx711.clear_multiplexing)
+        time.sleep(1.)
+        self.hx711.stop_streaming()
+
+        channel_A = self.hx711.get_samples()
+        channel_B = self.hx711.get_samples(channel='B')
+        self.assertTrue(np.all(channel_A.values == [5000, 7000]))
+        self.assertTrue(np.all(channel_B.values == [-2000, -3000]))
+        self.assertTrue(np.array_equal(self.hx711.get_samples(channel=('A', 128)).timestamps, channel_A.timestamps))
+        self.assertRaises(ValueError, self.hx711.get_samples, 0, ('A', 64))
+        # half of the conversions are valid: 40Hz combined, less the lead-in and scheduling jitter
+        self.assertGreater(len(channel_A.timestamps) + len(channel_B.timestamps), 30)
+
+    def test_requires_all_or_nothing(self):
+        hx711 = HX711([2, 3], 1, all_or_nothing=False, log_level='CRITICAL', gpio_backend=self.backend)
+        self.assertRaises(ValueError, hx711.set_multiplexing, [('A', 128, 1), ('B', 32, 1)])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+# https://docs.python.org/3/library/unittest.html
+
+import statistics
+import unittest
+import numpy as np
+from hx711_multi import HX711, SortedWindow, HampelFilter, MADClipping, RateLimiter, StdevRejection, SimulatedGPIOBackend
+from simulation_tests import widen_power_down_time
+
+
+class TestSortedWindowDeviations(unittest.TestCase):
+
+    def test_deviations_match_statistics(self):
+        rng = np.random.default_rng(1)
+        reads = rng.integers(-500, 500, 300).tolist()
+        for size in (2, 5, 16):
+            window = SortedWindow(size)
+            for i, read in enumerate(reads):
+                window.push(read)
+                expected = reads[max(0, i + 1 - size):i + 1]
+                median = statistics.median(expected)
+                deviations = [abs(value - median) for value in expected]
+                self.assertEqual(window.median_absolute_deviation, statistics.median(deviations))
+                if len(expected) > 1:
+                    self.assertAlmostEqual(window.deviation_stdev, statistics.stdev(deviations), places=6)
+
+
+class TestOutlierFilters(unittest.TestCase):
+
+    def setUp(self):
+        self.reads = [1000, 1003, 998, 1001, 1002, 999, 1000, 1001, 60000, 1002, 999, 1000]
+
+    def test_hampel_replaces_spikes_by_the_median(self):
+        outlier_filter = HampelFilter(window=7)
+        values = [outlier_filter.update(read) for read in self.reads]
+        self.assertEqual(values[8], 1001)
+        self.assertEqual(values[:8] + values[9:], self.reads[:8] + self.reads[9:])
+        self.assertEqual((outlier_filter.kept, outlier_filter.replaced, outlier_filter.dropped), (11, 1, 0))
+
+    def test_hampel_follows_steps(self):
+        outlier_filter = HampelFilter(window=5)
+        values = [outlier_filter.update(read) for read in [0] * 10 + [5000] * 10]
+        self.assertEqual(values[-7:], [5000] * 7)
+
+    def test_mad_clipping_keeps_the_direction(self):
+        outlier_filter = MADClipping(window=7, threshold=3.0)
+        values = [outlier_filter.update(read) for read in self.reads]
+        self.assertGreater(values[8], 1001)
+        self.assertLess(values[8], 1020)
+
+    def test_rate_limiter(self):
+        outlier_filter = RateLimiter(max_step=100)
+        self.assertEqual([outlier_filter.update(read) for read in (0, 50, 1000, 1000, 1000)], [0, 50, 150, 250, 350])
+        outlier_filter.reset()
+        self.assertEqual(outlier_filter.update(1000), 1000)
+
+    def test_stdev_rejection_drops_single_reads(self):
+        outlier_filter = StdevRejection(window=10)
+        values = [outlier_filter.update(read) for read in self.reads]
+        self.assertIsNone(values[8])
+        self.assertEqual(sum(value is None for value in values), outlier_filter.dropped)
+        self.assertLessEqual(outlier_filter.dropped, 4)
+
+    def test_rejects_bad_arguments(self):
+        self.assertRaises(ValueError, HampelFilter, 2)
+        self.assertRaises(ValueError, MADClipping, 5, -1.)
+        self.assertRaises(ValueError, RateLimiter, 0)
+        self.assertRaises(ValueError, StdevRejection, 1)
+
+
+class TestHX711OutlierFilter(unittest.TestCase):
+
+    def setUp(self):
+        widen_power_down_time(self)
+        self.backend = SimulatedGPIOBackend.for_pins(1, [2, 3], values=[self.swaying, 7000], sample_rate=80.)
+        self.hx711 = HX711([2, 3], 1, log_level='CRITICAL', gpio_backend=self.backend)
+
+    @staticmethod
+    def swaying(seconds):
+        # a person moving on the plate: far more than 100 counts of spread within one set of reads
+        return 5000 + 2000 * np.sin(2 * np.pi * seconds)
+
+    def test_keeps_measurements_while_the_load_moves(self):
+        self.hx711.set_outlier_filter('hampel', window=9)
+        for _ in range(3):
+            values = self.hx711.read_raw(readings_to_average=10)
+            self.assertIsNotNone(values[0])
+            self.assertEqual(values[1], 7000)
+            self.assertTrue(3000 <= values[0] <= 7000)
+        self.assertTrue(all(outlier_filter.kept for outlier_filter in self.hx711.outlier_filters))
+
+        self.hx711.set_outlier_filter(None)
+        self.assertEqual(self.hx711.outlier_filters, [None, None])
+
+    def test_applies_to_read_filtered(self):
+        self.hx711.set_outlier_filter('rate', max_step=50)
+        self.hx711.read_filtered()
+        values = [self.hx711.read_filtered() for _ in range(5)]
+        self.assertTrue(all(value[1] == 7000 for value in values))
+        self.assertEqual(self.hx711.outlier_filters[1].replaced, 0)
+
+    def test_rejects_unknown_strategies(self):
+        self.assertRaises(TypeError, self.hx711.set_outlier_filter, 'kalman')
+        self.assertRaises(TypeError, self.hx711.set_outlier_filter, SortedWindow)
+
+
+if __name__ == '__main__':
+    unittest.main()
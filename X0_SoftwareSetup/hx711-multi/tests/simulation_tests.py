@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+# https://docs.python.org/3/library/unittest.html
+
+import unittest
+from unittest import mock
+from time import perf_counter
+from hx711_multi import HX711, SimulatedGPIOBackend, SimulatedHX711
+
+
+def widen_power_down_time(test_case: unittest.TestCase, seconds: float = 0.005):
+    """
+    the simulation runs on the host clock, so a busy or virtualized host can stretch an SCK pulse past 60us.
+    HX711 would then (correctly) discard the read. Widen the power-down window of driver and chips alike,
+    so tests that are not about power down do not depend on the scheduler
+    """
+    for cls in (HX711, SimulatedHX711):
+        patcher = mock.patch.object(cls, '_POWER_DOWN_TIME', seconds)
+        patcher.start()
+        test_case.addCleanup(patcher.stop)
+
+
+class TestSimulatedHX711(unittest.TestCase):
+
+    def setUp(self):
+        widen_power_down_time(self)
+
+    def test_read_raw_returns_simulated_values(self):
+        backend = SimulatedGPIOBackend.for_pins(1, [2, 3, 4], values=[1000, -2000, 0x7FFF], sample_rate=None)
+        hx711 = HX711([2, 3, 4], 1, 128, 'A', log_level='CRITICAL', gpio_backend=backend)
+        self.assertEqual(hx711.read_raw(readings_to_average=1), [1000, -2000, 0x7FFF])
+        self.assertEqual(backend.outputs, {1})
+        self.assertEqual(backend.inputs, {2, 3, 4})
+
+    def test_noisy_values_are_averaged(self):
+        backend = SimulatedGPIOBackend.for_pins(1, [2], values=5000, sample_rate=None, noise_stdev=5, seed=1)
+        hx711 = HX711(2, 1, 128, 'A', log_level='CRITICAL', gpio_backend=backend)
+        self.assertAlmostEqual(hx711.read_raw(readings_to_average=30), 5000, delta=10)
+
+    def test_gain_pulses_select_channel_and_gain(self):
+        device = SimulatedHX711(1, 2, value=4000, channel_B_value=-300, sample_rate=None)
+        backend = SimulatedGPIOBackend([device])
+        # the first read after construction still uses the power-on configuration (A/128)
+        hx711 = HX711(2, 1, 64, 'A', log_level='CRITICAL', gpio_backend=backend)
+        self.assertEqual(hx711.read_raw(readings_to_average=1), 2000)
+        hx711 = HX711(2, 1, 128, 'B', log_level='CRITICAL', gpio_backend=backend)
+        hx711.read_raw(readings_to_average=1)
+        self.assertEqual(hx711.read_raw(readings_to_average=1), -300)
+
+    def test_missing_chip_with_all_or_nothing(self):
+        # pin 3 has no chip attached, so it never becomes ready
+        backend = SimulatedGPIOBackend.for_pins(1, [2], values=1000, sample_rate=None)
+        hx711 = HX711([2, 3], 1, 128, 'A', all_or_nothing=True, log_level='CRITICAL', gpio_backend=backend)
+        self.assertEqual(hx711.read_raw(readings_to_average=1), [None, None])
+        hx711 = HX711([2, 3], 1, 128, 'A', all_or_nothing=False, log_level='CRITICAL', gpio_backend=backend)
+        self.assertEqual(hx711.read_raw(readings_to_average=1), [1000, None])
+
+    def test_bulk_read_matches_per_pin_read(self):
+        dout_pins = [2, 3, 4, 14, 15]
+        values = [1, -2, 0x7FFFFE, -0x7FFFFF, 123456]
+        results = []
+        for bulk_read in (False, True):
+            backend = SimulatedGPIOBackend.for_pins(1, dout_pins, values=values, sample_rate=None, bulk_read=bulk_read)
+            hx711 = HX711(dout_pins, 1, 128, 'A', log_level='CRITICAL', gpio_backend=backend)
+            results.append(hx711.read_raw(readings_to_average=1))
+            results.append([adc.raw_reads.tolist() for adc in hx711._adcs])
+        self.assertEqual(results[0], values)
+        self.assertEqual(results[0], results[2])
+        self.assertEqual(results[1], results[3])
+
+    def test_sample_rate_limits_acquisition_rate(self):
+        backend = SimulatedGPIOBackend.for_pins(1, [2], values=1000, sample_rate=80)
+        hx711 = HX711(2, 1, 128, 'A', log_level='CRITICAL', gpio_backend=backend)
+        hx711.read_raw(readings_to_average=1)
+        start = perf_counter()
+        hx711.read_raw(readings_to_average=8)
+        self.assertGreaterEqual(perf_counter() - start, 7 / 80)
+
+    def test_edge_ready_mode_keeps_up_with_80hz(self):
+        backend = SimulatedGPIOBackend.for_pins(1, [2, 3], values=[1000, 2000], sample_rate=80,
+                                                noise_stdev=2, seed=0)
+        hx711 = HX711([2, 3], 1, 128, 'A', log_level='CRITICAL', gpio_backend=backend, ready_mode='edge')
+        hx711.read_raw(readings_to_average=1)
+        start = perf_counter()
+        measurements = hx711.read_raw(readings_to_average=16)
+        self.assertGreater(16 / (perf_counter() - start), 70)
+        self.assertAlmostEqual(measurements[0], 1000, delta=5)
+        self.assertAlmostEqual(measurements[1], 2000, delta=5)
+
+    def test_edge_ready_mode_with_all_or_nothing(self):
+        backend = SimulatedGPIOBackend.for_pins(1, [2], values=1000, sample_rate=80)
+        hx711 = HX711([2, 3], 1, 128, 'A', all_or_nothing=True, log_level='CRITICAL',
+                      gpio_backend=backend, ready_mode='edge')
+        self.assertEqual(hx711.read_raw(readings_to_average=1), [None, None])
+        hx711 = HX711([2, 3], 1, 128, 'A', all_or_nothing=False, log_level='CRITICAL',
+                      gpio_backend=backend, ready_mode='edge')
+        self.assertEqual(hx711.read_raw(readings_to_average=1), [1000, None])
+        self.assertRaises(TypeError, HX711, [2], 1, 128, 'A', gpio_backend=backend, ready_mode='interrupt')
+
+    def test_reset_powers_chip_down_and_up(self):
+        device = SimulatedHX711(1, 2, value=1000, sample_rate=None)
+        hx711 = HX711(2, 1, 128, 'A', log_level='CRITICAL', gpio_backend=SimulatedGPIOBackend([device]))
+        hx711.power_down()
+        self.assertEqual(device.dout(perf_counter()), 1)
+        self.assertTrue(hx711.power_up())
+        self.assertEqual(hx711.read_raw(readings_to_average=1), 1000)
+
+
+if __name__ == '__main__':
+    unittest.main()
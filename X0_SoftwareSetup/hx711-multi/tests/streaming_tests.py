@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+# https://docs.python.org/3/library/unittest.html
+
+import time
+import unittest
+import numpy as np
+from hx711_multi import HX711, SampleRingBuffer, SimulatedGPIOBackend, RPiGPIOBackend
+from simulation_tests import widen_power_down_time
+
+
+class MockGPIO:
+    """
+    stands in for RPi.GPIO. Every dout pin is always ready and shifts out `raw_value` (MSB first)
+    on the clock pulses of a 25-pulse (channel A, gain 128) read
+    """
+    BCM = 11
+    IN = 1
+    OUT = 0
+    FALLING = 32
+
+    def __init__(self, raw_value):
+        self.raw_value = raw_value
+        self._pulses = 0
+        self._sck = False
+
+    def getmode(self):
+        return self.BCM
+
+    def setup(self, pin, mode):
+        pass
+
+    def add_event_detect(self, pin, edge, callback=None):
+        pass
+
+    def remove_event_detect(self, pin):
+        pass
+
+    def output(self, pin, value):
+        if value and not self._sck:
+            self._pulses += 1
+        self._sck = bool(value)
+
+    def input(self, pin):
+        bit_index = self._pulses % 25
+        if bit_index == 0:
+            return 0  # ready
+        return (self.raw_value >> (24 - bit_index)) & 1
+
+
+class TestSampleRingBuffer(unittest.TestCase):
+
+    def test_get_samples_returns_pushed_samples_in_order(self):
+        buffer = SampleRingBuffer(capacity=8, channels=2)
+        for i in range(5):
+            buffer.push(i, [i, -i])
+        samples = buffer.get_samples()
+        self.assertEqual(list(samples.timestamps), [0, 1, 2, 3, 4])
+        self.assertEqual(list(samples.values[:, 1]), [0, -1, -2, -3, -4])
+        self.assertEqual(samples.next_index, 5)
+        self.assertEqual(samples.dropped, 0)
+
+    def test_cursor_only_returns_new_samples(self):
+        buffer = SampleRingBuffer(capacity=8, channels=1)
+        buffer.push(0, [0])
+        cursor = buffer.get_samples().next_index
+        buffer.push(1, [1])
+        samples = buffer.get_samples(since=cursor)
+        self.assertEqual(list(samples.timestamps), [1])
+
+    def test_wrapping_reports_dropped_samples(self):
+        buffer = SampleRingBuffer(capacity=4, channels=1)
+        for i in range(10):
+            buffer.push(i, [i])
+        samples = buffer.get_samples(since=0)
+        # one slot is reserved for the in-flight write, so 3 samples are readable
+        self.assertEqual(list(samples.timestamps), [7, 8, 9])
+        self.assertEqual(samples.dropped, 7)
+
+    def test_rejects_bad_sizes(self):
+        self.assertRaises(ValueError, SampleRingBuffer, 1, 1)
+        self.assertRaises(ValueError, SampleRingBuffer, 4, 0)
+
+
+class TestStreaming(unittest.TestCase):
+
+    def setUp(self):
+        widen_power_down_time(self)
+
+    def test_streaming_fills_buffer_with_timestamped_reads(self):
+        backend = SimulatedGPIOBackend.for_pins(7, [5, 6], values=[0x001234, -500], sample_rate=None)
+        hx711 = HX711([5, 6], 7, 128, 'A', log_level='CRITICAL', gpio_backend=backend)
+        hx711.start_streaming(buffer_size=256)
+        deadline = time.monotonic() + 5
+        while hx711.get_samples().next_index < 20 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertRaises(RuntimeError, hx711.read_raw, 1)
+        hx711.stop_streaming()
+        self.assertFalse(hx711.is_streaming)
+
+        samples = hx711.get_samples()
+        self.assertGreaterEqual(len(samples.timestamps), 20)
+        self.assertTrue(np.all(np.diff(samples.timestamps) >= 0))
+        self.assertTrue(np.all(samples.values[:, 0] == 0x001234))
+        self.assertTrue(np.all(samples.values[:, 1] == -500))
+
+    def test_streaming_with_mock_rpi_gpio(self):
+        backend = RPiGPIOBackend(use_gpiomem=False, gpio=MockGPIO(raw_value=0x001234))
+        hx711 = HX711([5, 6], 7, 128, 'A', log_level='CRITICAL', gpio_backend=backend)
+        hx711.start_streaming(buffer_size=256)
+        deadline = time.monotonic() + 5
+        while hx711.get_samples().next_index < 20 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        hx711.stop_streaming()
+        samples = hx711.get_samples()
+        self.assertGreaterEqual(len(samples.timestamps), 20)
+        self.assertTrue(np.all(samples.values == 0x001234))
+
+    def test_get_samples_requires_streaming(self):
+        backend = SimulatedGPIOBackend.for_pins(7, [5], values=1000, sample_rate=None)
+        hx711 = HX711([5], 7, 128, 'A', log_level='CRITICAL', gpio_backend=backend)
+        self.assertRaises(RuntimeError, hx711.get_samples)
+
+
+if __name__ == '__main__':
+    unittest.main()
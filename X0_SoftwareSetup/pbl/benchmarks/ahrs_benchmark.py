@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+
+# measures the samples per second of the orientation filters of `pbl.ahrs` on a synthetic IMU
+# recording (one minute at 1 kHz, with magnetometer): `update` per sample, as a live loop calls
+# it, `run` over the whole recording with the Python loop, and `run` with the numba loop (if
+# numba is installed)
+#
+# usage: python3 benchmarks/ahrs_benchmark.py
+
+import time
+
+from pbl.ahrs import AhrsTests, Madgwick, Mahony, numba
+
+seconds_of_data = 60
+sample_rate = 1000
+
+timestamps, gyro, accel, mag = AhrsTests().synthetic(hz=sample_rate, seconds=seconds_of_data, rate=0.5, tilt=0.3)
+samples = len(timestamps)
+
+# returns the samples per second of `process(n)`, which processes the first n samples
+def measure(process, n):
+    start = time.perf_counter()
+    process(n)
+    return n / (time.perf_counter() - start)
+
+def per_sample(make):
+    def process(n):
+        f = make()
+        for i in range(n):
+            f.update(timestamps[i], gyro[i], accel[i], mag[i])
+    return process
+
+def batch(make):
+    def process(n):
+        make().run(timestamps[:n], gyro[:n], accel[:n], mag[:n])
+    return process
+
+print(f"{'filter':<10} {'mode':<22} {'samples/s':>12}")
+for name, filter_class in (("Mahony", Mahony), ("Madgwick", Madgwick)):
+    modes = [
+        ("update() per sample", per_sample(lambda: filter_class(compiled=False)), 20_000),
+        ("run(), Python loop", batch(lambda: filter_class(compiled=False)), samples),
+    ]
+    if numba is not None:
+        # compile (or load from the cache) before measuring
+        filter_class(compiled=True).run(timestamps[:10], gyro[:10], accel[:10], mag[:10])
+        modes.append(("run(), numba loop", batch(lambda: filter_class(compiled=True)), samples))
+    for mode, process, n in modes:
+        print(f"{name:<10} {mode:<22} {measure(process, n):>12,.0f}")
+    if numba is None:
+        print(f"{name:<10} {'run(), numba loop':<22} {'(numba is not installed)':>12}")
@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+
+# measures the cost of fanning one sensor stream out to N subscribers, each on its own thread:
+# `pbl.bus.Topic` (one shared ring buffer, one cursor per subscriber) against one `queue.Queue`
+# per subscriber, which the producer has to put every batch into. Both hold about 100 ms of samples
+# per subscriber and never block the producer: a full queue drops the batch
+#
+# the producer publishes a batch of 10 samples of 9 channels every millisecond (an IMU at 10 kHz)
+# for half a second. Reported are the producer's time in publishing per sample, its longest
+# stall in a single publish, and the fraction of the samples the subscribers received. The last
+# run adds one subscriber that takes 200 ms per batch, which only loses its own backlog
+#
+# usage: python3 benchmarks/bus_benchmark.py
+
+import queue
+import threading
+import time
+
+import numpy as np
+
+from pbl.bus import Topic
+
+batches = 500
+batch_size = 10
+channels = 9
+period = 0.001
+capacity = 1024
+slow_delay = 0.2
+
+timestamps = np.arange(batch_size, dtype=np.int64)
+values = np.random.default_rng(0).normal(size=(batch_size, channels))
+
+# calls `publish` every `period` seconds, returns (seconds spent in `publish`, longest call)
+def produce(publish):
+    spent = 0.0
+    longest = 0.0
+    deadline = time.perf_counter()
+    for _ in range(batches):
+        deadline += period
+        start = time.perf_counter()
+        publish()
+        duration = time.perf_counter() - start
+        spent += duration
+        longest = max(longest, duration)
+        time.sleep(max(0.0, deadline - time.perf_counter()))
+    return spent, longest
+
+def bus(subscribers, slow=False):
+    topic = Topic("imu", [f"ch{i}" for i in range(channels)], capacity=capacity)
+    done = threading.Event()
+    received = [0] * (subscribers + slow)
+
+    def subscriber(i, delay):
+        subscription = topic.subscribe(from_start=True)
+        while not (done.is_set() and subscription.backlog == 0):
+            if subscription.wait(timeout=0.01):
+                samples = subscription.get()
+                received[i] += len(samples.timestamps)
+                samples.values.sum()
+                if delay:
+                    time.sleep(delay)
+
+    threads = [threading.Thread(target=subscriber, args=(i, slow_delay if i == subscribers else 0)) for i in range(subscribers + slow)]
+    for thread in threads:
+        thread.start()
+    spent = produce(lambda: topic.publish(timestamps, values))
+    done.set()
+    for thread in threads:
+        thread.join()
+    return spent, received
+
+def queues(subscribers, slow=False):
+    queues = [queue.Queue(maxsize=capacity // batch_size) for _ in range(subscribers + slow)]
+    received = [0] * (subscribers + slow)
+
+    def subscriber(i, delay):
+        while True:
+            batch = queues[i].get()
+            if batch is None:
+                return
+            received[i] += len(batch[0])
+            batch[1].sum()
+            if delay:
+                time.sleep(delay)
+
+    threads = [threading.Thread(target=subscriber, args=(i, slow_delay if i == subscribers else 0)) for i in range(subscribers + slow)]
+    for thread in threads:
+        thread.start()
+    def publish():
+        # each subscriber gets its own copy, as it would from a sensor that reuses its buffer
+        for q in queues:
+            try:
+                q.put_nowait((timestamps.copy(), values.copy()))
+            except queue.Full:
+                pass
+
+    spent = produce(publish)
+    for q in queues:
+        q.put(None)
+    for thread in threads:
+        thread.join()
+    return spent, received
+
+def report(label, subscribers, slow, result):
+    (spent, longest), received = result
+    total = batches * batch_size
+    fast = received[:subscribers]
+    line = f"{label:<8} {subscribers:>11} {spent / total * 1e9:>11.0f}ns {longest * 1e3:>10.2f}ms {min(fast) / total:>12.1%}"
+    if slow:
+        line += f" {received[-1] / total:>12.1%}"
+    print(line)
+
+print(f"{'fan-out':<8} {'subscribers':>11} {'per sample':>13} {'longest':>12} {'received':>12} {'slow got':>12}")
+for subscribers in (1, 2, 4, 8, 16):
+    for label, function in (("bus", bus), ("queues", queues)):
+        report(label, subscribers, False, function(subscribers))
+for label, function in (("bus", bus), ("queues", queues)):
+    report(label, 4, True, function(4, slow=True))
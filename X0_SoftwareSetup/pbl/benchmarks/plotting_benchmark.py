@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+
+# measures the CPU time per animation frame (20 fps) of a 10 s live plot of 5 channels, for
+# sensors sampling from 80 Hz (HX711) to 10 kHz: drawing every sample of the window (the
+# `set_data` arrays of the labs, rebuilt from a list each frame) against `pbl.plotting.PlotFeed`,
+# which merges the frame's new samples into a min/max envelope of 500 bins
+#
+# only the preparation of the arrays is timed, not matplotlib itself: with every sample, the
+# drawing cost also grows with the sample rate, with the envelope it is constant
+#
+# usage: python3 benchmarks/plotting_benchmark.py
+
+import collections
+import time
+
+import numpy as np
+
+from pbl.plotting import PlotFeed
+
+channels = 5
+window = 10.0
+frame_rate = 20
+frames = 200
+
+def every_sample(sample_rate):
+    history = collections.deque(maxlen=int(window * sample_rate))
+    per_frame = sample_rate // frame_rate
+    rows = np.random.default_rng(0).normal(size=(per_frame, channels)).tolist()
+    start = time.process_time()
+    for _ in range(frames):
+        history.extend(rows)
+        y = np.array(history)
+    return (time.process_time() - start) / frames, len(y)
+
+def envelope(sample_rate):
+    feed = PlotFeed([f"ch{i}" for i in range(channels)], window=window, points=500)
+    per_frame = sample_rate // frame_rate
+    values = np.random.default_rng(0).normal(size=(per_frame, channels))
+    period = 1_000_000_000 // sample_rate
+    start = time.process_time()
+    for frame in range(frames):
+        timestamps = (frame * per_frame + np.arange(per_frame)) * period
+        feed.push(timestamps, values)
+        x, y = feed.update()
+    return (time.process_time() - start) / frames, len(y)
+
+print(f"{'sample rate':>12} {'every sample':>22} {'PlotFeed':>22}")
+for sample_rate in (80, 860, 2000, 10000):
+    (full, full_points), (decimated, points) = every_sample(sample_rate), envelope(sample_rate)
+    print(f"{sample_rate:>10}Hz {full * 1e3:>9.2f}ms {full_points:>6} pts {decimated * 1e3:>9.2f}ms {points:>6} pts")
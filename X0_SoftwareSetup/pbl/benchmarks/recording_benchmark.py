@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+
+# compares writing a force plate session (80 Hz x 5 load cells) the way the S3/X1 labs do
+# it, a `csv.writer.writerow` with `datetime.now()` per sample, with `pbl.recording.Recorder`,
+# which gets the same samples in batches (as `get_samples` returns them from a streaming HX711)
+#
+# prints the CPU time per sample (of all threads, so including the recorder's writer thread),
+# the throughput, and the file size. Then compares loading the session back for a plot of
+# minute 10: reading the whole CSV into lists, against `pbl.recording.SessionReader`
+#
+# usage: python3 benchmarks/recording_benchmark.py
+
+import csv
+import os
+import tempfile
+import time
+from datetime import datetime
+
+import numpy as np
+
+from pbl.recording import Recorder, SessionReader, export_csv
+
+channels = ["cell1", "cell2", "cell3", "cell4", "cell5"]
+seconds_of_data = 15 * 60  # a 15 minute trial
+sample_rate = 80
+batch_size = 8  # 10 batches per second, e.g. one `get_samples` per animation frame
+
+samples = seconds_of_data * sample_rate
+rng = np.random.default_rng(0)
+timestamps = time.monotonic_ns() + np.arange(samples, dtype=np.int64) * (1_000_000_000 // sample_rate)
+values = rng.normal(0, 20, (samples, len(channels))).round() + [81000, -12000, 5000, -3000, 700]
+
+def per_row_csv(path):
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["time"] + channels)
+        for row in values.tolist():
+            writer.writerow([datetime.now()] + row)
+
+def recorder(path):
+    with Recorder(path, channels, kind="force_plate") as recording:
+        for start in range(0, samples, batch_size):
+            recording.write(timestamps[start:start + batch_size], values[start:start + batch_size], block=True)
+
+def measure(function, path):
+    start_cpu = time.process_time()
+    start = time.perf_counter()
+    function(path)
+    elapsed = time.perf_counter() - start
+    cpu = time.process_time() - start_cpu
+    return cpu, elapsed, os.path.getsize(path)
+
+directory = tempfile.mkdtemp()
+csv_path = os.path.join(directory, "session.csv")
+recording_path = os.path.join(directory, "session.pblrec")
+
+print(f"{samples} samples x {len(channels)} channels ({seconds_of_data / 60:.0f} minutes at {sample_rate} Hz)")
+print(f"{'writer':<24} {'CPU/sample':>11} {'samples/s':>12} {'file size':>10}")
+for label, function, path in (("csv writerow per row", per_row_csv, csv_path),
+                              ("Recorder (batches)", recorder, recording_path)):
+    cpu, elapsed, size = measure(function, path)
+    print(f"{label:<24} {cpu / samples * 1e6:>9.2f}us {samples / elapsed:>12.0f} {size / 1e6:>8.2f}MB")
+
+start = time.perf_counter()
+export_csv(recording_path, os.path.join(directory, "exported.csv"))
+print(f"export_csv afterwards: {time.perf_counter() - start:.2f}s")
+
+def csv_minute_10(path):
+    with open(path, newline="") as f:
+        rows = list(csv.reader(f))[1:]
+    times = [datetime.fromisoformat(row[0]) for row in rows]
+    start = times[0].timestamp() + 10 * 60
+    return [float(row[1]) for row, t in zip(rows, times) if start <= t.timestamp() < start + 60]
+
+def reader_minute_10(path):
+    with SessionReader(path) as reader:
+        return np.array(reader.between(10 * 60, 11 * 60, channels="cell1")[1])
+
+def reader_decimated(path):
+    with SessionReader(path) as reader:
+        return np.array(reader.decimate(2000, channels="cell1")[1])
+
+print(f"{'reader':<32} {'time':>8}")
+for label, function, path in (("csv into lists, minute 10", csv_minute_10, csv_path),
+                              ("SessionReader, minute 10", reader_minute_10, recording_path),
+                              ("SessionReader, 2000 points", reader_decimated, recording_path)):
+    start = time.perf_counter()
+    function(path)
+    print(f"{label:<32} {(time.perf_counter() - start) * 1e3:>6.1f}ms")
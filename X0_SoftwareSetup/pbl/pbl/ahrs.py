@@ -0,0 +1,349 @@
+# `pbl.ahrs`: orientation (attitude and heading) of an IMU from its gyroscope, accelerometer and
+# magnetometer, with the Mahony or the Madgwick filter.
+#
+# `ICM20948.imuAHRSupdate()` (the Waveshare demo) is a Mahony filter that assumes 48 ms between
+# samples and forgets its integral feedback on every call, so it only fits live use at the demo's
+# rate. The filters here keep their state (orientation, integral feedback, last timestamp)
+# between calls and integrate over the real time between samples, taken from their timestamps:
+#
+# - `update(timestamp, gyro, accel, mag)` processes one sample, e.g. in a live loop
+# - `run(timestamps, gyro, accel, mag)` processes a batch, e.g. a whole recording, and returns the
+#   orientation after each sample. Batches continue where the previous call ended, so a stream can
+#   be processed in chunks
+#
+# The filter step is inherently sequential, so a batch is processed by one loop over its samples:
+# compiled with numba if it is installed, or otherwise a Python loop over plain floats, which
+# avoids the per-sample overhead of NumPy scalars. Everything around the loop (units, time steps,
+# Euler angles) is vectorized with NumPy.
+#
+# Units: timestamps in ns (e.g. `time.monotonic_ns()`), gyro in rad/s. Accel and mag can be in any
+# unit (e.g. raw counts), as the filters only use their directions; a sample without a valid
+# magnetometer reading (all zeros, or `mag=None`) only corrects roll and pitch. Quaternions are
+# (w, x, y, z) arrays, see `euler` to convert them to roll, pitch and yaw.
+
+import math
+import unittest
+
+import numpy as np
+
+try:
+    import numba
+except ImportError:  # the Python loop does the same, only slower
+    numba = None
+
+# the Mahony filter step over all samples of the flat sequences (lists, or arrays when compiled). `state` is [q0, q1, q2, q3, ix, iy, iz] (orientation and
+# integral feedback), updated in place, and `out` receives 4 values per sample
+def _mahony(gx, gy, gz, ax, ay, az, mx, my, mz, dt, use_mag, kp, ki, state, out):
+    q0, q1, q2, q3, ix, iy, iz = state[0], state[1], state[2], state[3], state[4], state[5], state[6]
+    for i in range(len(dt)):
+        wgx, wgy, wgz = gx[i], gy[i], gz[i]
+        halft = 0.5 * dt[i]
+        a = math.sqrt(ax[i] * ax[i] + ay[i] * ay[i] + az[i] * az[i])
+        if a > 0.0:
+            nax, nay, naz = ax[i] / a, ay[i] / a, az[i] / a
+            q0q0 = q0 * q0
+            q0q1 = q0 * q1
+            q0q2 = q0 * q2
+            q0q3 = q0 * q3
+            q1q1 = q1 * q1
+            q1q2 = q1 * q2
+            q1q3 = q1 * q3
+            q2q2 = q2 * q2
+            q2q3 = q2 * q3
+            q3q3 = q3 * q3
+            # estimated direction of gravity, and error to the measured one
+            vx = 2.0 * (q1q3 - q0q2)
+            vy = 2.0 * (q0q1 + q2q3)
+            vz = q0q0 - q1q1 - q2q2 + q3q3
+            ex = nay * vz - naz * vy
+            ey = naz * vx - nax * vz
+            ez = nax * vy - nay * vx
+            m = math.sqrt(mx[i] * mx[i] + my[i] * my[i] + mz[i] * mz[i]) if use_mag else 0.0
+            if m > 0.0:
+                nmx, nmy, nmz = mx[i] / m, my[i] / m, mz[i] / m
+                # reference direction of the flux, and its estimated direction
+                hx = 2.0 * nmx * (0.5 - q2q2 - q3q3) + 2.0 * nmy * (q1q2 - q0q3) + 2.0 * nmz * (q1q3 + q0q2)
+                hy = 2.0 * nmx * (q1q2 + q0q3) + 2.0 * nmy * (0.5 - q1q1 - q3q3) + 2.0 * nmz * (q2q3 - q0q1)
+                bz = 2.0 * nmx * (q1q3 - q0q2) + 2.0 * nmy * (q2q3 + q0q1) + 2.0 * nmz * (0.5 - q1q1 - q2q2)
+                bx = math.sqrt(hx * hx + hy * hy)
+                wx = 2.0 * bx * (0.5 - q2q2 - q3q3) + 2.0 * bz * (q1q3 - q0q2)
+                wy = 2.0 * bx * (q1q2 - q0q3) + 2.0 * bz * (q0q1 + q2q3)
+                wz = 2.0 * bx * (q0q2 + q1q3) + 2.0 * bz * (0.5 - q1q1 - q2q2)
+                ex += nmy * wz - nmz * wy
+                ey += nmz * wx - nmx * wz
+                ez += nmx * wy - nmy * wx
+            if ki > 0.0:
+                ix += ki * ex * halft
+                iy += ki * ey * halft
+                iz += ki * ez * halft
+            wgx += kp * ex + ix
+            wgy += kp * ey + iy
+            wgz += kp * ez + iz
+        # integrate the rate of change of the quaternion
+        n0 = q0 + (-q1 * wgx - q2 * wgy - q3 * wgz) * halft
+        n1 = q1 + (q0 * wgx + q2 * wgz - q3 * wgy) * halft
+        n2 = q2 + (q0 * wgy - q1 * wgz + q3 * wgx) * halft
+        n3 = q3 + (q0 * wgz + q1 * wgy - q2 * wgx) * halft
+        norm = 1.0 / math.sqrt(n0 * n0 + n1 * n1 + n2 * n2 + n3 * n3)
+        q0, q1, q2, q3 = n0 * norm, n1 * norm, n2 * norm, n3 * norm
+        out[4 * i] = q0
+        out[4 * i + 1] = q1
+        out[4 * i + 2] = q2
+        out[4 * i + 3] = q3
+    state[0], state[1], state[2], state[3], state[4], state[5], state[6] = q0, q1, q2, q3, ix, iy, iz
+
+# the Madgwick filter step, see `_mahony`. `state` is [q0, q1, q2, q3]
+def _madgwick(gx, gy, gz, ax, ay, az, mx, my, mz, dt, use_mag, beta, state, out):
+    q0, q1, q2, q3 = state[0], state[1], state[2], state[3]
+    for i in range(len(dt)):
+        # rate of change of the quaternion from the gyroscope
+        d0 = 0.5 * (-q1 * gx[i] - q2 * gy[i] - q3 * gz[i])
+        d1 = 0.5 * (q0 * gx[i] + q2 * gz[i] - q3 * gy[i])
+        d2 = 0.5 * (q0 * gy[i] - q1 * gz[i] + q3 * gx[i])
+        d3 = 0.5 * (q0 * gz[i] + q1 * gy[i] - q2 * gx[i])
+        a = math.sqrt(ax[i] * ax[i] + ay[i] * ay[i] + az[i] * az[i])
+        if a > 0.0:
+            nax, nay, naz = ax[i] / a, ay[i] / a, az[i] / a
+            m = math.sqrt(mx[i] * mx[i] + my[i] * my[i] + mz[i] * mz[i]) if use_mag else 0.0
+            q0q0 = q0 * q0
+            q1q1 = q1 * q1
+            q2q2 = q2 * q2
+            q3q3 = q3 * q3
+            # gradient descent step towards the measured direction(s)
+            if m > 0.0:
+                nmx, nmy, nmz = mx[i] / m, my[i] / m, mz[i] / m
+                q0q1 = q0 * q1
+                q0q2 = q0 * q2
+                q0q3 = q0 * q3
+                q1q2 = q1 * q2
+                q1q3 = q1 * q3
+                q2q3 = q2 * q3
+                _2q0mx = 2.0 * q0 * nmx
+                _2q0my = 2.0 * q0 * nmy
+                _2q0mz = 2.0 * q0 * nmz
+                _2q1mx = 2.0 * q1 * nmx
+                _2q0 = 2.0 * q0
+                _2q1 = 2.0 * q1
+                _2q2 = 2.0 * q2
+                _2q3 = 2.0 * q3
+                _2q0q2 = 2.0 * q0q2
+                _2q2q3 = 2.0 * q2q3
+                hx = nmx * q0q0 - _2q0my * q3 + _2q0mz * q2 + nmx * q1q1 + _2q1 * nmy * q2 + _2q1 * nmz * q3 - nmx * q2q2 - nmx * q3q3
+                hy = _2q0mx * q3 + nmy * q0q0 - _2q0mz * q1 + _2q1mx * q2 - nmy * q1q1 + nmy * q2q2 + _2q2 * nmz * q3 - nmy * q3q3
+                _2bx = math.sqrt(hx * hx + hy * hy)
+                _2bz = -_2q0mx * q2 + _2q0my * q1 + nmz * q0q0 + _2q1mx * q3 - nmz * q1q1 + _2q2 * nmy * q3 - nmz * q2q2 + nmz * q3q3
+                _4bx = 2.0 * _2bx
+                _4bz = 2.0 * _2bz
+                fax = 2.0 * q1q3 - _2q0q2 - nax
+                fay = 2.0 * q0q1 + _2q2q3 - nay
+                faz = 1.0 - 2.0 * q1q1 - 2.0 * q2q2 - naz
+                fmx = _2bx * (0.5 - q2q2 - q3q3) + _2bz * (q1q3 - q0q2) - nmx
+                fmy = _2bx * (q1q2 - q0q3) + _2bz * (q0q1 + q2q3) - nmy
+                fmz = _2bx * (q0q2 + q1q3) + _2bz * (0.5 - q1q1 - q2q2) - nmz
+                s0 = -_2q2 * fax + _2q1 * fay - _2bz * q2 * fmx + (-_2bx * q3 + _2bz * q1) * fmy + _2bx * q2 * fmz
+                s1 = _2q3 * fax + _2q0 * fay - 4.0 * q1 * faz + _2bz * q3 * fmx + (_2bx * q2 + _2bz * q0) * fmy + (_2bx * q3 - _4bz * q1) * fmz
+                s2 = -_2q0 * fax + _2q3 * fay - 4.0 * q2 * faz + (-_4bx * q2 - _2bz * q0) * fmx + (_2bx * q1 + _2bz * q3) * fmy + (_2bx * q0 - _4bz * q2) * fmz
+                s3 = _2q1 * fax + _2q2 * fay + (-_4bx * q3 + _2bz * q1) * fmx + (-_2bx * q0 + _2bz * q2) * fmy + _2bx * q1 * fmz
+            else:
+                s0 = 4.0 * q0 * q2q2 + 2.0 * q2 * nax + 4.0 * q0 * q1q1 - 2.0 * q1 * nay
+                s1 = 4.0 * q1 * q3q3 - 2.0 * q3 * nax + 4.0 * q0q0 * q1 - 2.0 * q0 * nay - 4.0 * q1 + 8.0 * q1 * q1q1 + 8.0 * q1 * q2q2 + 4.0 * q1 * naz
+                s2 = 4.0 * q0q0 * q2 + 2.0 * q0 * nax + 4.0 * q2 * q3q3 - 2.0 * q3 * nay - 4.0 * q2 + 8.0 * q2 * q1q1 + 8.0 * q2 * q2q2 + 4.0 * q2 * naz
+                s3 = 4.0 * q1q1 * q3 - 2.0 * q1 * nax + 4.0 * q2q2 * q3 - 2.0 * q2 * nay
+            s = math.sqrt(s0 * s0 + s1 * s1 + s2 * s2 + s3 * s3)
+            if s > 0.0:
+                d0 -= beta * s0 / s
+                d1 -= beta * s1 / s
+                d2 -= beta * s2 / s
+                d3 -= beta * s3 / s
+        n0 = q0 + d0 * dt[i]
+        n1 = q1 + d1 * dt[i]
+        n2 = q2 + d2 * dt[i]
+        n3 = q3 + d3 * dt[i]
+        norm = 1.0 / math.sqrt(n0 * n0 + n1 * n1 + n2 * n2 + n3 * n3)
+        q0, q1, q2, q3 = n0 * norm, n1 * norm, n2 * norm, n3 * norm
+        out[4 * i] = q0
+        out[4 * i + 1] = q1
+        out[4 * i + 2] = q2
+        out[4 * i + 3] = q3
+    state[0], state[1], state[2], state[3] = q0, q1, q2, q3
+
+if numba is not None:
+    _mahony_compiled = numba.njit(cache=True)(_mahony)
+    _madgwick_compiled = numba.njit(cache=True)(_madgwick)
+
+# returns the roll, pitch and yaw (degrees, shape (n, 3)) of quaternions `q` (shape (n, 4)), with
+# the formulas of the S2 lab's IMU script
+def euler(q):
+    q = np.asarray(q, dtype=np.float64).reshape(-1, 4)
+    q0, q1, q2, q3 = q[:, 0], q[:, 1], q[:, 2], q[:, 3]
+    roll = np.arctan2(2 * q2 * q3 + 2 * q0 * q1, -2 * q1 * q1 - 2 * q2 * q2 + 1)
+    pitch = np.arcsin(np.clip(-2 * q1 * q3 + 2 * q0 * q2, -1.0, 1.0))
+    yaw = np.arctan2(-2 * q1 * q2 - 2 * q0 * q3, 2 * q2 * q2 + 2 * q3 * q3 - 1)
+    return np.degrees(np.column_stack((roll, pitch, yaw)))
+
+# common part of the filters: time steps from timestamps, and calling the step over a batch
+class _Filter:
+
+    def __init__(self, q, compiled):
+        if compiled and numba is None:
+            raise ValueError("compiled=True requires numba, which is not installed")
+        self.compiled = numba is not None if compiled is None else compiled
+        self._state = np.zeros(self._state_size)
+        self._state[:4] = q
+        self._state[:4] /= np.linalg.norm(self._state[:4])
+        self.last_timestamp = None
+
+    # current orientation quaternion (w, x, y, z)
+    @property
+    def q(self):
+        return self._state[:4].copy()
+
+    # forget the integral feedback and the last timestamp, and start over from orientation `q`
+    def reset(self, q=(1.0, 0.0, 0.0, 0.0)):
+        self._state[:] = 0.0
+        self._state[:4] = q
+        self._state[:4] /= np.linalg.norm(self._state[:4])
+        self.last_timestamp = None
+
+    # processes one sample, returns the orientation quaternion after it. The first sample after
+    # creating or resetting the filter only sets the time, unless `dt` (seconds) is given
+    def update(self, timestamp, gyro, accel, mag=None, dt=None):
+        return self.run([timestamp], [gyro], [accel], None if mag is None else [mag], dt=dt)[0]
+
+    # processes a batch of samples: `timestamps` (ns, shape (n,)), `gyro` (rad/s, shape (n, 3)),
+    # `accel` and `mag` (shape (n, 3), or None), and returns the orientation after each sample
+    # (shape (n, 4)). `dt` (seconds) is the time before the first sample, by default the time
+    # since the last sample of the previous batch (none before the first batch)
+    def run(self, timestamps, gyro, accel, mag=None, dt=None):
+        timestamps = np.asarray(timestamps, dtype=np.int64)
+        n = len(timestamps)
+        if n == 0:
+            return np.empty((0, 4))
+        steps = np.empty(n)
+        steps[1:] = np.diff(timestamps) / 1e9
+        if dt is not None:
+            steps[0] = dt
+        elif self.last_timestamp is not None:
+            steps[0] = (timestamps[0] - self.last_timestamp) / 1e9
+        else:
+            steps[0] = 0.0
+        self.last_timestamp = int(timestamps[-1])
+        gyro = np.asarray(gyro, dtype=np.float64).reshape(n, 3)
+        accel = np.asarray(accel, dtype=np.float64).reshape(n, 3)
+        use_mag = mag is not None
+        mag = np.asarray(mag, dtype=np.float64).reshape(n, 3) if use_mag else np.zeros((n, 3))
+
+        if self.compiled:
+            out = np.empty(4 * n)
+            columns = [np.ascontiguousarray(c) for c in (*gyro.T, *accel.T, *mag.T)]
+            self._step(True)(*columns, steps, use_mag, *self._parameters, self._state, out)
+            return out.reshape(n, 4)
+        out = [0.0] * (4 * n)
+        state = self._state.tolist()
+        self._step(False)(*gyro.T.tolist(), *accel.T.tolist(), *mag.T.tolist(), steps.tolist(), use_mag, *self._parameters, state, out)
+        self._state[:] = state
+        return np.array(out).reshape(n, 4)
+
+# the Mahony filter: a PI controller that corrects the gyroscope's rotation rate towards gravity
+# (and magnetic north). `kp` and `ki` default to the gains of `ICM20948.imuAHRSupdate()`
+#
+# `compiled` selects the numba loop (None: if numba is installed)
+class Mahony(_Filter):
+    _state_size = 7
+
+    def __init__(self, kp=4.5, ki=1.0, q=(1.0, 0.0, 0.0, 0.0), compiled=None):
+        self.kp = kp
+        self.ki = ki
+        super().__init__(q, compiled)
+
+    # integral feedback (rad/s) that the filter added to the gyroscope's rates, i.e. its
+    # estimate of the gyroscope's bias (with the sign flipped)
+    @property
+    def integral(self):
+        return self._state[4:].copy()
+
+    @property
+    def _parameters(self):
+        return (float(self.kp), float(self.ki))
+
+    def _step(self, compiled):
+        return _mahony_compiled if compiled else _mahony
+
+# the Madgwick filter: a gradient descent step towards gravity (and magnetic north) per sample,
+# of `beta` (rad/s, about the gyroscope's error), see `Mahony`
+class Madgwick(_Filter):
+    _state_size = 4
+
+    def __init__(self, beta=0.1, q=(1.0, 0.0, 0.0, 0.0), compiled=None):
+        self.beta = beta
+        super().__init__(q, compiled)
+
+    @property
+    def _parameters(self):
+        return (float(self.beta),)
+
+    def _step(self, compiled):
+        return _madgwick_compiled if compiled else _madgwick
+
+# tests that check the filters on synthetic IMU data (these don't need any hardware)
+class AhrsTests(unittest.TestCase):
+
+    # a rotation about z at `rate` rad/s, tilted by `tilt` radians about x, sampled at `hz` for
+    # `seconds`: returns timestamps, gyro, accel and mag in the sensor's axes
+    def synthetic(self, hz=200, seconds=10.0, rate=0.5, tilt=0.0):
+        n = int(hz * seconds)
+        timestamps = np.arange(n, dtype=np.int64) * int(1e9 / hz)
+        yaw = rate * np.arange(n) / hz
+        # world to sensor: rotate the world vectors by -yaw about z, then by -tilt about x
+        def to_sensor(v):
+            x = np.cos(yaw) * v[0] + np.sin(yaw) * v[1]
+            y = -np.sin(yaw) * v[0] + np.cos(yaw) * v[1]
+            z = np.full(n, v[2])
+            return np.column_stack((x, np.cos(tilt) * y + np.sin(tilt) * z, -np.sin(tilt) * y + np.cos(tilt) * z))
+        accel = to_sensor((0.0, 0.0, 1.0))
+        mag = to_sensor((0.4, 0.0, -0.3))
+        gyro = np.column_stack((np.zeros(n), np.sin(tilt) * rate * np.ones(n), np.cos(tilt) * rate * np.ones(n)))
+        return timestamps, gyro, accel, mag
+
+    def test_batches_equal_single_updates(self):
+        timestamps, gyro, accel, mag = self.synthetic(seconds=0.5, tilt=0.3)
+        for make in (Mahony, Madgwick):
+            whole = make().run(timestamps, gyro, accel, mag)
+            chunked = make()
+            parts = [chunked.run(timestamps[i:i + 7], gyro[i:i + 7], accel[i:i + 7], mag[i:i + 7]) for i in range(0, len(timestamps), 7)]
+            single = make()
+            updates = [single.update(*sample) for sample in zip(timestamps, gyro, accel, mag)]
+            assert np.allclose(np.concatenate(parts), whole) and np.allclose(updates, whole)
+
+    def test_converges_to_tilt_and_follows_rotation(self):
+        tilt = math.radians(20)
+        timestamps, gyro, accel, mag = self.synthetic(tilt=tilt)
+        for make in (Mahony, Madgwick):
+            angles = euler(make().run(timestamps, gyro, accel, mag))
+            roll, pitch = angles[-200:, 0], angles[-200:, 1]
+            assert np.all(np.abs(np.abs(roll) - 20) < 2) and np.all(np.abs(pitch) < 2)
+            # heading follows the 0.5 rad/s rotation: 0.143 degrees per sample at 200 Hz
+            step = np.diff(np.unwrap(np.radians(angles[-200:, 2])))
+            assert np.allclose(np.abs(np.degrees(step)), 0.143, atol=0.005)
+
+    def test_time_step_comes_from_timestamps(self):
+        # a 1 rad/s rotation sampled at 50 or 400 Hz turns by the time between the first and last sample
+        for hz in (50, 400):
+            timestamps, gyro, accel, mag = self.synthetic(hz=hz, seconds=2.0, rate=1.0)
+            yaw = np.unwrap(np.radians(euler(Mahony(kp=0.0, ki=0.0).run(timestamps, gyro, accel))[:, 2]))
+            assert abs(abs(yaw[-1] - yaw[0]) - (timestamps[-1] - timestamps[0]) / 1e9) < 0.001
+
+    @unittest.skipIf(numba is None, "numba is not installed")
+    def test_compiled_loop_matches_python_loop(self):
+        timestamps, gyro, accel, mag = self.synthetic(seconds=1.0, tilt=0.3)
+        for make in (Mahony, Madgwick):
+            for m in (mag, None):
+                compiled = make(compiled=True).run(timestamps, gyro, accel, m)
+                assert np.allclose(compiled, make(compiled=False).run(timestamps, gyro, accel, m))
+
+    def test_integral_feedback_estimates_gyro_bias(self):
+        timestamps, gyro, accel, mag = self.synthetic(seconds=60.0, rate=0.0)
+        bias = np.array([0.02, -0.01, 0.03])
+        mahony = Mahony(kp=1.0, ki=0.3)
+        mahony.run(timestamps, gyro + bias, accel, mag)
+        assert np.allclose(mahony.integral, -bias, atol=0.003)
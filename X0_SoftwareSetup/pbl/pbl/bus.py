@@ -0,0 +1,328 @@
+# `pbl.bus`: an in-process publish/subscribe bus for sensor samples.
+#
+# In the labs, one loop reads a sensor and then, in turn, redraws the plot, writes the CSV and
+# computes derived values, so the slowest of them sets the sample rate of all of them. With a
+# `Bus`, readers publish samples into named topics and every consumer (plot, recorder, analysis)
+# subscribes on its own, typically from its own thread.
+#
+# Each topic is one preallocated ring buffer that all its subscribers share: publishing a batch
+# copies it once into the buffer, whatever the number of subscribers, and never waits for them.
+# Each subscriber only holds a cursor into the buffer. A subscriber that falls more than the
+# capacity of the topic behind loses its own oldest samples (counted in `dropped`), while the
+# producer and the other subscribers are unaffected.
+#
+# Topics have the same `get_samples(since)` as a streaming `hx711_multi.HX711`, so
+# `pbl.recording.Recorder.follow` and `pbl.plotting.PlotFeed.follow` can subscribe to a topic
+# directly.
+
+import collections
+import threading
+import time
+import unittest
+
+import numpy as np
+
+# calls `read()` until the `stop` event is set, every `interval` seconds (0: as fast as `read`
+# returns), stamping each value with the monotonic time, and passes the values on to
+# `publish(timestamps, values)` in batches of up to `batch` seconds. Used by `Bus.poll` and
+# `pbl.plotting.PlotFeed.poll`
+def poll_loop(read, publish, stop, interval, batch):
+    timestamps = []
+    values = []
+    published = time.monotonic()
+    while not stop.is_set():
+        values.append(read())
+        timestamps.append(time.monotonic_ns())
+        now = time.monotonic()
+        if now - published >= batch:
+            publish(timestamps, values)
+            timestamps, values = [], []
+            published = now
+        if interval:
+            time.sleep(interval)
+    if timestamps:
+        publish(timestamps, values)
+
+# a batch of samples of a topic, with the same fields as `hx711_multi.Samples`
+#
+# - `timestamps`: int64 array (n,) of monotonic timestamps in nanoseconds
+# - `values`: array (n, channels)
+# - `next_index`: index to pass as `since` to only receive newer samples
+# - `dropped`: number of requested samples that were overwritten before they could be read
+Samples = collections.namedtuple("Samples", ["timestamps", "values", "next_index", "dropped"])
+
+# a named stream of samples with a fixed number of channels, written by one producer
+#
+# the producer claims the slots of a batch (`_claimed`) before writing them and publishes the
+# batch (`_write_index`) afterwards. Readers copy the published slots without any lock, then
+# discard the ones the producer claimed in the meantime, so they never return a half-written
+# sample and never make the producer wait
+class Topic:
+
+    def __init__(self, name, channels, capacity=4096, dtype="float64"):
+        if capacity < 2:
+            raise ValueError(f"capacity must be at least 2, got {capacity}")
+        self.name = name
+        self.channels = list(channels)
+        self.capacity = capacity
+        self._timestamps = np.zeros(capacity, dtype=np.int64)
+        self._values = np.full((capacity, len(self.channels)), np.nan, dtype=dtype)
+        # total number of samples published, and claimed (published or being written)
+        self._write_index = 0
+        self._claimed = 0
+        self._condition = threading.Condition()
+        self._waiting = 0
+
+    def __repr__(self):
+        return f"Topic({self.name!r}, {self.channels}, capacity={self.capacity})"
+
+    # index that the next published sample will receive (i.e. number of samples published so far)
+    @property
+    def write_index(self):
+        return self._write_index
+
+    # publishes `timestamps` (ns, shape (n,)) and `values` (shape (n, channels)). Only one thread
+    # may publish into a topic. Batches larger than the capacity only keep their newest samples
+    def publish(self, timestamps, values):
+        timestamps = np.asarray(timestamps, dtype=np.int64)
+        n = len(timestamps)
+        if n == 0:
+            return
+        values = np.asarray(values).reshape(n, len(self.channels))
+        start = self._write_index
+        self._claimed = start + n
+        if n > self.capacity:
+            timestamps, values = timestamps[-self.capacity:], values[-self.capacity:]
+            start += n - self.capacity
+        slot = start % self.capacity
+        first = min(len(timestamps), self.capacity - slot)
+        self._timestamps[slot:slot + first] = timestamps[:first]
+        self._values[slot:slot + first] = values[:first]
+        if first < len(timestamps):
+            self._timestamps[:len(timestamps) - first] = timestamps[first:]
+            self._values[:len(timestamps) - first] = values[first:]
+        self._write_index = start + len(timestamps)
+        if self._waiting:
+            with self._condition:
+                self._condition.notify_all()
+
+    # publishes one sample, see `publish`
+    def publish_one(self, timestamp, values):
+        self.publish((timestamp,), (values,))
+
+    # copies out the samples published at or after index `since` (at most `max_samples` of them,
+    # oldest first), without blocking the producer
+    def get_samples(self, since=0, max_samples=None):
+        end = self._write_index
+        start = max(since, end - self.capacity, 0)
+        dropped = start - since if since < start else 0
+        if max_samples is not None:
+            end = min(end, start + max_samples)
+        count = end - start
+        if count <= 0:
+            return Samples(np.empty(0, dtype=np.int64), self._values[:0].copy(), max(since, end), 0)
+
+        slots = np.arange(start, end) % self.capacity
+        timestamps = self._timestamps[slots]
+        values = self._values[slots]
+
+        # discard the samples that the producer overwrote (or started to overwrite) while copying
+        overwritten = self._claimed - self.capacity - start
+        if overwritten > 0:
+            overwritten = min(overwritten, count)
+            timestamps = timestamps[overwritten:]
+            values = values[overwritten:]
+            dropped += overwritten
+        return Samples(timestamps, values, end, dropped)
+
+    # blocks until a sample at or after index `since` is published, or until `timeout` seconds
+    # passed. Returns whether there is such a sample
+    def wait(self, since, timeout=None):
+        if self._write_index > since:
+            return True
+        with self._condition:
+            self._waiting += 1
+            try:
+                return self._condition.wait_for(lambda: self._write_index > since, timeout)
+            finally:
+                self._waiting -= 1
+
+    # returns a new `Subscription`, starting with the next published sample, or with the oldest
+    # sample still held if `from_start`
+    def subscribe(self, from_start=False):
+        return Subscription(self, 0 if from_start else self._write_index)
+
+# one consumer's cursor into a `Topic`
+#
+# call `get` to receive everything published since the previous call, or `wait` first to block
+# until there is something new. `dropped` counts the samples this subscriber lost by falling
+# behind by more than the capacity of the topic
+class Subscription:
+
+    def __init__(self, topic, next_index=0):
+        self.topic = topic
+        self.next_index = next_index
+        self.dropped = 0
+
+    def __repr__(self):
+        return f"Subscription({self.topic.name!r}, next_index={self.next_index}, dropped={self.dropped})"
+
+    # number of published samples this subscriber has not received yet
+    @property
+    def backlog(self):
+        return self.topic.write_index - self.next_index
+
+    # returns a `Samples` batch of everything (at most `max_samples`) published since the previous call
+    def get(self, max_samples=None):
+        samples = self.topic.get_samples(self.next_index, max_samples)
+        self.next_index = samples.next_index
+        self.dropped += samples.dropped
+        return samples
+
+    # blocks until there is a new sample or `timeout` seconds passed, returns whether there is one
+    def wait(self, timeout=None):
+        return self.topic.wait(self.next_index, timeout)
+
+# a set of named topics, with background threads that publish sensor readings into them
+#
+# - `topic(name, channels)` creates a topic (or returns the existing one), `subscribe(name)`
+#   subscribes to it
+# - `forward(name, source)` drains a streaming source (anything with `get_samples(since)`, e.g.
+#   `hx711_multi.HX711` after `start_streaming`) into a topic from a background thread
+# - `poll(name, read)` calls `read()` (one value, or one value per channel) from a background
+#   thread as fast as the sensor allows, e.g. `lambda: chan.value` for an ADS1115 or a function
+#   returning a copy of the nine values of `ICM20948.icm20948CalAvgValue()` (which reuses its array)
+#
+# call `close` (or use the bus as a context manager) to stop the background threads
+class Bus:
+
+    def __init__(self):
+        self._topics = {}
+        self._lock = threading.Lock()
+        self._threads = []
+        self._stop = threading.Event()
+        self._errors = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    # names of the topics
+    @property
+    def topics(self):
+        return list(self._topics)
+
+    # returns the topic `name`, creating it with `channels` (names) if it does not exist yet
+    def topic(self, name, channels=None, capacity=4096, dtype="float64"):
+        with self._lock:
+            topic = self._topics.get(name)
+            if topic is None:
+                if channels is None:
+                    raise KeyError(f"no topic {name!r}, pass its channels to create it")
+                topic = self._topics[name] = Topic(name, channels, capacity, dtype)
+            elif channels is not None and list(channels) != topic.channels:
+                raise ValueError(f"topic {name!r} has channels {topic.channels}, not {list(channels)}")
+            return topic
+
+    def publish(self, name, timestamps, values):
+        self._topics[name].publish(timestamps, values)
+
+    def subscribe(self, name, from_start=False):
+        return self.topic(name).subscribe(from_start)
+
+    # publishes everything `source.get_samples(since)` returns into the topic `name`, checking every
+    # `interval` seconds, until `close`
+    def forward(self, name, source, channels, interval=0.01, capacity=4096):
+        topic = self.topic(name, channels, capacity)
+        self._start(f"pbl-bus-forward-{name}", self._forward, topic, source, interval)
+        return topic
+
+    # publishes the value(s) returned by `read()` into the topic `name`, stamped with the monotonic
+    # time, every `interval` seconds (0: as fast as `read` returns) until `close`. Values are
+    # published in batches of up to `batch` seconds, so subscribers wake up at most 1 / `batch`
+    # times per second
+    def poll(self, name, read, channels, interval=0.0, batch=0.01, capacity=4096):
+        topic = self.topic(name, channels, capacity)
+        self._start(f"pbl-bus-poll-{name}", poll_loop, read, topic.publish, self._stop, interval, batch)
+        return topic
+
+    # stops the background threads. Raises the first error a background thread stopped with
+    def close(self):
+        self._stop.set()
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+        self._stop.clear()
+        if self._errors:
+            name, error = self._errors[0]
+            self._errors = []
+            raise RuntimeError(f"bus thread {name} failed") from error
+
+    def _start(self, name, target, *args):
+        def run():
+            try:
+                target(*args)
+            except Exception as e:
+                self._errors.append((name, e))
+        thread = threading.Thread(target=run, name=name, daemon=True)
+        self._threads.append(thread)
+        thread.start()
+
+    def _forward(self, topic, source, interval):
+        next_index = 0
+        while True:
+            samples = source.get_samples(since=next_index)
+            next_index = samples.next_index
+            topic.publish(samples.timestamps, samples.values)
+            if self._stop.wait(interval):
+                break
+
+# tests that check the bus (these don't need any hardware)
+class BusTests(unittest.TestCase):
+
+    def test_subscribers_receive_every_sample_in_order(self):
+        topic = Topic("imu", ["ax", "ay"], capacity=8)
+        early = topic.subscribe()
+        for start in range(0, 6, 3):
+            topic.publish(np.arange(start, start + 3), np.arange(2 * start, 2 * start + 6).reshape(3, 2))
+        late = topic.subscribe()
+        topic.publish_one(6, (12, 13))
+        samples = early.get()
+        assert list(samples.timestamps) == list(range(7)) and samples.values[6].tolist() == [12, 13]
+        assert list(late.get().timestamps) == [6]
+        assert len(early.get().timestamps) == 0 and early.backlog == 0
+
+    def test_slow_subscriber_only_drops_its_own_backlog(self):
+        topic = Topic("plate", ["force"], capacity=10)
+        fast = topic.subscribe()
+        slow = topic.subscribe()
+        received = []
+        for i in range(25):
+            topic.publish_one(i, (float(i),))
+            received += fast.get().timestamps.tolist()
+        samples = slow.get()
+        assert received == list(range(25))
+        assert list(samples.timestamps) == list(range(15, 25)) and slow.dropped == 15
+        # a batch larger than the topic keeps its newest samples
+        topic.publish(np.arange(100, 130), np.zeros((30, 1)))
+        assert list(fast.get().timestamps) == list(range(120, 130)) and fast.dropped == 20
+
+    def test_threads_publish_and_subscribers_wait(self):
+        class Source:
+            def get_samples(self, since=0):
+                return Samples(np.array([since]), np.array([[1.0]]), since + 1, 0)
+
+        with Bus() as bus:
+            bus.topic("adc", ["a0"])
+            subscription = bus.subscribe("adc")
+            bus.poll("adc-poll", lambda: 2.0, ["a0"], interval=0.001, batch=0.005)
+            bus.forward("hx711", Source(), ["cell"], interval=0.001)
+            polled = bus.subscribe("adc-poll")
+            assert polled.wait(timeout=1.0) and polled.get().values[0, 0] == 2.0
+            assert bus.subscribe("hx711", from_start=True).wait(timeout=1.0)
+            assert not subscription.wait(timeout=0.01)
+        assert sorted(bus.topics) == ["adc", "adc-poll", "hx711"]
+        with self.assertRaises(ValueError):
+            bus.topic("adc", ["a1"])
@@ -0,0 +1,232 @@
+# `pbl.plotting`: live plots of sensor streams that cost the same to redraw at any sample rate.
+#
+# Redrawing every sample of the visible window makes `matplotlib.animation` slower the faster the
+# sensor samples, until the loop that reads the sensor and redraws the plot can't keep up. A
+# `PlotFeed` instead reduces the stream to a fixed number of time bins, keeping the minimum and
+# maximum of each channel per bin, and draws each bin as a vertical segment. Peaks therefore stay
+# visible, and each frame draws `2 * points` values per channel however many samples arrived.
+#
+# Samples are pushed into the feed by the acquisition (e.g. from a streaming `HX711`, or from a
+# background thread that polls an ICM20948 or ADS1115), while the animation only reads the
+# envelope, so acquisition never waits on rendering.
+
+import threading
+import time
+import unittest
+
+import numpy as np
+
+from pbl.bus import poll_loop
+
+# the minimum and maximum of each channel over the last `window` seconds, in `points` time bins
+#
+# `add` merges a batch of samples into the bins in O(batch) with NumPy. Bins are aligned to
+# multiples of `window / points` of the timestamps, so the x-coordinates of the bins relative to
+# the newest bin (`x`, from `-window` to 0 seconds) never change, and `arrays` updates `y` in
+# place. Timestamps (ns) must increase, as they do when they come from a monotonic clock
+class MinMaxEnvelope:
+
+    def __init__(self, channels, window=10.0, points=500):
+        if points < 1:
+            raise ValueError(f"points must be at least 1, got {points}")
+        self.channels = channels
+        self.window = window
+        self.points = points
+        self._bin_ns = max(1, round(window * 1e9 / points))
+        self._min = np.empty((points, channels))
+        self._max = np.empty((points, channels))
+        # bin centers relative to the end of the newest bin, each twice (min and max)
+        self.x = np.repeat((np.arange(points) - points + 0.5) * self._bin_ns / 1e9, 2)
+        self.y = np.empty((2 * points, channels))
+        self.reset()
+
+    # forget all samples
+    def reset(self):
+        self._min.fill(np.inf)
+        self._max.fill(-np.inf)
+        self._newest = None
+        self.y.fill(np.nan)
+
+    # monotonic timestamp (ns) of the end of the newest bin, i.e. where `x` is 0
+    @property
+    def end_ns(self):
+        return None if self._newest is None else (self._newest + 1) * self._bin_ns
+
+    # merge `timestamps` (ns, shape (n,)) and `values` (shape (n, channels)) into the envelope.
+    # NaN values are ignored, samples older than the window are dropped
+    def add(self, timestamps, values):
+        timestamps = np.asarray(timestamps, dtype=np.int64)
+        if not len(timestamps):
+            return
+        values = np.asarray(values, dtype=np.float64).reshape(len(timestamps), self.channels)
+        bins = timestamps // self._bin_ns
+        newest = int(bins[-1])
+        if self._newest is None or newest > self._newest:
+            # clear the slots of the bins that enter the window
+            first = newest - self.points + 1
+            if self._newest is not None:
+                first = max(first, self._newest + 1)
+            entering = np.arange(first, newest + 1)
+            slots = entering % self.points
+            self._min[slots] = np.inf
+            self._max[slots] = -np.inf
+            self._newest = newest
+        visible = bins > self._newest - self.points
+        if not visible.all():
+            bins = bins[visible]
+            values = values[visible]
+            if not len(bins):
+                return
+        # reduce each run of samples in the same bin, then merge the runs into their slots (bin
+        # `b` is kept in slot `b % points`)
+        starts = np.flatnonzero(np.r_[True, bins[1:] != bins[:-1]])
+        slots = bins[starts] % self.points
+        self._min[slots] = np.fmin(self._min[slots], np.fmin.reduceat(values, starts, axis=0))
+        self._max[slots] = np.fmax(self._max[slots], np.fmax.reduceat(values, starts, axis=0))
+
+    # returns `(x, y)`: `x` (shape (2 * points,)) in seconds relative to the newest bin, and `y`
+    # (shape (2 * points, channels)) alternating the minimum and maximum of each bin, oldest bin
+    # first. Bins without samples are NaN, so they show as gaps. Both arrays are updated in place
+    # and can be passed to `Line2D.set_data` directly
+    def arrays(self):
+        if self._newest is None:
+            return self.x, self.y
+        slots = np.arange(self._newest + 1, self._newest + 1 + self.points) % self.points
+        self.y[0::2] = self._min[slots]
+        self.y[1::2] = self._max[slots]
+        self.y[~np.isfinite(self.y)] = np.nan
+        return self.x, self.y
+
+# a live plot of the channels of one sensor stream
+#
+# feed it samples in one of three ways:
+#
+# - `push(timestamps, values)` from any thread, e.g. an existing acquisition loop
+# - `follow(source)`: `update` drains `source.get_samples(since)`, for streaming sources such as
+#   `hx711_multi.HX711`/`MultiHX711` after `start_streaming`
+# - `poll(read)`: a background thread calls `read()` (one value, or one value per channel) as
+#   fast as the sensor allows, e.g. `lambda: chan.value` for an ADS1115
+#
+# then call `animate` for a blitted `matplotlib` animation, or call `update` yourself and pass
+# its arrays to your own lines
+class PlotFeed:
+
+    def __init__(self, channels, window=10.0, points=500):
+        self.channels = list(channels)
+        self.envelope = MinMaxEnvelope(len(self.channels), window, points)
+        self._lock = threading.Lock()
+        self._source = None
+        self._next_index = 0
+        self._poll_thread = None
+        self._stop = threading.Event()
+
+    # merge a batch of samples into the plot, see `MinMaxEnvelope.add`. Safe to call from any thread
+    def push(self, timestamps, values):
+        with self._lock:
+            self.envelope.add(timestamps, values)
+
+    # drain `source.get_samples(since)` on every `update`
+    def follow(self, source):
+        self._source = source
+        self._next_index = 0
+
+    # call `read()` from a background thread until `stop`, every `interval` seconds (0: as fast
+    # as `read` returns), stamping each value with the monotonic time. Values are pushed in
+    # batches of up to `batch` seconds, so the thread rarely contends with the animation
+    def poll(self, read, interval=0.0, batch=0.02):
+        if self._poll_thread is not None and self._poll_thread.is_alive():
+            raise RuntimeError("PlotFeed is already polling")
+        self._stop.clear()
+        self._poll_thread = threading.Thread(target=poll_loop, args=(read, self.push, self._stop, interval, batch), name="pbl-plot-poll", daemon=True)
+        self._poll_thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._poll_thread is not None:
+            self._poll_thread.join()
+            self._poll_thread = None
+
+    # returns `(x, y)` of the envelope after taking in new samples, see `MinMaxEnvelope.arrays`
+    def update(self):
+        if self._source is not None:
+            samples = self._source.get_samples(since=self._next_index)
+            self._next_index = samples.next_index
+            self.push(samples.timestamps, samples.values)
+        with self._lock:
+            return self.envelope.arrays()
+
+    # starts a blitted `matplotlib.animation.FuncAnimation` that shows every channel in `ax` (a new
+    # figure by default), redrawn every `interval` ms. With `ylim` the axes never change, otherwise
+    # the y-axis grows to fit the data (each time costing one full redraw). Keep a reference to the
+    # returned animation, or it stops
+    def animate(self, ax=None, interval=50, ylim=None):
+        import matplotlib.pyplot as plt
+        from matplotlib.animation import FuncAnimation
+
+        if ax is None:
+            _, ax = plt.subplots()
+        ax.set_xlim(-self.envelope.window, 0)
+        ax.set_xlabel("time (s)")
+        if ylim is not None:
+            ax.set_ylim(*ylim)
+        x, y = self.update()
+        lines = [ax.plot(x, y[:, i], linewidth=0.8, label=name)[0] for i, name in enumerate(self.channels)]
+        if len(lines) > 1:
+            ax.legend(loc="upper left")
+
+        def frame(_):
+            x, y = self.update()
+            for i, line in enumerate(lines):
+                line.set_ydata(y[:, i])
+            if ylim is None:
+                self._fit_ylim(ax, y)
+            return lines
+
+        return FuncAnimation(ax.figure, frame, interval=interval, blit=True, cache_frame_data=False)
+
+    def _fit_ylim(self, ax, y):
+        if np.isnan(y).all():
+            return
+        low, high = float(np.nanmin(y)), float(np.nanmax(y))
+        bottom, top = ax.get_ylim()
+        if low < bottom or high > top:
+            margin = 0.1 * (high - low) or 1.0
+            ax.set_ylim(min(bottom, low - margin), max(top, high + margin))
+            ax.figure.canvas.draw_idle()
+
+# tests that check the plot feed (these don't need any hardware or a display)
+class PlotFeedTests(unittest.TestCase):
+
+    def test_envelope_keeps_min_and_max_per_bin(self):
+        envelope = MinMaxEnvelope(2, window=1.0, points=10)
+        timestamps = np.arange(0, 2_000_000_000, 1_000_000)  # 2s at 1 kHz
+        values = np.column_stack([np.arange(2000), -np.arange(2000)]).astype(float)
+        values[1950, 0] = np.nan
+        for start in range(0, 2000, 333):
+            envelope.add(timestamps[start:start + 333], values[start:start + 333])
+        x, y = envelope.arrays()
+        assert x[0] == x[1] == -0.95 and x[-1] == -0.05
+        # the last 10 bins of 100 samples each: seconds 1.0-2.0
+        assert list(y[0::2, 0]) == list(range(1000, 2000, 100))
+        assert list(y[1::2, 0]) == list(range(1099, 2000, 100))
+        assert list(y[1::2, 1]) == list(range(-1000, -2000, -100))
+        assert envelope.end_ns == 2_000_000_000
+
+    def test_envelope_shows_gaps_as_nan(self):
+        envelope = MinMaxEnvelope(1, window=1.0, points=4)
+        envelope.add([0, 100_000_000], [[1], [2]])
+        envelope.add([900_000_000], [[5]])
+        x, y = envelope.arrays()
+        assert list(y[0:2, 0]) == [1, 2] and list(y[6:8, 0]) == [5, 5]
+        assert np.isnan(y[2:6, 0]).all()
+        # a jump further than the window clears everything
+        envelope.add([10_000_000_000], [[7]])
+        assert np.isnan(envelope.arrays()[1][:6]).all()
+
+    def test_poll_pushes_from_a_background_thread(self):
+        feed = PlotFeed(["a", "b"], window=1.0, points=10)
+        feed.poll(lambda: (1.0, 2.0), interval=0.001, batch=0.005)
+        time.sleep(0.05)
+        feed.stop()
+        _, y = feed.update()
+        assert np.nanmin(y[:, 0]) == 1.0 and np.nanmax(y[:, 1]) == 2.0
@@ -0,0 +1,389 @@
+# `pbl.recording`: binary recording of sensor sessions (force plate, IMU, EMG).
+#
+# Writing a CSV row (and calling `datetime.now()`) per sample costs more CPU than acquiring the
+# sample, and produces large files. A recording instead stores every sample as a fixed-width
+# binary record, written in batches from a background thread:
+#
+# - 8 bytes magic (`PBLREC01`), then a 4-byte little-endian header length
+# - a JSON header: channel names, value dtype, sensor kind, clock reference, user metadata. The
+#   header is padded so that the records start at a multiple of 64 bytes
+# - records: an int64 monotonic timestamp (ns) followed by one value per channel (float32 by
+#   default, which holds 24-bit ADC values exactly)
+#
+# The number of records follows from the file size, so a recording that was interrupted (e.g.
+# the Pi lost power) is still readable up to its last complete record. Use `SessionReader` to
+# load a recording for analysis or plotting, or `export_csv` to convert it to CSV.
+
+import collections
+import csv
+import math
+import json
+import os
+import queue
+import struct
+import tempfile
+import threading
+import time
+import unittest
+
+import numpy as np
+
+MAGIC = b"PBLREC01"
+_LENGTH = struct.Struct("<I")
+_ALIGNMENT = 64
+
+# returns the numpy dtype of one record of a recording with `channels` values of `value_dtype`
+def record_dtype(channels, value_dtype="<f4"):
+    return np.dtype([("timestamp", "<i8"), ("values", np.dtype(value_dtype), (channels,))])
+
+# returns `(header, data_offset)` of the recording opened as binary file `f`
+def read_header(f):
+    magic = f.read(len(MAGIC))
+    if magic != MAGIC:
+        raise ValueError(f"not a pbl recording (magic {magic!r})")
+    (length,) = _LENGTH.unpack(f.read(_LENGTH.size))
+    header = json.loads(f.read(length).decode("utf-8"))
+    return header, len(MAGIC) + _LENGTH.size + length
+
+def _encode_header(header):
+    encoded = json.dumps(header).encode("utf-8")
+    prefix = len(MAGIC) + _LENGTH.size
+    # pad with spaces (valid JSON whitespace) so that the records are aligned
+    encoded += b" " * (-(prefix + len(encoded)) % _ALIGNMENT)
+    return MAGIC + _LENGTH.pack(len(encoded)) + encoded
+
+# writes a recording from a background thread
+#
+# `write` (or `write_samples`) copies a batch of samples into records and queues it, so the
+# acquisition loop never waits on the disk. At most `max_pending` batches are queued; when the
+# disk cannot keep up, further batches are dropped (and counted in `dropped`) rather than letting
+# memory grow or blocking acquisition, unless `write` is called with `block=True`.
+#
+# `follow(source)` makes the writer thread itself drain a streaming source (anything with
+# `get_samples(since)`, e.g. `hx711_multi.HX711` after `start_streaming`), so no acquisition loop
+# is needed at all.
+#
+# use it as a context manager, or call `close` to write everything that's queued
+class Recorder:
+
+    def __init__(self, path, channels, kind="generic", metadata=None, value_dtype="float32", max_pending=64):
+        self.path = path
+        self.channels = list(channels)
+        self.dtype = record_dtype(len(self.channels), np.dtype(value_dtype).newbyteorder("<"))
+        self.header = {
+            "version": 1,
+            "kind": kind,
+            "channels": self.channels,
+            "value_dtype": self.dtype["values"].base.str,
+            # a pair of readings of both clocks, to convert timestamps to wall-clock time
+            "wall_clock_ns": time.time_ns(),
+            "monotonic_ns": time.monotonic_ns(),
+            "metadata": metadata or {},
+        }
+        self.written = 0
+        self.dropped = 0
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._error = None
+        self._source = None
+        self._source_index = 0
+        self._poll_interval = 0.05
+        self._file = open(path, "wb")
+        self._file.write(_encode_header(self.header))
+        self._thread = threading.Thread(target=self._run, name="pbl-recorder", daemon=True)
+        self._thread.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    # queues `timestamps` (ns, shape (n,)) and `values` (shape (n, channels)) for writing.
+    # Returns False if the batch was dropped because too many batches are pending
+    def write(self, timestamps, values, block=False):
+        self._raise_error()
+        records = np.empty(len(timestamps), dtype=self.dtype)
+        records["timestamp"] = timestamps
+        records["values"] = values
+        try:
+            self._queue.put(records, block=block)
+        except queue.Full:
+            self.dropped += len(records)
+            return False
+        return True
+
+    # queues a `Samples` batch returned by `get_samples`, see `write`
+    def write_samples(self, samples, block=False):
+        if len(samples.timestamps):
+            return self.write(samples.timestamps, samples.values, block)
+        return True
+
+    # drain `source.get_samples(since)` from the writer thread every `interval` seconds
+    def follow(self, source, interval=0.05):
+        self._poll_interval = interval
+        self._source_index = 0
+        self._source = source
+
+    # writes everything that's queued (and, when following, what the source still holds) and closes the file
+    def close(self):
+        if self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join()
+        if not self._file.closed:
+            self._file.close()
+        self._raise_error()
+
+    def _raise_error(self):
+        if self._error is not None:
+            error, self._error = self._error, None
+            raise RuntimeError(f"recording to {self.path} failed") from error
+
+    def _drain_source(self):
+        samples = self._source.get_samples(since=self._source_index)
+        self._source_index = samples.next_index
+        self.dropped += samples.dropped
+        if len(samples.timestamps):
+            records = np.empty(len(samples.timestamps), dtype=self.dtype)
+            records["timestamp"] = samples.timestamps
+            records["values"] = samples.values
+            self._write_records(records)
+
+    def _write_records(self, records):
+        records.tofile(self._file)
+        self.written += len(records)
+
+    def _run(self):
+        try:
+            while True:
+                try:
+                    records = self._queue.get(timeout=self._poll_interval)
+                except queue.Empty:
+                    records = False
+                if records is None:
+                    break
+                if records is not False:
+                    self._write_records(records)
+                if self._source is not None:
+                    self._drain_source()
+            if self._source is not None:
+                self._drain_source()
+            self._file.flush()
+        except Exception as e:
+            self._error = e
+
+# reads a recording without loading it: the records are memory-mapped, and `timestamps`,
+# `values`, `channel`, `between` and `decimate` return NumPy views of them, so only the pages
+# that are actually used are read from disk. This works the same for any kind of recording
+# (force plate, IMU, EMG, ...); channels are addressed by the names in the header.
+#
+# Times are either absolute monotonic timestamps in ns (as recorded), or seconds since the first
+# record for the `*_s` arguments. Timestamps must increase, which they do for monotonic clocks.
+# Seeking uses a coarse index of every `index_stride`-th timestamp, built when the recording is
+# opened (which reads one page per stride), followed by a binary search within one stride.
+#
+# Views keep the file mapped, also after `close`. Copy them (`np.array(view)`) to keep only
+# the data that's needed
+class SessionReader:
+
+    def __init__(self, path, index_stride=4096):
+        self.path = path
+        with open(path, "rb") as f:
+            self.header, self._offset = read_header(f)
+        self.channels = list(self.header["channels"])
+        self.kind = self.header.get("kind", "generic")
+        self.metadata = self.header.get("metadata", {})
+        self.dtype = record_dtype(len(self.channels), self.header["value_dtype"])
+        # a trailing partial record (from an interrupted recording) is ignored
+        count = (os.path.getsize(path) - self._offset) // self.dtype.itemsize
+        if count:
+            self.records = np.memmap(path, dtype=self.dtype, mode="r", offset=self._offset, shape=(count,))
+        else:
+            self.records = np.empty(0, self.dtype)
+        self._index_stride = index_stride
+        self._index = np.array(self.records["timestamp"][::index_stride])
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __len__(self):
+        return len(self.records)
+
+    # drops the reader's memory map. The file stays mapped until views returned earlier are gone too
+    def close(self):
+        self.records = np.empty(0, self.dtype)
+        self._index = self._index[:0]
+
+    # monotonic timestamps (ns) of all records
+    @property
+    def timestamps(self):
+        return self.records["timestamp"]
+
+    # values of all records, shape (records, channels)
+    @property
+    def values(self):
+        return self.records["values"]
+
+    # monotonic timestamp (ns) of the first record
+    @property
+    def start_ns(self):
+        return int(self._index[0]) if len(self._index) else 0
+
+    # seconds between the first and the last record
+    @property
+    def duration(self):
+        return (int(self.timestamps[-1]) - self.start_ns) / 1e9 if len(self) else 0.0
+
+    # converts monotonic timestamps (ns) to wall-clock `datetime64[ns]`, using the clock pair in the header
+    def wall_clock(self, timestamps):
+        clock_offset = self.header["wall_clock_ns"] - self.header["monotonic_ns"]
+        return (np.asarray(timestamps, dtype=np.int64) + clock_offset).astype("datetime64[ns]")
+
+    # returns the column of `channel` (a name or position) as a view, shape (records,)
+    def channel(self, channel):
+        return self.values[:, self._column(channel)]
+
+    # returns the index of the first record at or after monotonic timestamp `timestamp_ns`
+    # (or after it, with `side="right"`), like `np.searchsorted` on `timestamps`
+    def index_of(self, timestamp_ns, side="left"):
+        block = int(np.searchsorted(self._index, timestamp_ns, side))
+        # the record lies between the index entries either side of `timestamp_ns`
+        low = max(block - 1, 0) * self._index_stride
+        high = min(block * self._index_stride, len(self))
+        return low + int(np.searchsorted(self.timestamps[low:high], timestamp_ns, side))
+
+    # returns the index of the first record at or after `seconds` since the first record
+    def seek(self, seconds):
+        return self.index_of(self.start_ns + round(seconds * 1e9))
+
+    # returns `(timestamps, values)` views of the records from `start_s` (inclusive) to `stop_s`
+    # (exclusive) seconds since the first record. `None` means the start or end of the recording.
+    # With `channels` (a name, position, or list of them) only those columns are returned: a
+    # single channel gives a view of shape (records,), a list gives a (copied) 2D array
+    def between(self, start_s=None, stop_s=None, channels=None):
+        start, stop = self._range(start_s, stop_s)
+        return self._select(slice(start, stop), channels)
+
+    # returns `(timestamps, values)` of every n-th record between `start_s` and `stop_s`, where n
+    # is chosen so that at most `max_points` records are returned. The result is a strided view,
+    # which is cheap but aliases peaks; use `pbl.plotting` envelopes to keep them
+    def decimate(self, max_points, start_s=None, stop_s=None, channels=None):
+        start, stop = self._range(start_s, stop_s)
+        step = max(1, math.ceil((stop - start) / max_points))
+        return self._select(slice(start, stop, step), channels)
+
+    def _range(self, start_s, stop_s):
+        start = 0 if start_s is None else self.seek(start_s)
+        stop = len(self) if stop_s is None else self.seek(stop_s)
+        return start, max(start, stop)
+
+    def _select(self, records, channels):
+        timestamps = self.timestamps[records]
+        values = self.values[records]
+        if channels is None:
+            return timestamps, values
+        if isinstance(channels, (str, int)):
+            return timestamps, values[:, self._column(channels)]
+        return timestamps, values[:, [self._column(channel) for channel in channels]]
+
+    def _column(self, channel):
+        if isinstance(channel, str):
+            if channel not in self.channels:
+                raise KeyError(f"no channel {channel!r} in {self.path} (channels: {self.channels})")
+            return self.channels.index(channel)
+        return channel
+
+# writes the recording at `path` to `csv_path`, with a header row of `time` and the channel names.
+# `time` is an ISO 8601 wall-clock time (like `datetime.now()` in the labs), or seconds since the
+# first sample with `time_format="seconds"`. Records are converted in chunks to bound memory use
+def export_csv(path, csv_path, time_format="iso", chunk_records=65536):
+    with SessionReader(path) as reader, open(csv_path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["time"] + reader.channels)
+        for start in range(0, len(reader), chunk_records):
+            chunk = reader.records[start:start + chunk_records]
+            if time_format == "iso":
+                times = np.datetime_as_string(reader.wall_clock(chunk["timestamp"]), unit="us")
+            else:
+                times = (chunk["timestamp"] - reader.start_ns) / 1e9
+            writer.writerows(zip(times.tolist(), *chunk["values"].T.tolist()))
+        return len(reader)
+
+# tests that check the recording format (these don't need any hardware)
+class RecordingTests(unittest.TestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, "session.pblrec")
+
+    def test_recorded_batches_are_written_in_order(self):
+        timestamps = np.arange(100, dtype=np.int64) * 12_500_000
+        values = np.arange(500, dtype=np.float64).reshape(100, 5)
+        with Recorder(self.path, ["a", "b", "c", "d", "e"], kind="force_plate") as recorder:
+            for start in range(0, 100, 30):
+                assert recorder.write(timestamps[start:start + 30], values[start:start + 30], block=True)
+        assert recorder.written == 100
+
+        with open(self.path, "rb") as f:
+            header, offset = read_header(f)
+            assert offset % _ALIGNMENT == 0
+            f.seek(offset)
+            records = np.fromfile(f, dtype=record_dtype(5, header["value_dtype"]))
+        assert header["kind"] == "force_plate"
+        assert (records["timestamp"] == timestamps).all()
+        assert (records["values"] == values).all()
+
+    def test_export_csv(self):
+        with Recorder(self.path, ["left", "right"]) as recorder:
+            recorder.write([0, 500_000_000], [[1, 2], [3.5, -4]], block=True)
+        csv_path = self.path + ".csv"
+        assert export_csv(self.path, csv_path, time_format="seconds") == 2
+        with open(csv_path, newline="") as f:
+            rows = list(csv.reader(f))
+        assert rows == [["time", "left", "right"], ["0.0", "1.0", "2.0"], ["0.5", "3.5", "-4.0"]]
+
+    def test_follow_drains_a_source(self):
+        Samples = collections.namedtuple("Samples", ["timestamps", "values", "next_index", "dropped"])
+
+        # minimal stand-in for a streaming HX711: 3 samples, 4 already dropped from its ring buffer
+        class Source:
+            def get_samples(self, since=0):
+                if since:
+                    return Samples(np.empty(0, np.int64), np.empty((0, 1)), since, 0)
+                return Samples(np.array([1, 2, 3]), np.array([[1.0], [2.0], [3.0]]), 3, 4)
+
+        with Recorder(self.path, ["x"]) as recorder:
+            recorder.follow(Source(), interval=0.01)
+        assert recorder.written == 3
+        assert recorder.dropped == 4
+
+    def test_session_reader_seeks_and_returns_views(self):
+        # an EMG-like recording: 10000 int16 samples at 1 kHz, with a small index stride so that
+        # seeking crosses index entries
+        timestamps = 5_000_000_000 + np.arange(10_000, dtype=np.int64) * 1_000_000
+        values = (np.arange(20_000) % 1000).astype(np.int16).reshape(10_000, 2)
+        with Recorder(self.path, ["emg1", "emg2"], kind="emg", value_dtype="int16") as recorder:
+            recorder.write(timestamps, values, block=True)
+        # a partial record, as left behind by an interrupted recording
+        with open(self.path, "ab") as f:
+            f.write(b"\0" * 5)
+
+        with SessionReader(self.path, index_stride=64) as reader:
+            assert reader.kind == "emg" and len(reader) == 10_000
+            assert reader.duration == 9.999
+            assert reader.seek(0) == 0 and reader.seek(4.5) == 4500 and reader.seek(4.5005) == 4501
+            assert reader.seek(20) == 10_000
+            assert reader.index_of(timestamps[6400], side="right") == 6401
+
+            times, emg2 = reader.between(2, 3, channels="emg2")
+            assert np.shares_memory(emg2, reader.records)
+            assert (times == timestamps[2000:3000]).all()
+            assert (emg2 == values[2000:3000, 1]).all()
+
+            times, both = reader.decimate(100, channels=["emg2", 0])
+            assert len(times) == 100
+            assert (both == values[::100, ::-1]).all()
+            assert reader.wall_clock(times[:1])[0] >= np.datetime64("2000-01-01")
@@ -2,10 +2,218 @@
 
 import pbl.common
 
+import collections
+import math
 import os
 import unittest
 
-# tests that check that the Pi has been setup correctly for S2
+try:
+    import numpy as np
+except ImportError:
+    # only the force plate code needs numpy; `pbl test` reports it missing (`common.Tests`)
+    np = None
+
+# chi-squared value with 2 degrees of freedom that contains 95% of a bivariate normal
+# distribution, used for the 95% confidence ellipse area of the CoP
+_CHI2_95_2DOF = 5.991464547107979
+
+# a batch of force plate samples, as returned by `ForcePlate.update`
+#
+# - `timestamps`: int64 array (n,) of monotonic timestamps in nanoseconds
+# - `force`: float array (n,) of the total vertical force, in the units of the weight multiples
+# - `cop`: float array (n, 2) of the CoP (x, y), in the units of the load cell positions. NaN
+#   when the total force is below `min_force` (i.e. nobody is standing on the plate)
+ForcePlateSamples = collections.namedtuple("ForcePlateSamples", ["timestamps", "force", "cop"])
+
+# returns `(force, cop)` for `loads`, an (n, cells) array of load cell forces, where `positions`
+# is a (cells, 2) array of the (x, y) position of each load cell. The CoP is the force-weighted
+# mean of the load cell positions, which assumes the load cells only measure vertical force
+def center_of_pressure(loads, positions, min_force=0.0):
+    loads = np.asarray(loads, dtype=np.float64)
+    force = loads.sum(axis=1)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        cop = (loads @ np.asarray(positions, dtype=np.float64)) / force[:, None]
+    cop[~(force >= min_force)] = np.nan
+    return force, cop
+
+# standard posturography metrics of a CoP trajectory, updated incrementally
+#
+# each call to `update` costs O(1) per new sample (no sample history is kept), so a live display
+# can recompute the metrics after every batch for free. Samples with a NaN CoP are skipped
+class SwayMetrics:
+
+    def __init__(self):
+        self.reset()
+
+    # forget all samples
+    def reset(self):
+        self.n = 0
+        self.path_length = 0.0
+        self._first_timestamp = None
+        self._last_timestamp = None
+        self._last_point = None
+        self._mean = np.zeros(2)
+        # sum of the outer products of the deviations from the mean (Welford/Chan)
+        self._m2 = np.zeros((2, 2))
+
+    # add a batch of `timestamps` (ns, shape (n,)) and CoP `points` (shape (n, 2))
+    def update(self, timestamps, points):
+        points = np.asarray(points, dtype=np.float64)
+        valid = ~np.isnan(points).any(axis=1)
+        points = points[valid]
+        timestamps = np.asarray(timestamps)[valid]
+        n = len(points)
+        if n == 0:
+            return
+
+        # path length, including the step from the last point of the previous batch
+        path = points if self._last_point is None else np.vstack([self._last_point, points])
+        self.path_length += float(np.hypot(*np.diff(path, axis=0).T).sum())
+
+        # merge the batch's mean and scatter matrix into the running ones
+        mean = points.mean(axis=0)
+        deviations = points - mean
+        m2 = deviations.T @ deviations
+        delta = mean - self._mean
+        total = self.n + n
+        self._m2 += m2 + np.outer(delta, delta) * self.n * n / total
+        self._mean += delta * n / total
+        self.n = total
+
+        if self._first_timestamp is None:
+            self._first_timestamp = int(timestamps[0])
+        self._last_timestamp = int(timestamps[-1])
+        self._last_point = points[-1]
+
+    # mean CoP (x, y)
+    @property
+    def mean(self):
+        return (float(self._mean[0]), float(self._mean[1])) if self.n else (math.nan, math.nan)
+
+    # covariance matrix of the CoP (x, y)
+    @property
+    def covariance(self):
+        return self._m2 / (self.n - 1) if self.n > 1 else np.full((2, 2), np.nan)
+
+    # time between the first and the last sample, in seconds
+    @property
+    def duration(self):
+        if self._first_timestamp is None:
+            return 0.0
+        return (self._last_timestamp - self._first_timestamp) / 1e9
+
+    # mean CoP velocity: path length per second
+    @property
+    def mean_velocity(self):
+        duration = self.duration
+        return self.path_length / duration if duration > 0 else math.nan
+
+    # area of the ellipse that contains 95% of the CoP samples (assuming they are normally distributed)
+    @property
+    def ellipse_area_95(self):
+        if self.n < 3:
+            return math.nan
+        determinant = max(float(np.linalg.det(self.covariance)), 0.0)
+        return math.pi * _CHI2_95_2DOF * math.sqrt(determinant)
+
+    def as_dict(self):
+        return {
+            "samples": self.n,
+            "duration": self.duration,
+            "path_length": self.path_length,
+            "mean_velocity": self.mean_velocity,
+            "ellipse_area_95": self.ellipse_area_95,
+            "mean_x": self.mean[0],
+            "mean_y": self.mean[1],
+        }
+
+# a force plate made of one-dimensional load cells, each read by an HX711 ADC
+#
+# `hx711` is an `hx711_multi.HX711` (or `MultiHX711`) with one ADC per load cell, already zeroed
+# and with weight multiples set (e.g. with `load_calibration`). `positions` holds the (x, y) position of
+# each load cell, in the same order as the dout pins (e.g. in mm from the center of the plate).
+#
+# call `start` to stream from the HX711 in the background, then call `update` whenever convenient
+# (e.g. once per animation frame): it converts every new sample into force and CoP with NumPy
+# and feeds the CoP into `metrics`
+class ForcePlate:
+
+    def __init__(self, hx711, positions, min_force=1.0):
+        self.positions = np.asarray(positions, dtype=np.float64)
+        cells = len(hx711.weight_multiples)
+        if self.positions.shape != (cells, 2):
+            raise ValueError(f"expected one (x, y) position per load cell ({cells}), got shape {self.positions.shape}")
+        self.hx711 = hx711
+        self.min_force = min_force
+        self.metrics = SwayMetrics()
+        self._next_index = 0
+
+    # converts streamed `values` (raw deltas from zero, one column per load cell) to loads
+    def loads(self, values):
+        weight_multiples = np.asarray(self.hx711.weight_multiples, dtype=np.float64)
+        return np.asarray(values, dtype=np.float64) / weight_multiples
+
+    # returns `(force, cop)` for streamed `values`, see `center_of_pressure`
+    def compute(self, values):
+        return center_of_pressure(self.loads(values), self.positions, self.min_force)
+
+    def start(self, buffer_size=4096):
+        self.hx711.start_streaming(buffer_size=buffer_size)
+        self._next_index = 0
+
+    def stop(self):
+        self.hx711.stop_streaming()
+
+    # returns a `ForcePlateSamples` of every sample streamed since the previous call
+    def update(self):
+        samples = self.hx711.get_samples(since=self._next_index)
+        self._next_index = samples.next_index
+        force, cop = self.compute(samples.values)
+        self.metrics.update(samples.timestamps, cop)
+        return ForcePlateSamples(samples.timestamps, force, cop)
+
+# tests that check the force plate calculations (these don't need any hardware)
+class ForcePlateTests(unittest.TestCase):
+
+    def test_center_of_pressure_of_known_loads(self):
+        positions = [(-1, -1), (1, -1), (1, 1), (-1, 1)]
+        force, cop = center_of_pressure([[1, 1, 1, 1], [0, 3, 1, 0], [0, 0, 0, 0]], positions, min_force=0.5)
+        assert list(force) == [4, 4, 0]
+        assert list(cop[0]) == [0, 0]
+        assert list(cop[1]) == [1, -0.5]
+        assert np.isnan(cop[2]).all()
+
+    def test_sway_metrics_match_batch_computation(self):
+        rng = np.random.default_rng(0)
+        points = rng.normal(0, [3, 1], (500, 2))
+        timestamps = np.arange(500) * 12_500_000
+        metrics = SwayMetrics()
+        for start in range(0, 500, 37):
+            metrics.update(timestamps[start:start + 37], points[start:start + 37])
+        path_length = np.hypot(*np.diff(points, axis=0).T).sum()
+        assert math.isclose(metrics.path_length, path_length)
+        assert math.isclose(metrics.mean_velocity, path_length / (499 * 0.0125))
+        assert np.allclose(metrics.covariance, np.cov(points.T))
+        area = math.pi * _CHI2_95_2DOF * math.sqrt(np.linalg.det(np.cov(points.T)))
+        assert math.isclose(metrics.ellipse_area_95, area)
+
+    def test_force_plate_converts_streamed_samples(self):
+        # stands in for a streaming HX711 (or MultiHX711) with two load cells
+        class StreamingSensor:
+            weight_multiples = [2.0, -4.0]
+            def get_samples(self, since=0):
+                Samples = collections.namedtuple("Samples", ["timestamps", "values", "next_index"])
+                return Samples(np.array([0, 12_500_000]), np.array([[2.0, -4.0], [0.0, -8.0]]), 2)
+
+        plate = ForcePlate(StreamingSensor(), [(-1, 0), (1, 0)])
+        samples = plate.update()
+        assert list(samples.force) == [2, 2]
+        assert list(samples.cop[:, 0]) == [0, 1]
+        assert plate.metrics.n == 2
+        with self.assertRaises(ValueError):
+            ForcePlate(StreamingSensor(), [(0, 0)])
+
+# tests that check that the Pi has been setup correctly for S3
 class Tests(unittest.TestCase):
 
     def test_can_import_hx711_multi(self):